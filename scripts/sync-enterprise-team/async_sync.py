@@ -0,0 +1,1268 @@
+#!/usr/bin/env python3
+"""
+GitHub Enterprise Team 成员同步脚本 (asyncio 版本)
+
+与 sync_team.py 使用完全相同的配置文件语义。所有 Organization 和 Team 作为并发任务同步，
+共用一个多路复用的连接池，并按接口类别 (GraphQL / REST 读 / REST 写) 用信号量限制并发。
+Enterprise 成员清理在所有 Team 同步完成后才执行。
+
+依赖: aiohttp (pip install aiohttp)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from sync_team import (
+    CANCEL_ADMIN_INVITATION_MUTATION,
+    CANCEL_MEMBER_INVITATION_MUTATION,
+    CREATE_ORGANIZATION_MUTATION,
+    ENTERPRISE_ID_QUERY,
+    ENTERPRISE_MEMBERS_QUERY,
+    ENTERPRISE_ORGANIZATIONS_QUERY,
+    INVITE_ENTERPRISE_MEMBER_MUTATION,
+    PENDING_MEMBER_INVITATIONS_QUERY,
+    PENDING_UNAFFILIATED_INVITATIONS_QUERY,
+    EnterpriseSnapshot,
+    GitHubEnterpriseTeamSync,
+    IdentityCache,
+    InvitationIndex,
+    InvitationLedger,
+    MemberIndex,
+    NameIndex,
+    RateLimitScheduler,
+    RequestMetrics,
+    RetryPolicy,
+    ResponseCache,
+    SyncState,
+    build_arg_parser,
+    build_mutation_batch,
+    build_user_lookup_query,
+    config_usernames,
+    converged_resources,
+    endpoint_template,
+    export_metrics,
+    graphql_operation,
+    graphql_transient_error,
+    invitation_ledger_from_args,
+    invitation_quota_error,
+    invite_quota_report,
+    last_page_number,
+    mutation_request_failed,
+    normalize_login,
+    normalize_members,
+    parse_bulk_memberships,
+    parse_link_header,
+    parse_mutation_batch,
+    render_report,
+    reserved_usernames,
+    resource_hashes,
+    retry_policy_from_env,
+    save_invitation_ledger,
+    with_cost_field,
+)
+
+
+class _ResponseView:
+    """将 aiohttp 响应包装成 RateLimitScheduler 可识别的形式 (headers / status_code / text / content)"""
+
+    def __init__(self, status: int, headers, body: bytes):
+        self.status_code = status
+        self.headers = headers
+        self.content = body
+        self.text = body.decode("utf-8", errors="replace")
+
+
+class AsyncNameIndex(NameIndex):
+    """
+    NameIndex 的异步版本：loader 为返回 (成功标志, {名称小写: 条目}) 的协程函数
+
+    缓存、失效和创建后更新的规则与同步引擎相同；load / preload / get 需要 await。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 并发查找未命中时只读取一次完整列表
+        self._load_lock = asyncio.Lock()
+
+    async def load(self) -> bool:
+        """完整读取一次列表 (已完整时直接返回)，返回索引是否完整"""
+        async with self._load_lock:
+            if self.complete:
+                return True
+            success, entries = await self.loader()
+            if success:
+                with self._lock:
+                    self._fill(entries)
+            return success
+
+    async def preload(self, names: Optional[List[str]] = None) -> bool:
+        """names 全部命中持久化缓存时使用缓存条目，否则完整读取列表 (见 NameIndex.preload)"""
+        return self._preload_cached(names) or await self.load()
+
+    async def get(self, name: str) -> Optional[Dict]:
+        """按名称查找，索引不完整且未命中时完整读取一次列表"""
+        entry = self._lookup(name)
+        if entry or not await self.load():
+            return entry
+        return self._lookup(name)
+
+
+class AsyncGitHubEnterpriseTeamSync:
+    """GitHub Enterprise Team 成员同步器 (asyncio 版本)"""
+
+    # 各接口类别的默认并发上限
+    DEFAULT_CONCURRENCY = {
+        "graphql": 4,
+        "rest_read": 8,
+        "rest_write": 8
+    }
+    # 同时同步的 Organization / Team 数
+    DEFAULT_RESOURCE_CONCURRENCY = 16
+
+    def __init__(self, token: str, enterprise: str,
+                 base_url: str = GitHubEnterpriseTeamSync.DEFAULT_BASE_URL, graphql_url: Optional[str] = None,
+                 pool_size: int = 20, timeout: float = GitHubEnterpriseTeamSync.DEFAULT_TIMEOUT,
+                 concurrency: Optional[Dict[str, int]] = None, identity_cache: Optional[IdentityCache] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 resource_concurrency: int = DEFAULT_RESOURCE_CONCURRENCY, retry_policy: Optional[RetryPolicy] = None,
+                 invitation_ledger: Optional[InvitationLedger] = None):
+        """
+        初始化同步器 (需在 async with 中使用以创建连接池)
+
+        Args:
+            token: GitHub Personal Access Token (需要 admin:enterprise 权限)
+            enterprise: Enterprise slug 名称
+            base_url: REST API 地址 (可指向本地模拟服务器)
+            graphql_url: GraphQL API 地址，默认为 {base_url}/graphql
+            pool_size: 连接池总连接数
+            timeout: 默认请求超时时间 (秒)
+            concurrency: 各接口类别的并发上限，覆盖 DEFAULT_CONCURRENCY
+            identity_cache: 持久化身份缓存 (可与同步引擎共用同一个数据库文件)
+            response_cache: REST GET 响应的条件请求缓存
+            resource_concurrency: 同时同步的 Organization / Team 数
+            retry_policy: 瞬时错误重试策略，默认为 RetryPolicy()
+            invitation_ledger: 本地邀请记录，默认只在本次运行内记录
+        """
+        if aiohttp is None:
+            raise RuntimeError("异步同步引擎需要 aiohttp: pip install aiohttp")
+
+        self.token = token
+        self.enterprise = enterprise
+        self.base_url = base_url.rstrip("/")
+        self.graphql_url = graphql_url or f"{self.base_url}/graphql"
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"token {token}",
+            "X-GitHub-Api-Version": "2022-11-28"
+        }
+        self.pool_size = pool_size
+        self.timeout = timeout
+        limits = dict(self.DEFAULT_CONCURRENCY)
+        limits.update(concurrency or {})
+        self.semaphores = {family: asyncio.Semaphore(limit) for family, limit in limits.items()}
+        self.resource_semaphore = asyncio.Semaphore(max(1, resource_concurrency))
+        # 本次运行中已发起的 Enterprise 邀请 {email_lower: Task}，多个 Team 邀请同一邮箱时共享结果
+        self.invite_tasks: Dict[str, asyncio.Task] = {}
+        # 本次运行中已按邀请额度放行的邮箱 (小写)，放行时立即记录，同一邮箱只占用一次额度
+        self.scheduled_invites: Set[str] = set()
+        self.rate_limiter = RateLimitScheduler()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.invitation_ledger = invitation_ledger or InvitationLedger()
+        self.metrics = RequestMetrics(enterprise)
+        self.session = None
+        self.enterprise_id = None
+        self.snapshot: Optional[EnterpriseSnapshot] = None
+        self.identities: Dict[str, Dict] = {}
+        self.identity_cache = identity_cache
+        self.response_cache = response_cache
+        # Team 批量成员接口是否可用 (首次返回 BULK_UNAVAILABLE_STATUSES 后置为 False)
+        self.bulk_team_memberships = True
+        # Team / Organization 名称索引 (与同步引擎相同：配置了身份缓存时跨运行持久化，全部命中时不读取列表)
+        self.teams = AsyncNameIndex(self.get_enterprise_teams, key_field="name",
+                                    cache=identity_cache, kind="team", scope=enterprise)
+        self.orgs = AsyncNameIndex(self.get_enterprise_organizations, key_field="login",
+                                   cache=identity_cache, kind="org", scope=enterprise)
+
+        # 报告数据
+        self.report = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "enterprise": enterprise,
+            "orgs": [],
+            "teams": []
+        }
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        if self.identity_cache:
+            self.identity_cache.close()
+        if self.response_cache:
+            self.response_cache.close()
+
+    # ==================== 传输层 ====================
+
+    async def _request(self, method: str, url: str, family: str, idempotent: Optional[bool] = None,
+                       **kwargs) -> _ResponseView:
+        """
+        发送请求 (所有 API 调用的唯一出口)
+
+        速率限制与瞬时错误的重试规则同 GitHubEnterpriseTeamSync._send。
+
+        Args:
+            method: HTTP 方法
+            url: 请求 URL
+            family: 接口类别 (graphql / rest_read / rest_write)，决定使用哪个信号量
+            idempotent: 请求是否幂等，默认按 HTTP 方法 / GraphQL 操作类型判断
+            **kwargs: 其他请求参数
+
+        Returns:
+            响应
+        """
+        resource = "graphql" if family == "graphql" else "core"
+        if idempotent is None:
+            query = (kwargs.get("json") or {}).get("query") if family == "graphql" else None
+            idempotent = self.retry_policy.is_idempotent(method, query)
+        cached = self.response_cache.get(url) if method == "GET" and self.response_cache else None
+        if cached:
+            kwargs["headers"] = dict(kwargs.get("headers") or {}, **{"If-None-Match": cached["etag"]})
+
+        if family == "graphql":
+            endpoint, operation = "/graphql", graphql_operation((kwargs.get("json") or {}).get("query"))
+        else:
+            endpoint, operation = endpoint_template(urlparse(url).path[len(urlparse(self.base_url).path):]), ""
+        # 耗时只计算持有信号量后的发送时间，排队和速率限制等待计入 waited
+        elapsed = waited = 0.0
+        attempt = retries = 0  # 速率限制重试次数、瞬时错误重试次数
+        while True:
+            started = time.perf_counter()
+            delay = self.rate_limiter.reserve(resource)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            async with self.semaphores[family]:
+                sent = time.perf_counter()
+                waited += sent - started
+                try:
+                    async with self.session.request(method, url, **kwargs) as resp:
+                        response = _ResponseView(resp.status, resp.headers, await resp.read())
+                    error = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                elapsed += time.perf_counter() - sent
+            if error is not None:
+                # 连接建立失败时请求确定没有发出，非幂等请求也可以重试
+                delay = None
+                if idempotent or isinstance(error, aiohttp.ClientConnectorError):
+                    delay = self.retry_policy.next_delay(retries)
+                if delay is None:
+                    self.metrics.record(method, endpoint, operation, 0, elapsed, waited, retries=attempt + retries)
+                    raise error
+                print(f"  🔁 {method} {endpoint} 连接失败 ({type(error).__name__})，{delay:.1f} 秒后重试...")
+                await asyncio.sleep(delay)
+                retries += 1
+                continue
+            self.rate_limiter.update(resource, response)
+
+            wait = self.rate_limiter.rate_limit_wait(response)
+            if wait is not None:
+                if attempt == GitHubEnterpriseTeamSync.MAX_RATE_LIMIT_RETRIES:
+                    break
+                print(f"  ⏳ 触发 API 速率限制 ({resource})，等待 {wait:.0f} 秒后重试...")
+                self.rate_limiter.record_wait(wait)
+                await asyncio.sleep(wait)
+                waited += wait
+                attempt += 1
+                continue
+
+            if idempotent and self._transient_response(response, family):
+                delay = self.retry_policy.next_delay(retries, response.headers.get("Retry-After"))
+                if delay is not None:
+                    print(f"  🔁 {method} {endpoint} 返回瞬时错误 ({response.status_code})，{delay:.1f} 秒后重试...")
+                    await asyncio.sleep(delay)
+                    retries += 1
+                    continue
+            break
+
+        body = kwargs.get("json")
+        self.metrics.record(method, endpoint, operation, response.status_code, elapsed, waited,
+                            bytes_sent=len(json.dumps(body)) if body is not None else 0,
+                            bytes_received=len(response.content), retries=attempt + retries)
+
+        if method == "GET" and self.response_cache:
+            if cached and response.status_code == 304:
+                # 304 时复用缓存的响应体，保留本次响应的速率限制头
+                self.response_cache.record_revalidated()
+                headers = response.headers.copy()
+                if cached["link"]:
+                    headers["Link"] = cached["link"]
+                response = _ResponseView(200, headers, cached["body"])
+            elif response.status_code == 200 and response.headers.get("ETag"):
+                self.response_cache.set(url, response.headers["ETag"], response.content, response.headers.get("Link"))
+
+        return response
+
+    def _transient_response(self, response: _ResponseView, family: str) -> bool:
+        """响应是否为可重试的瞬时错误 (5xx，或 GraphQL 查询返回的瞬时错误)"""
+        if self.retry_policy.retryable_status(response.status_code):
+            return True
+        if family != "graphql" or response.status_code != 200 or b'"errors"' not in response.content:
+            return False
+        try:
+            return graphql_transient_error(json.loads(response.content))
+        except ValueError:
+            return False
+
+    async def _make_request(self, method: str, url: str, **kwargs) -> Tuple[bool, Dict]:
+        """
+        发起 REST 请求
+
+        Returns:
+            (成功标志, 响应的 JSON 数据)
+        """
+        family = "rest_read" if method == "GET" else "rest_write"
+        try:
+            response = await self._request(method, url, family, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return False, {"error": str(e) or type(e).__name__}
+
+        if response.status_code >= 400:
+            return False, {"error": f"{response.status_code} Error for url: {url} - {response.text}"}
+        return True, json.loads(response.text) if response.text else {}
+
+    async def _graphql_request(self, query: str, variables: Optional[Dict] = None, allow_partial: bool = False) -> Dict:
+        """
+        发起 GraphQL 请求
+
+        Args:
+            allow_partial: 为 True 时，响应同时包含 data 和 errors 时返回部分数据
+
+        Raises:
+            Exception: GraphQL 请求失败或返回错误
+        """
+        result = await self._graphql_raw(query, variables)
+        if "errors" in result and not (allow_partial and result.get("data")):
+            raise Exception(f"GraphQL 错误: {result['errors']}")
+        return result.get("data", {})
+
+    async def _graphql_raw(self, query: str, variables: Optional[Dict] = None) -> Dict:
+        """发起 GraphQL 请求并返回完整响应 (data + errors)，仅在 HTTP 失败时抛出异常"""
+        payload = {"query": with_cost_field(query)}
+        if variables:
+            payload["variables"] = variables
+
+        response = await self._request("POST", self.graphql_url, "graphql", json=payload)
+        if response.status_code >= 400:
+            raise Exception(f"GraphQL 请求失败: {response.status_code} - {response.text}")
+        result = json.loads(response.text)
+        rate_limit = (result.get("data") or {}).pop("rateLimit", None)
+        if rate_limit and rate_limit.get("cost") is not None:
+            self.metrics.record_cost(graphql_operation(query), rate_limit["cost"])
+        return result
+
+    async def run_mutation_batch(self, field: str, items: List[Tuple[str, Dict]], shared: Optional[Dict] = None,
+                                 selection: str = "clientMutationId") -> Dict[str, Tuple[bool, str]]:
+        """批量执行带别名的 mutation，各批次并发提交 (语义同 GitHubEnterpriseTeamSync.run_mutation_batch)"""
+        size = GitHubEnterpriseTeamSync.MUTATION_BATCH_SIZE
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        outcomes = {}
+        for chunk_outcomes in await asyncio.gather(*(self._run_mutation_chunk(field, c, shared or {}, selection) for c in chunks)):
+            outcomes.update(chunk_outcomes)
+        return outcomes
+
+    async def _run_mutation_chunk(self, field: str, chunk: List[Tuple[str, Dict]], shared: Dict,
+                                  selection: str) -> Dict[str, Tuple[bool, str]]:
+        query, variables = build_mutation_batch(field, chunk, shared, selection)
+        try:
+            result = await self._graphql_raw(query, variables)
+        except Exception as e:
+            return mutation_request_failed(chunk, e)
+
+        outcomes, unresolved, general_errors = parse_mutation_batch(result, chunk)
+
+        if unresolved and general_errors and len(chunk) > 1:
+            # 批次整体失败时对半拆分；部分成功时只重试未完成的条目
+            if len(unresolved) == len(chunk):
+                mid = len(chunk) // 2
+                outcomes.update(await self._run_mutation_chunk(field, chunk[:mid], shared, selection))
+                outcomes.update(await self._run_mutation_chunk(field, chunk[mid:], shared, selection))
+            else:
+                outcomes.update(await self._run_mutation_chunk(field, unresolved, shared, selection))
+        else:
+            for key, _ in unresolved:
+                outcomes[key] = (False, "; ".join(general_errors) or "响应为空")
+        return outcomes
+
+    async def _fetch_page(self, url: str) -> Tuple[bool, object, Dict[str, str]]:
+        """
+        读取 REST 列表接口的一页
+
+        Returns:
+            (成功标志, 本页条目或错误信息, 解析后的 Link 头)
+        """
+        try:
+            response = await self._request("GET", url, "rest_read")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return False, {"error": str(e) or type(e).__name__}, {}
+        if response.status_code >= 400:
+            return False, {"error": f"{response.status_code} Error for url: {url} - {response.text}"}, {}
+        return True, json.loads(response.text) if response.text else [], parse_link_header(response.headers.get("Link"))
+
+    async def iter_pages(self, url: str) -> AsyncIterator[Tuple[bool, object]]:
+        """
+        按顺序逐页读取 REST 列表接口 (语义同 GitHubEnterpriseTeamSync.iter_pages)
+
+        Link 头带有 rel="last" 时其余各页作为并发任务提交 (并发数由 rest_read 信号量限制)，按页码顺序产出。
+
+        Yields:
+            (成功标志, 本页条目列表或错误信息)
+        """
+        page_size = GitHubEnterpriseTeamSync.PAGE_SIZE
+
+        def page_url(page: int) -> str:
+            return f"{url}?per_page={page_size}&page={page}"
+
+        success, data, links = await self._fetch_page(page_url(1))
+        yield success, data
+        if not success or not data:
+            return
+
+        last_page = last_page_number(links)
+        if last_page is not None:
+            tasks = [asyncio.ensure_future(self._fetch_page(page_url(page))) for page in range(2, last_page + 1)]
+            try:
+                for task in tasks:
+                    success, data, _ = await task
+                    yield success, data
+                    if not success:
+                        return
+            finally:
+                for task in tasks:
+                    task.cancel()
+            return
+
+        page = 1
+        while ("next" in links) if links else len(data) >= page_size:
+            page += 1
+            success, data, links = await self._fetch_page(page_url(page))
+            yield success, data
+            if not success or not data:
+                return
+
+    async def _paginate_rest(self, url: str) -> Tuple[bool, List[Dict]]:
+        """
+        读取 REST 列表接口的所有条目
+
+        Returns:
+            (成功标志, 所有条目)
+        """
+        items = []
+        async for success, data in self.iter_pages(url):
+            if not success:
+                return False, items
+            items.extend(data)
+        return True, items
+
+    # ==================== 读取 Enterprise 状态 ====================
+
+    async def fetch_enterprise_id(self):
+        """获取 Enterprise 的 Node ID (用于 GraphQL 操作)"""
+        cached = self.identity_cache.get("enterprise", self.enterprise) if self.identity_cache else None
+        if cached:
+            self.enterprise_id = cached["id"]
+            print(f"✓ 获取 Enterprise ID: {self.enterprise_id} (缓存)")
+            return
+        try:
+            data = await self._graphql_request(ENTERPRISE_ID_QUERY, {"slug": self.enterprise})
+            if data and data.get("enterprise"):
+                self.enterprise_id = data["enterprise"]["id"]
+                if self.identity_cache:
+                    self.identity_cache.set("enterprise", self.enterprise, {"id": self.enterprise_id})
+                print(f"✓ 获取 Enterprise ID: {self.enterprise_id}")
+            else:
+                print(f"⚠ 警告: 无法获取 Enterprise ID")
+        except Exception as e:
+            print(f"⚠ 警告: 获取 Enterprise ID 失败: {e}")
+
+    async def get_enterprise_members(self) -> Tuple[bool, MemberIndex]:
+        """获取 Enterprise 的所有成员 (大小写不敏感的成员索引)"""
+        if not self.enterprise_id:
+            return False, MemberIndex()
+
+        members = MemberIndex()
+        cursor = None
+        try:
+            while True:
+                variables = {"enterpriseId": self.enterprise_id}
+                if cursor:
+                    variables["cursor"] = cursor
+                data = await self._graphql_request(ENTERPRISE_MEMBERS_QUERY, variables)
+                if not data or not data.get("node"):
+                    break
+                members_data = data["node"].get("members", {})
+                for edge in members_data.get("edges", []):
+                    login = (edge.get("node") or {}).get("login")
+                    if login:
+                        members.add(login)
+                page_info = members_data.get("pageInfo", {})
+                if not page_info.get("hasNextPage"):
+                    break
+                cursor = page_info.get("endCursor")
+            return True, members
+        except Exception as e:
+            print(f"  ⚠️  无法获取企业成员列表: {e}")
+            return False, MemberIndex()
+
+    async def _get_invitations(self, query: str, field: str) -> Tuple[bool, List[Dict]]:
+        """按游标读取一类 Enterprise 待处理邀请的全部节点，返回 (成功标志, 节点列表)"""
+        nodes = []
+        cursor = None
+        try:
+            while True:
+                variables = {"slug": self.enterprise}
+                if cursor:
+                    variables["cursor"] = cursor
+                data = await self._graphql_request(query, variables)
+                owner_info = ((data or {}).get("enterprise") or {}).get("ownerInfo") or {}
+                connection = owner_info.get(field) or {}
+                nodes.extend(edge["node"] for edge in connection.get("edges", []) if edge.get("node"))
+                page_info = connection.get("pageInfo") or {}
+                if not page_info.get("hasNextPage"):
+                    break
+                cursor = page_info.get("endCursor")
+        except Exception as e:
+            print(f"  ⚠️  获取 {field} 出错: {e}")
+            return False, nodes
+        return True, nodes
+
+    async def get_pending_invitations(self) -> InvitationIndex:
+        """获取 Enterprise 的待处理邀请索引 (两类邀请并发读取，同一邮箱以 EnterpriseMemberInvitation 为准)"""
+        if not self.enterprise_id:
+            return InvitationIndex(loaded=False)
+
+        (unaffiliated_ok, unaffiliated), (member_ok, member) = await asyncio.gather(
+            self._get_invitations(PENDING_UNAFFILIATED_INVITATIONS_QUERY, "pendingUnaffiliatedMemberInvitations"),
+            self._get_invitations(PENDING_MEMBER_INVITATIONS_QUERY, "pendingMemberInvitations")
+        )
+        invitations = []
+        for node in unaffiliated:
+            invitations.append({
+                "id": node.get("id"),
+                "email": node.get("email"),
+                "created_at": node.get("createdAt", ""),
+                "invitee": (node.get("invitee") or {}).get("login")
+            })
+        for node in member:
+            invitations.append({
+                "id": node.get("id"),
+                "email": node.get("email"),
+                "created_at": node.get("createdAt", ""),
+                "invitee": (node.get("invitee") or {}).get("login"),
+                "type": "organization_invitation"
+            })
+        return InvitationIndex([inv for inv in invitations if inv["id"] and (inv["email"] or inv["invitee"])],
+                               loaded=unaffiliated_ok and member_ok)
+
+    async def get_enterprise_teams(self) -> Tuple[bool, Dict[str, Dict]]:
+        """获取 Enterprise 下的所有 Teams {name_lower: {id, slug, name}}"""
+        success, items = await self._paginate_rest(f"{self.base_url}/enterprises/{self.enterprise}/teams")
+        if not success:
+            return False, {}
+        return True, {t["name"].lower(): {"id": t["id"], "slug": t["slug"], "name": t["name"]} for t in items}
+
+    async def get_enterprise_organizations(self) -> Tuple[bool, Dict[str, Dict]]:
+        """获取 Enterprise 下的所有 Organizations {login_lower: {id, login, name}}"""
+        if not self.enterprise_id:
+            return False, {}
+
+        orgs = {}
+        cursor = None
+        try:
+            while True:
+                variables = {"slug": self.enterprise}
+                if cursor:
+                    variables["cursor"] = cursor
+                data = await self._graphql_request(ENTERPRISE_ORGANIZATIONS_QUERY, variables)
+                if not data or not data.get("enterprise"):
+                    break
+                orgs_data = data["enterprise"].get("organizations", {})
+                for org in orgs_data.get("nodes", []):
+                    if org and org.get("login"):
+                        orgs[org["login"].lower()] = {"id": org.get("id"), "login": org["login"], "name": org.get("name")}
+                page_info = orgs_data.get("pageInfo", {})
+                if not page_info.get("hasNextPage"):
+                    break
+                cursor = page_info.get("endCursor")
+            return True, orgs
+        except Exception as e:
+            print(f"  ⚠️  获取 Organizations 失败: {e}")
+            return False, {}
+
+    async def build_snapshot(self, team_names: Optional[List[str]] = None,
+                             org_logins: Optional[List[str]] = None) -> EnterpriseSnapshot:
+        """
+        并发读取 Enterprise 状态快照
+
+        Args:
+            team_names: 本次要同步的 Team 名称 (全部命中持久化缓存时不读取 Team 列表)
+            org_logins: 本次要同步的 Organization login (全部命中持久化缓存时不读取 Organization 列表)
+        """
+        (members_loaded, members), pending, teams_loaded, orgs_loaded = await asyncio.gather(
+            self.get_enterprise_members(),
+            self.get_pending_invitations(),
+            self.teams.preload(team_names),
+            self.orgs.preload(org_logins)
+        )
+        teams = len(self.teams) if self.teams.complete else f"{len(self.teams)} (缓存)"
+        orgs = len(self.orgs) if self.orgs.complete else f"{len(self.orgs)} (缓存)"
+        print(f"📸 Enterprise 成员: {len(members)}, 待处理邀请: {len(pending)}, Teams: {teams}, Organizations: {orgs}")
+        if not pending.loaded:
+            print("  ⚠️  无法完整获取 Enterprise 待处理邀请列表，本次不发送 Enterprise 邀请")
+        return EnterpriseSnapshot(members, pending, self.teams, self.orgs, members_loaded=members_loaded,
+                                  teams_loaded=teams_loaded, orgs_loaded=orgs_loaded)
+
+    async def resolve_users(self, logins: List[str]) -> Dict[str, Dict]:
+        """批量解析用户的 Node ID、数据库 ID 和公开邮箱 {login_lower: {login, node_id, database_id, email}}"""
+        missing = [l for l in dict.fromkeys(l for l in logins if l) if l.lower() not in self.identities]
+        if missing and self.identity_cache:
+            self.identities.update(self.identity_cache.get_many("user", missing))
+            missing = [l for l in missing if l.lower() not in self.identities]
+        batch_size = GitHubEnterpriseTeamSync.USER_LOOKUP_BATCH_SIZE
+        chunks = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+
+        async def lookup(chunk):
+            variables = {f"l{i}": login for i, login in enumerate(chunk)}
+            try:
+                data = await self._graphql_request(build_user_lookup_query(len(chunk)), variables, allow_partial=True)
+            except Exception as e:
+                print(f"  ⚠️ 批量解析用户失败: {e}")
+                return
+            fetched = {}
+            for i, login in enumerate(chunk):
+                user = (data or {}).get(f"u{i}")
+                if user:
+                    fetched[login.lower()] = {
+                        "login": user.get("login") or login,
+                        "node_id": user.get("id"),
+                        "database_id": user.get("databaseId"),
+                        "email": user.get("email")
+                    }
+            self.identities.update(fetched)
+            if self.identity_cache:
+                self.identity_cache.set_many("user", fetched)
+
+        await asyncio.gather(*(lookup(chunk) for chunk in chunks))
+        return {l.lower(): self.identities[l.lower()] for l in logins if l and l.lower() in self.identities}
+
+    def invalidate_identity(self, login: str):
+        """使用户的身份记录失效 (使用该身份的变更失败时调用，下次重新查询)"""
+        self.identities.pop(login.lower(), None)
+        if self.identity_cache:
+            self.identity_cache.invalidate("user", login)
+
+    # ==================== Enterprise 变更 ====================
+
+    async def cancel_enterprise_invitation(self, invitation_id: str) -> Tuple[bool, str]:
+        """撤销 Enterprise 邀请"""
+        try:
+            await self._graphql_request(CANCEL_MEMBER_INVITATION_MUTATION, {"invitationId": invitation_id})
+        except Exception as e:
+            try:
+                await self._graphql_request(CANCEL_ADMIN_INVITATION_MUTATION, {"invitationId": invitation_id})
+            except Exception as e2:
+                return False, f"撤销邀请失败: member={str(e)}, admin={str(e2)}"
+        self.snapshot.remove_invitation(invitation_id)
+        return True, "已撤销邀请"
+
+    async def reinvite_once(self, email: str, username: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        撤销旧的待处理邀请并重新邀请，同一邮箱在一次运行中只执行一次
+
+        多个 Team 并发邀请同一用户时，后来者等待并共享第一次邀请的结果，避免重复邀请被拒绝。
+        """
+        key = email.lower()
+        if key not in self.invite_tasks:
+            async def reinvite():
+                old_inv = self.snapshot.pending_invitations.find(email=email, login=username)
+                if old_inv:
+                    await self.cancel_enterprise_invitation(old_inv["id"])
+                return await self.invite_to_enterprise(email)
+            self.invite_tasks[key] = asyncio.ensure_future(reinvite())
+        return await asyncio.shield(self.invite_tasks[key])
+
+    async def invite_to_enterprise(self, email: str) -> Tuple[bool, str]:
+        """邀请用户加入 Enterprise，若已存在待处理邀请则撤销后重发一次"""
+        if not self.enterprise_id:
+            return False, "无法邀请: Enterprise ID 未获取"
+
+        variables = {"enterpriseId": self.enterprise_id, "email": email}
+        for attempt in range(2):
+            try:
+                data = await self._graphql_request(INVITE_ENTERPRISE_MEMBER_MUTATION, variables)
+                invitation = ((data or {}).get("inviteEnterpriseMember") or {}).get("invitation")
+                if invitation:
+                    self.snapshot.add_invitation(email, {
+                        "id": invitation["id"],
+                        "email": invitation.get("email") or email,
+                        "created_at": datetime.now().isoformat(),
+                        "invitee": None
+                    })
+                    self.invitation_ledger.record_sent("enterprise", email, invitation["id"])
+                    return True, f"已发送邀请 (ID: {invitation['id']})"
+                return False, f"响应异常: {str(data)[:100]}"
+            except Exception as e:
+                error_msg = str(e)
+                old_inv = self.snapshot.pending_invitations.find(email=email)
+                if attempt == 0 and old_inv and ("duplicate" in error_msg.lower() or "already" in error_msg.lower()):
+                    await self.cancel_enterprise_invitation(old_inv["id"])
+                    continue
+                return False, f"邀请失败: {error_msg[:100]}"
+        return False, "邀请失败"
+
+    async def remove_from_enterprise(self, username: str) -> Tuple[bool, str]:
+        """从 Enterprise 移除成员"""
+        return (await self.remove_from_enterprise_batch([username]))[username]
+
+    async def bulk_update_team_members(self, team_id: int, action: str, usernames: List[str]) -> Dict[str, Tuple[bool, str]]:
+        """
+        使用 Team 批量成员接口添加或移除成员 (见 GitHubEnterpriseTeamSync.bulk_update_team_members)
+
+        Returns:
+            已确定结果的用户 {username: (成功标志, 消息)}，其余用户由调用方逐个处理
+        """
+        url = f"{self.base_url}/enterprises/{self.enterprise}/teams/{team_id}/memberships/{action}"
+        message = "已添加到 Team" if action == "add" else "已从 Team 移除"
+        size = GitHubEnterpriseTeamSync.TEAM_MEMBERSHIP_BATCH_SIZE
+
+        async def post(chunk: List[str]) -> Dict[str, Tuple[bool, str]]:
+            if not self.bulk_team_memberships:
+                return {}
+            try:
+                response = await self._request("POST", url, "rest_write", idempotent=True, json={"usernames": chunk})
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return {}
+            if response.status_code in GitHubEnterpriseTeamSync.BULK_UNAVAILABLE_STATUSES:
+                if self.bulk_team_memberships:
+                    print(f"  ⚠️  Team 批量成员接口不可用 ({response.status_code})，改为逐个处理")
+                self.bulk_team_memberships = False
+                return {}
+            if response.status_code >= 400:
+                return {}
+            try:
+                processed = parse_bulk_memberships(json.loads(response.text) if response.text else None, chunk)
+            except ValueError:
+                return {}
+            return {username: (True, message) for username in chunk if normalize_login(username) in processed}
+
+        results = {}
+        for outcome in await asyncio.gather(*(post(usernames[start:start + size])
+                                              for start in range(0, len(usernames), size))):
+            results.update(outcome)
+        return results
+
+    async def remove_from_enterprise_batch(self, usernames: List[str]) -> Dict[str, Tuple[bool, str]]:
+        """批量从 Enterprise 移除成员 (批量解析用户 ID + 批量 removeEnterpriseMember mutation)"""
+        if not self.enterprise_id:
+            return {username: (False, "无法移除: Enterprise ID 未获取") for username in usernames}
+
+        results = {}
+        items = []
+        identities = await self.resolve_users(usernames)
+        for username in dict.fromkeys(usernames):
+            identity = identities.get(username.lower())
+            if identity and identity.get("node_id"):
+                items.append((username, {"userId": ("ID!", identity["node_id"])}))
+            else:
+                results[username] = (False, f"找不到用户 {username}")
+
+        outcomes = await self.run_mutation_batch(
+            "removeEnterpriseMember", items,
+            shared={"enterpriseId": ("ID!", self.enterprise_id)}
+        )
+        for username, (success, error) in outcomes.items():
+            if success:
+                self.snapshot.remove_member(username)
+                results[username] = (True, "已从 Enterprise 移除")
+            else:
+                self.invalidate_identity(username)
+                results[username] = (False, f"移除失败: {error}")
+        return results
+
+    # ==================== Organization 同步 ====================
+
+    async def get_or_create_organization(self, org_login: str, admin_login: str, billing_email: str) -> Tuple[bool, object]:
+        """获取或创建 Organization"""
+        org = await self.orgs.get(org_login)
+        if org:
+            return True, org
+        if not self.orgs.complete:
+            return False, "无法获取 Organizations 列表"
+        if not self.enterprise_id:
+            return False, "无法创建: Enterprise ID 未获取"
+        if not billing_email:
+            return False, "无法创建: 需要提供 billing_email"
+
+        print(f"  📝 [{org_login}] Organization 不存在，正在创建...")
+        try:
+            data = await self._graphql_request(CREATE_ORGANIZATION_MUTATION, {
+                "enterpriseId": self.enterprise_id,
+                "login": org_login,
+                "profileName": org_login,
+                "adminLogins": [admin_login],
+                "billingEmail": billing_email
+            })
+            org = data["createEnterpriseOrganization"]["organization"]
+            org = {"id": org.get("id"), "login": org["login"], "name": org.get("name")}
+            self.snapshot.add_org(org)
+            return True, org
+        except Exception as e:
+            return False, f"创建失败: {str(e)}"
+
+    async def _invite_to_organization(self, org_login: str, username: str, email: str) -> Tuple[bool, str]:
+        """通过邮箱或用户 ID 邀请用户加入 Organization"""
+        payload = {"role": "member"}
+        if email:
+            payload["email"] = email
+        else:
+            identity = (await self.resolve_users([username])).get(username.lower())
+            if not identity or not identity.get("database_id"):
+                return False, f"找不到用户 {username}"
+            payload["invitee_id"] = identity["database_id"]
+        success, data = await self._make_request("POST", f"{self.base_url}/orgs/{org_login}/invitations", json=payload)
+        if not success and "invitee_id" in payload:
+            self.invalidate_identity(username)
+        if success:
+            self.invitation_ledger.record_sent(f"org/{org_login.lower()}", email or username,
+                                               data.get("id") if isinstance(data, dict) else None)
+        return (True, "已发送邀请") if success else (False, f"邀请失败: {data}")
+
+    async def sync_organization(self, org_config: Dict) -> Dict:
+        """
+        同步单个 Organization 的成员
+
+        Args:
+            org_config: Organization 配置 {login, admin, billing_email, members: [...]}
+
+        Returns:
+            同步报告
+        """
+        org_login = org_config.get("login")
+        org_report = {"login": org_login, "added": [], "removed": [], "invited": [], "pending": [], "deferred": [],
+                      "errors": []}
+
+        for attempt in range(2):
+            success, result = await self.get_or_create_organization(
+                org_login, org_config.get("admin", ""), org_config.get("billing_email", ""))
+            if not success:
+                org_report["errors"].append(f"无法获取/创建 Organization: {result}")
+                return org_report
+
+            (success, members), (_, invitations) = await asyncio.gather(
+                self._paginate_rest(f"{self.base_url}/orgs/{org_login}/members"),
+                self._paginate_rest(f"{self.base_url}/orgs/{org_login}/invitations")
+            )
+            # 索引中的条目可能来自已过期的持久化缓存，使其失效并重新读取列表后再确认一次
+            if success or attempt or not self.orgs.discard(org_login):
+                break
+        if not success:
+            org_report["errors"].append("无法获取 Organization 成员列表")
+            return org_report
+
+        pending = {}
+        for inv in invitations:
+            key = (inv.get("email") or inv.get("login") or "").lower()
+            if key:
+                pending[key] = inv
+
+        current_identifiers = MemberIndex(m["login"] for m in members)
+        target_identifiers = normalize_members(org_config.get("members", []))
+        to_remove = sorted(current_identifiers.keys() - target_identifiers.keys())
+
+        # 仍然有效的待处理邀请保留不动，其余用户 (撤销过期的旧邀请后) 在邀请额度内重新邀请
+        scope = f"org/{org_login.lower()}"
+        candidates, old_invitations = [], {}
+        for key in sorted(target_identifiers.keys() - current_identifiers.keys()):
+            info = target_identifiers[key]
+            old_inv = pending.get(info['email'].lower()) if info['email'] else None
+            old_inv = old_inv or pending.get(key)
+            if old_inv and self.invitation_ledger.is_fresh(old_inv, scope, info['email'] or key):
+                org_report["pending"].append(info['username'])
+                continue
+            candidates.append({"scope": scope, "identifier": info['email'] or key,
+                               "priority": org_config.get("invite_priority", 0), "key": key})
+            if old_inv:
+                old_invitations[key] = old_inv["id"]
+        released, deferred = self.invitation_ledger.schedule(candidates)
+        org_report["deferred"] = [target_identifiers[c["key"]]['username'] for c in deferred]
+        to_add = [c["key"] for c in released]
+        print(f"🔍 [{org_login}] 当前 {len(current_identifiers)}，目标 {len(target_identifiers)}，"
+              f"添加 {len(to_add)}，保留邀请 {len(org_report['pending'])}，延后 {len(deferred)}，移除 {len(to_remove)}")
+
+        async def add(key):
+            info = target_identifiers[key]
+            if key in old_invitations:
+                await self._make_request("DELETE", f"{self.base_url}/orgs/{org_login}/invitations/{old_invitations[key]}")
+            return await self._invite_to_organization(org_login, info['username'], info['email'])
+
+        async def remove(key):
+            success, data = await self._make_request(
+                "DELETE", f"{self.base_url}/orgs/{org_login}/members/{current_identifiers[key]}")
+            return (True, "已从 Organization 移除") if success else (False, f"移除失败: {data}")
+
+        await self.resolve_users([target_identifiers[k]['username'] for k in to_add if not target_identifiers[k]['email']])
+        add_results = await asyncio.gather(*(add(key) for key in to_add))
+        remove_results = await asyncio.gather(*(remove(key) for key in to_remove))
+
+        for candidate, (success, message) in zip(released, add_results):
+            username = target_identifiers[candidate["key"]]['username']
+            if success:
+                org_report["invited"].append(username)
+            elif invitation_quota_error(message):
+                self.invitation_ledger.defer(candidate)
+                org_report["deferred"].append(username)
+            else:
+                org_report["errors"].append(f"{username}: {message}")
+        for key, (success, message) in zip(to_remove, remove_results):
+            username = current_identifiers[key]
+            if success:
+                org_report["removed"].append(username)
+            else:
+                org_report["errors"].append(f"{username}: {message}")
+
+        return org_report
+
+    # ==================== Team 同步 ====================
+
+    async def get_or_create_team(self, team_name: str) -> Tuple[bool, object]:
+        """获取或创建 Enterprise Team"""
+        team = await self.teams.get(team_name)
+        if team:
+            return True, team
+        if not self.teams.complete:
+            return False, "无法获取 teams 列表"
+
+        print(f"  📝 [{team_name}] Team 不存在，正在创建...")
+        success, data = await self._make_request(
+            "POST", f"{self.base_url}/enterprises/{self.enterprise}/teams", json={"name": team_name})
+        if not success:
+            return False, f"创建 Team 失败: {data}"
+        team = {"id": data.get("id"), "slug": data.get("slug"), "name": data.get("name") or team_name}
+        self.snapshot.add_team(team)
+        return True, team
+
+    async def sync_team(self, team_config: Dict) -> Dict:
+        """
+        同步单个 Team 的成员
+
+        Args:
+            team_config: Team 配置 {name, members: [...], id?, slug?}
+
+        Returns:
+            同步报告
+        """
+        team_name = team_config.get("name")
+        team_id = team_config.get("id")
+        team_slug = team_config.get("slug")
+        team_report = {"name": team_name, "id": team_id, "slug": team_slug,
+                       "added": [], "removed": [], "invited": [], "pending": [], "deferred": [], "errors": []}
+
+        for attempt in range(2):
+            if not team_config.get("id"):
+                success, result = await self.get_or_create_team(team_name)
+                if not success:
+                    team_report["errors"].append(result)
+                    return team_report
+                team_id, team_slug = result["id"], result["slug"]
+                team_report.update({"id": team_id, "slug": team_slug})
+
+            memberships_url = f"{self.base_url}/enterprises/{self.enterprise}/teams/{team_id}/memberships"
+            success, members = await self._paginate_rest(memberships_url)
+            # 索引中的 Team ID 可能来自已过期的持久化缓存，使其失效并重新读取列表后再试一次
+            if success or attempt or team_config.get("id") or not self.teams.discard(team_name):
+                break
+        if not success:
+            team_report["errors"].append("无法获取 Team 成员列表")
+            return team_report
+
+        enterprise_members = self.snapshot.members
+        current_identifiers = MemberIndex(m["login"] for m in members)
+        target_identifiers = normalize_members(team_config.get("members", []))
+        to_add = sorted(target_identifiers.keys() - current_identifiers.keys())
+        to_remove = sorted(current_identifiers.keys() - target_identifiers.keys())
+        print(f"🔍 [{team_name}] 当前 {len(current_identifiers)}，目标 {len(target_identifiers)}，"
+              f"添加 {len(to_add)}，移除 {len(to_remove)}")
+
+        direct_keys = [k for k in to_add if k in enterprise_members or not target_identifiers[k]['email']]
+        invite_keys, candidates = [], []
+        # 仍然有效的 Enterprise 邀请保留不动，只对没有邀请或邀请已过期的用户重新邀请
+        # (其他 Team 已放行的同一邮箱邀请直接共享结果，不再占用邀请额度)
+        for key in to_add:
+            if key in direct_keys:
+                continue
+            info = target_identifiers[key]
+            if not self.snapshot.invitations_loaded:
+                # 邀请列表不完整时无法确认用户没有待处理邀请，跳过邀请以免重复发送
+                team_report["errors"].append(f"{info['email']}: 无法完整获取 Enterprise 待处理邀请列表，跳过邀请")
+                continue
+            old_inv = self.snapshot.pending_invitations.find(email=info['email'], login=info['username'])
+            if info['email'].lower() in self.scheduled_invites:
+                invite_keys.append(key)
+            elif old_inv and self.invitation_ledger.is_fresh(old_inv, "enterprise", info['email']):
+                team_report["pending"].append(info['email'])
+            else:
+                candidates.append({"scope": "enterprise", "identifier": info['email'],
+                                   "priority": team_config.get("invite_priority", 0), "key": key})
+        released, deferred = self.invitation_ledger.schedule(candidates)
+        self.scheduled_invites.update(c["identifier"].lower() for c in released)
+        invite_keys += [c["key"] for c in released]
+        team_report["deferred"] = [target_identifiers[c["key"]]['email'] for c in deferred]
+        quota_candidates = {c["key"]: c for c in released}
+
+        # 优先使用批量接口，批量接口没有给出结果的用户再逐个处理
+        bulk_added, bulk_removed = await asyncio.gather(
+            self.bulk_update_team_members(team_id, "add", [target_identifiers[k]['username'] for k in direct_keys]),
+            self.bulk_update_team_members(team_id, "remove", [current_identifiers[k] for k in to_remove])
+        )
+
+        async def put(key):
+            username = target_identifiers[key]['username']
+            if username in bulk_added:
+                return bulk_added[username]
+            success, data = await self._make_request("PUT", f"{memberships_url}/{username}")
+            return (True, "已添加到 Team") if success else (False, f"添加失败: {data}")
+
+        async def delete(key):
+            username = current_identifiers[key]
+            if username in bulk_removed:
+                return bulk_removed[username]
+            success, data = await self._make_request("DELETE", f"{memberships_url}/{username}")
+            return (True, "已从 Team 移除") if success else (False, f"移除失败: {data}")
+
+        async def invite(key):
+            return await self.reinvite_once(target_identifiers[key]['email'], target_identifiers[key]['username'])
+
+        add_results, invite_results, remove_results = await asyncio.gather(
+            asyncio.gather(*(put(k) for k in direct_keys)),
+            asyncio.gather(*(invite(k) for k in invite_keys)),
+            asyncio.gather(*(delete(k) for k in to_remove))
+        )
+
+        for key, (success, message) in zip(direct_keys, add_results):
+            username = target_identifiers[key]['username']
+            if success:
+                team_report["added"].append(username)
+            elif key not in enterprise_members and "cannot be found in the enterprise" in str(message).lower():
+                team_report["errors"].append(f"{username}: 用户不在 Enterprise 中，需要提供 email 才能发送邀请")
+            else:
+                team_report["errors"].append(f"{username}: {message}")
+        for key, (success, message) in zip(invite_keys, invite_results):
+            email = target_identifiers[key]['email']
+            if success:
+                team_report["invited"].append(email)
+            elif invitation_quota_error(message):
+                if key in quota_candidates:
+                    self.invitation_ledger.defer(quota_candidates[key])
+                team_report["deferred"].append(email)
+            else:
+                team_report["errors"].append(f"{email}: {message}")
+        for key, (success, message) in zip(to_remove, remove_results):
+            username = current_identifiers[key]
+            if success:
+                team_report["removed"].append(username)
+            else:
+                team_report["errors"].append(f"{username}: {message}")
+
+        return team_report
+
+    # ==================== 整体流程 ====================
+
+    async def cleanup_enterprise_members(self, config: Dict, all_config_usernames: Set[str]):
+        """清理 Enterprise 成员：移除不在 reserved_members 和 teams 配置中的成员"""
+        if not self.snapshot.members_loaded:
+            print(f"  ⚠️  无法获取 Enterprise 成员列表，跳过清理")
+            return
+
+        protected_users = reserved_usernames(config.get("reserved_members", [])) | all_config_usernames
+        to_remove = sorted(login for key, login in self.snapshot.members.items() if key not in protected_users)
+        print(f"🧹 需要从 Enterprise 移除: {len(to_remove)} 人")
+
+        self.report.setdefault("enterprise_removed", [])
+        self.report.setdefault("enterprise_remove_errors", [])
+        results = await self.remove_from_enterprise_batch(to_remove)
+        for username, (success, message) in sorted(results.items()):
+            if success:
+                self.report["enterprise_removed"].append(username)
+            else:
+                self.report["enterprise_remove_errors"].append(f"{username}: {message}")
+
+    async def _guarded(self, coro, fallback: Dict) -> Dict:
+        """限制同时同步的资源数；单个资源同步出错时记录到其报告中，不影响其他任务"""
+        try:
+            async with self.resource_semaphore:
+                return await coro
+        except Exception as e:
+            fallback["errors"].append(f"同步失败: {e}")
+            return fallback
+
+    async def sync_from_config(self, config_file: str, state_file: Optional[str] = None, incremental: bool = False,
+                               full_sync_interval: float = GitHubEnterpriseTeamSync.DEFAULT_FULL_SYNC_INTERVAL) -> Dict:
+        """
+        从配置文件同步所有 Teams 和 Organizations
+
+        Args:
+            config_file: JSON 配置文件路径
+            state_file: 同步状态文件路径 (语义同 GitHubEnterpriseTeamSync.sync_from_config)
+            incremental: 是否只同步期望状态有变化的资源
+            full_sync_interval: 增量模式下的全量同步间隔 (秒)
+
+        Returns:
+            同步报告数据
+        """
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        if config.get("enterprise") != self.enterprise:
+            print(f"⚠️  配置文件中的 enterprise ({config.get('enterprise')}) 与初始化不一致 ({self.enterprise})")
+
+        orgs = [o for o in config.get("orgs", []) if o.get("login")]
+        teams = [t for t in config.get("teams", []) if t.get("name")]
+        all_config_usernames = set()
+        for resource in orgs + teams:
+            all_config_usernames |= config_usernames(resource.get("members", []))
+
+        # 增量模式：只同步期望状态发生变化的资源
+        hashes = resource_hashes(config)
+        state = SyncState.load(state_file) if state_file else None
+        selected = state.select(hashes, self.enterprise, full_sync_interval) if state and incremental else None
+        if incremental and state and selected is None:
+            print("🔁 没有可用的上次全量同步记录或已超过全量同步间隔，执行全量同步")
+        if selected is not None:
+            orgs = [o for o in orgs if f"org:{o['login'].lower()}" in selected]
+            teams = [t for t in teams if f"team:{t['name'].lower()}" in selected]
+            print(f"⚡ 增量同步: {len(selected)} 个资源的期望状态有变化")
+            if not selected:
+                print("✅ 配置与上次成功同步一致，无需同步")
+                state.record(config, hashes, set(), set(), False, self.enterprise)
+                state.save()
+                return self.report
+
+        print(f"\n🚀 开始同步 Enterprise: {self.enterprise} (asyncio)")
+        print(f"📝 共需处理 {len(teams)} 个 Enterprise Team(s)，{len(orgs)} 个 Organization(s)")
+
+        await self.fetch_enterprise_id()
+        self.snapshot = await self.build_snapshot([t["name"] for t in teams], [o["login"] for o in orgs])
+
+        # 所有 Organization 和 Team 并发同步，按邀请优先级从高到低启动 (先占用邀请额度)，报告按配置顺序排列
+        jobs = [(o, self._guarded(self.sync_organization(o),
+                                  {"login": o["login"], "added": [], "removed": [], "invited": [], "pending": [],
+                                   "deferred": [], "errors": []}))
+                for o in orgs]
+        jobs += [(t, self._guarded(self.sync_team(t),
+                                   {"name": t["name"], "slug": None, "added": [], "removed": [], "invited": [],
+                                    "pending": [], "deferred": [], "errors": []}))
+                 for t in teams]
+        order = sorted(range(len(jobs)), key=lambda position: -jobs[position][0].get("invite_priority", 0))
+        tasks = {position: asyncio.ensure_future(jobs[position][1]) for position in order}
+        results = await asyncio.gather(*(tasks[position] for position in range(len(jobs))))
+        self.report["orgs"] = list(results[:len(orgs)])
+        self.report["teams"] = list(results[len(orgs):])
+
+        # 清理必须在所有 Team 同步完成之后执行
+        if selected is None or "enterprise" in selected:
+            await self.cleanup_enterprise_members(config, all_config_usernames)
+
+        self.report["invite_quota"] = invite_quota_report(self.invitation_ledger, [o["login"] for o in orgs])
+        render_report(self.report, self.rate_limiter.budget(), self.rate_limiter.total_wait)
+
+        if state:
+            synced = set(hashes) if selected is None else selected
+            cleanup_ok = self.snapshot.members_loaded and "enterprise" in synced
+            state.record(config, hashes, converged_resources(self.report, cleanup_ok), synced,
+                         selected is None, self.enterprise)
+            state.save()
+            print(f"💾 同步状态已保存到: {state_file}")
+        return self.report
+
+
+async def run(token: str, enterprise: str, config_file: str, base_url: str,
+              identity_cache: Optional[IdentityCache] = None, response_cache: Optional[ResponseCache] = None,
+              resource_concurrency: int = AsyncGitHubEnterpriseTeamSync.DEFAULT_RESOURCE_CONCURRENCY,
+              graphql_url: Optional[str] = None, metrics_file: Optional[str] = None,
+              prometheus_file: Optional[str] = None, retry_policy: Optional[RetryPolicy] = None,
+              invitation_ledger: Optional[InvitationLedger] = None, **sync_options) -> Dict:
+    """创建异步同步器并执行一次同步 (sync_options 传给 sync_from_config)，结束后导出请求指标并写入邀请记录"""
+    async with AsyncGitHubEnterpriseTeamSync(token, enterprise, base_url=base_url, graphql_url=graphql_url,
+                                             identity_cache=identity_cache,
+                                             response_cache=response_cache,
+                                             resource_concurrency=resource_concurrency,
+                                             retry_policy=retry_policy,
+                                             invitation_ledger=invitation_ledger) as syncer:
+        try:
+            return await syncer.sync_from_config(config_file, **sync_options)
+        finally:
+            export_metrics(syncer.metrics, syncer.rate_limiter, metrics_file, prometheus_file)
+            save_invitation_ledger(syncer.invitation_ledger)
+
+
+def main():
+    """主函数"""
+    args = build_arg_parser("GitHub Enterprise Team 同步工具 (asyncio)", plan_options=False).parse_args()
+    token = args.token
+    config_file = args.config_file
+    state_file = args.state_file or ("sync_state.json" if args.incremental else None)
+    base_url = os.environ.get("GITHUB_API_URL", GitHubEnterpriseTeamSync.DEFAULT_BASE_URL)
+    graphql_url = os.environ.get("GITHUB_GRAPHQL_URL")
+    cache_dir = os.environ.get("SYNC_CACHE_DIR")
+    cache_ttl = float(os.environ.get("SYNC_CACHE_TTL", IdentityCache.DEFAULT_TTL))
+    resource_concurrency = int(os.environ.get("SYNC_RESOURCE_WORKERS",
+                                              AsyncGitHubEnterpriseTeamSync.DEFAULT_RESOURCE_CONCURRENCY))
+
+    if not token:
+        print("❌ 错误: 未提供 GitHub Token")
+        print("使用方法: python async_sync.py config.json [token]")
+        sys.exit(1)
+
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            enterprise = json.load(f).get("enterprise")
+    except Exception as e:
+        print(f"❌ 读取配置文件失败: {e}")
+        sys.exit(1)
+    if not enterprise:
+        print("❌ 错误: 配置文件中缺少 'enterprise' 字段")
+        sys.exit(1)
+
+    identity_cache = None
+    response_cache = None
+    if cache_dir:
+        identity_cache = IdentityCache(os.path.join(cache_dir, "identity_cache.sqlite"),
+                                       namespace=base_url, ttl=cache_ttl)
+        response_cache = ResponseCache(os.path.join(cache_dir, "response_cache.sqlite"), token=token)
+    asyncio.run(run(token, enterprise, config_file, base_url, identity_cache, response_cache,
+                    resource_concurrency=resource_concurrency, graphql_url=graphql_url, state_file=state_file, incremental=args.incremental,
+                    full_sync_interval=args.full_sync_interval * 3600,
+                    metrics_file=args.metrics_out, prometheus_file=args.prometheus_file,
+                    retry_policy=retry_policy_from_env(),
+                    invitation_ledger=invitation_ledger_from_args(args, cache_dir)))
+
+
+if __name__ == "__main__":
+    main()
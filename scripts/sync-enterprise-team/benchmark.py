@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+同步流程的基准测试
+
+对 fake_github.py 生成的合成 Enterprise 端到端运行 sync_from_config (进程内传输，不经过网络)，
+按阶段 (snapshot / plan_orgs / plan_teams / plan_cleanup / apply / enterprise_cleanup / report)
+记录耗时、各接口的请求数和内存峰值，并与预算文件比较：任一阶段的请求数或耗时超出预算时返回非零退出码，
+用于在上线前发现随规模平方增长的 API 调用。
+
+用法:
+    python benchmark.py                          # 运行全部场景并检查预算
+    python benchmark.py --scenario small medium  # 只运行部分场景
+    python benchmark.py --update-budgets         # 以本次结果重新生成预算文件
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fake_github import FakeEnterprise, FakeGitHubAdapter, FakeGitHubApp
+from sync_team import GitHubEnterpriseTeamSync
+
+
+# 场景: 合成 Enterprise 的规模和配置相对当前状态的变化量
+SCENARIOS = {
+    "small": {"users": 1000, "teams": 10, "team_size": 20, "orgs": 2, "org_size": 100,
+              "pending_invitations": 20, "outside_users": 20},
+    "medium": {"users": 10000, "teams": 100, "team_size": 50, "orgs": 5, "org_size": 1000,
+               "pending_invitations": 200, "outside_users": 200},
+    "large": {"users": 100000, "teams": 1000, "team_size": 50, "orgs": 20, "org_size": 2000,
+              "pending_invitations": 1000, "outside_users": 1000},
+}
+
+DEFAULT_BUDGETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_budgets.json")
+
+# 由本次结果生成预算时留出的余量: 请求数为确定值，只留少量余量；耗时受机器影响，余量较大
+REQUEST_HEADROOM = 1.1
+TIME_HEADROOM = 3.0
+MIN_TIME_BUDGET = 1.0
+
+
+def build_config(enterprise: FakeEnterprise, seed: int = 0) -> Dict:
+    """
+    基于合成 Enterprise 生成一份有变化的配置
+
+    - 每个 Team 移除 2 个成员、新增 2 个 Enterprise 成员；每 5 个 Team 中有一个新增外部用户 (需要 Enterprise 邀请)
+    - 新增 teams / 20 个 (至少 1 个) 不存在的 Team
+    - 每个 Organization 移除 2 个成员、邀请 2 个新成员；新增一个不存在的 Organization
+    - 不在任何配置中的成员约 1% 不在 reserved_members 中 (将被移出 Enterprise)
+
+    Args:
+        enterprise: 合成的 Enterprise
+        seed: 随机种子
+
+    Returns:
+        配置字典
+    """
+    rng = random.Random(seed)
+    members = enterprise.sorted_members()
+    outside = sorted(login for login in enterprise.users if login not in enterprise.members)
+
+    def member(login: str, with_email: bool = True) -> Dict:
+        return {"username": enterprise.users[login]["login"],
+                "email": enterprise.users[login]["email"] if with_email else ""}
+
+    teams = []
+    for i, team in enumerate(sorted(enterprise.teams.values(), key=lambda t: t["id"])):
+        current = sorted(team["members"])
+        target = current[2:] + [login for login in rng.sample(members, 4) if login not in team["members"]][:2]
+        if i % 5 == 0 and outside:
+            target.append(outside[i // 5 % len(outside)])
+        teams.append({"name": team["name"], "members": [member(login) for login in target]})
+    for i in range(max(1, len(enterprise.teams) // 20)):
+        teams.append({"name": f"new-team-{i:03d}", "members": [member(login) for login in rng.sample(members, 10)]})
+
+    orgs = []
+    admin = enterprise.users[members[0]]["login"]
+    for org in sorted(enterprise.orgs.values(), key=lambda o: o["login"]):
+        current = sorted(org["members"])
+        target = current[2:] + [login for login in rng.sample(members, 4) if login not in org["members"]][:2]
+        orgs.append({"login": org["login"], "admin": admin, "billing_email": "billing@example.com",
+                     "members": [member(login, with_email=False) for login in target]})
+    orgs.append({"login": "new-org", "admin": admin, "billing_email": "billing@example.com",
+                 "members": [member(login, with_email=False) for login in rng.sample(members, 5)]})
+
+    referenced = {m["username"].lower() for resource in teams + orgs for m in resource["members"]} | {admin.lower()}
+    unreferenced = [login for login in members if login not in referenced]
+    removed = set(rng.sample(unreferenced, len(unreferenced) // 100))
+    return {
+        "enterprise": enterprise.slug,
+        "reserved_members": [enterprise.users[login]["login"] for login in unreferenced if login not in removed],
+        "orgs": orgs,
+        "teams": teams
+    }
+
+
+class PhaseRecorder:
+    """作为 phase_listener 记录各阶段的耗时、请求数和内存峰值"""
+
+    def __init__(self, app: FakeGitHubApp, track_memory: bool = True):
+        """
+        Args:
+            app: 模拟 API (读取其请求计数)
+            track_memory: 是否记录内存峰值 (tracemalloc 会明显拖慢运行)
+        """
+        self.app = app
+        self.track_memory = track_memory
+        self.phases: Dict[str, Dict] = {}
+        self._started: Dict[str, tuple] = {}
+
+    def _requests(self) -> Counter:
+        with self.app.lock:
+            return Counter(self.app.requests)
+
+    def phase_started(self, name: str):
+        if "/" in name:
+            # 只记录顶层阶段，忽略每个 Organization / Team 的子阶段
+            return
+        if self.track_memory and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self._started[name] = (time.perf_counter(), self._requests())
+
+    def phase_finished(self, name: str):
+        if "/" in name:
+            return
+        started, before = self._started.pop(name)
+        requests = self._requests() - before
+        phase = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "requests": sum(requests.values()),
+            "endpoints": {f"{method} {route}": count for (method, route), count in sorted(requests.items())}
+        }
+        if self.track_memory:
+            phase["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        self.phases[name] = phase
+
+
+class BenchmarkSync(GitHubEnterpriseTeamSync):
+    """所有请求都交给进程内模拟 API 处理的同步器"""
+
+    def __init__(self, app: FakeGitHubApp, *args, **kwargs):
+        self.app = app
+        super().__init__(*args, **kwargs)
+
+    def _create_session(self, pool_size: int):
+        session = super()._create_session(pool_size)
+        session.mount("https://", FakeGitHubAdapter(self.app))
+        session.mount("http://", FakeGitHubAdapter(self.app))
+        return session
+
+
+def run_scenario(name: str, params: Dict, latency: float = 0.0, track_memory: bool = True,
+                 seed: int = 0) -> Dict:
+    """
+    运行一个场景
+
+    Args:
+        name: 场景名称
+        params: FakeEnterprise.seed 的参数
+        latency: 每个请求的模拟延迟 (秒)
+        track_memory: 是否记录内存峰值
+        seed: 随机种子
+
+    Returns:
+        {scenario, params, total_seconds, total_requests, phases: {阶段: {seconds, requests, endpoints, peak_memory_mb}}}
+    """
+    enterprise = FakeEnterprise.seed(seed=seed, **params)
+    config = build_config(enterprise, seed)
+    app = FakeGitHubApp(enterprise, latency=latency, rate_limit=10 ** 9)
+    recorder = PhaseRecorder(app, track_memory)
+
+    workdir = tempfile.mkdtemp(prefix=f"sync-benchmark-{name}-")
+    config_file = os.path.join(workdir, "config.json")
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    cwd = os.getcwd()
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        # 报告文件写入临时目录，同步过程的输出不显示
+        os.chdir(workdir)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            recorder.phase_started("init")
+            syncer = BenchmarkSync(app, "benchmark-token", enterprise.slug)
+            recorder.phase_finished("init")
+            syncer.phase_listeners.append(recorder)
+            try:
+                syncer.sync_from_config(config_file)
+            finally:
+                syncer.close()
+    finally:
+        os.chdir(cwd)
+        total_seconds = time.perf_counter() - started
+        if track_memory:
+            tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "params": params,
+        "total_seconds": round(total_seconds, 3),
+        "total_requests": sum(app.requests.values()),
+        "phases": recorder.phases
+    }
+
+
+def check_budgets(result: Dict, budgets: Dict) -> List[str]:
+    """
+    检查场景结果是否超出预算
+
+    Args:
+        result: run_scenario 的结果
+        budgets: 预算 {场景: {阶段: {max_requests, max_seconds}}}
+
+    Returns:
+        超出预算的描述列表
+    """
+    failures = []
+    for phase, budget in budgets.get(result["scenario"], {}).items():
+        measured = result["phases"].get(phase)
+        if not measured:
+            continue
+        if "max_requests" in budget and measured["requests"] > budget["max_requests"]:
+            failures.append(f"{result['scenario']}/{phase}: 请求数 {measured['requests']} 超出预算 {budget['max_requests']}")
+        if "max_seconds" in budget and measured["seconds"] > budget["max_seconds"]:
+            failures.append(f"{result['scenario']}/{phase}: 耗时 {measured['seconds']:.2f}s 超出预算 {budget['max_seconds']:.2f}s")
+    return failures
+
+
+def budgets_from_results(results: List[Dict], existing: Optional[Dict] = None) -> Dict:
+    """以本次结果加上余量生成预算 (未运行的场景保留原预算)"""
+    budgets = dict(existing or {})
+    for result in results:
+        budgets[result["scenario"]] = {
+            phase: {
+                "max_requests": int(measured["requests"] * REQUEST_HEADROOM) + 5,
+                "max_seconds": round(max(MIN_TIME_BUDGET, measured["seconds"] * TIME_HEADROOM), 2)
+            }
+            for phase, measured in result["phases"].items()
+        }
+    return budgets
+
+
+def print_result(result: Dict, budgets: Dict):
+    """输出单个场景的各阶段结果"""
+    params = result["params"]
+    print(f"\n📊 {result['scenario']}: {params['users']} 成员, {params['teams']} Teams, {params['orgs']} Organizations "
+          f"— 共 {result['total_requests']} 个请求, {result['total_seconds']:.2f}s")
+    print(f"  {'阶段':<20}{'耗时(s)':>10}{'请求数':>10}{'预算':>10}{'内存峰值(MB)':>14}")
+    scenario_budgets = budgets.get(result["scenario"], {})
+    for phase, measured in result["phases"].items():
+        budget = scenario_budgets.get(phase, {}).get("max_requests", "-")
+        memory = measured.get("peak_memory_mb", "-")
+        print(f"  {phase:<20}{measured['seconds']:>10.2f}{measured['requests']:>10}{budget:>10}{memory:>14}")
+        for endpoint, count in sorted(measured["endpoints"].items(), key=lambda item: -item[1])[:5]:
+            print(f"      {endpoint}: {count}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="GitHub Enterprise Team 同步基准测试")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS),
+                        help="要运行的场景 (默认全部)")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS_FILE, help="预算文件 (默认 benchmark_budgets.json)")
+    parser.add_argument("--update-budgets", action="store_true", help="以本次结果重新生成所运行场景的预算")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟延迟 (秒，默认 0)")
+    parser.add_argument("--no-memory", action="store_true", help="不记录内存峰值 (tracemalloc 会拖慢运行)")
+    parser.add_argument("--output", help="将完整结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    budgets = {}
+    if os.path.exists(args.budgets):
+        with open(args.budgets, "r", encoding="utf-8") as f:
+            budgets = json.load(f)
+
+    results = []
+    for name in args.scenario:
+        print(f"⏱️  运行场景: {name} ...")
+        result = run_scenario(name, SCENARIOS[name], latency=args.latency, track_memory=not args.no_memory)
+        results.append(result)
+        print_result(result, budgets)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到: {args.output}")
+
+    if args.update_budgets:
+        with open(args.budgets, "w", encoding="utf-8") as f:
+            json.dump(budgets_from_results(results, budgets), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n💾 预算已更新: {args.budgets}")
+        return
+
+    failures = [failure for result in results for failure in check_budgets(result, budgets)]
+    if failures:
+        print(f"\n❌ {len(failures)} 项超出预算:")
+        for failure in failures:
+            print(f"  • {failure}")
+        sys.exit(1)
+    print("\n✅ 所有阶段均在预算之内" if budgets else "\n⚠️  没有预算文件，未做检查 (使用 --update-budgets 生成)")
+
+
+if __name__ == "__main__":
+    main()
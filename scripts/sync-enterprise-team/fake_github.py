@@ -0,0 +1,899 @@
+#!/usr/bin/env python3
+"""
+本地模拟 GitHub Enterprise API 服务器 (用于规模测试)
+
+在内存中模拟一个 Enterprise，实现 sync_team.py / async_sync.py 使用的 REST 和 GraphQL 接口：
+- REST: Enterprise Teams 及其成员、Organization 成员和邀请 (分页、Link 头、ETag / 304)
+- GraphQL: enterprise / node 成员查询、待处理邀请、Organizations、批量 user 查询，
+  以及 inviteEnterpriseMember / removeEnterpriseMember / cancelEnterprise*Invitation /
+  createEnterpriseOrganization mutation (支持 m0, m1, ... 别名批量)
+- 每个请求可附加固定延迟，并返回 X-RateLimit-* 响应头，额度耗尽时按 GitHub 的方式拒绝请求
+- 可限制每个 Organization / Enterprise 的邀请数，超过后返回 "Over invitation rate limit"
+
+应用逻辑 (FakeGitHubApp) 与传输层分离：既可以作为 HTTP 服务器运行，
+也可以通过 FakeGitHubAdapter 挂载到 requests.Session 上在进程内调用。
+
+用法:
+    python fake_github.py --users 100000 --teams 200 --orgs 20 --port 8000 --latency 0.05
+    GITHUB_API_URL=http://127.0.0.1:8000 python sync_team.py config.json any-token
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+
+
+# ==================== 模拟数据 ====================
+
+class FakeEnterprise:
+    """
+    内存中的 Enterprise 状态
+
+    用户名、Team 名、Organization 登录名在内部均以小写作为键，保留原始大小写用于返回。
+    """
+
+    def __init__(self, slug: str = "fake-enterprise"):
+        """
+        Args:
+            slug: Enterprise slug
+        """
+        self.slug = slug
+        self.node_id = f"E_{hashlib.sha1(slug.encode()).hexdigest()[:12]}"
+        self.name = slug
+        # {login_lower: {login, id, node_id, email}}
+        self.users: Dict[str, Dict] = {}
+        # {node_id: login_lower}
+        self.users_by_node: Dict[str, str] = {}
+        # Enterprise 成员 (login_lower)
+        self.members: Set[str] = set()
+        # {team_id: {id, slug, name, members: set(login_lower)}}
+        self.teams: Dict[int, Dict] = {}
+        # {login_lower: {id, login, name, members: set(login_lower), invitations: {id: 邀请}}}
+        self.orgs: Dict[str, Dict] = {}
+        # Enterprise 待处理邀请 {id: {id, email, createdAt, invitee}}
+        self.invitations: Dict[str, Dict] = {}
+        self._next_id = 1
+        # 排序后的成员列表 (成员变化时失效)，避免每页都对 10 万成员重新排序
+        self._sorted_members: Optional[List[str]] = None
+
+    def next_id(self) -> int:
+        """分配一个新的数据库 ID"""
+        self._next_id += 1
+        return self._next_id
+
+    def add_user(self, login: str, email: Optional[str] = None, member: bool = True) -> Dict:
+        """
+        添加一个用户
+
+        Args:
+            login: 用户名
+            email: 公开邮箱
+            member: 是否为 Enterprise 成员
+
+        Returns:
+            用户信息
+        """
+        user_id = self.next_id()
+        user = {"login": login, "id": user_id, "node_id": f"U_{user_id:010d}", "email": email}
+        self.users[login.lower()] = user
+        self.users_by_node[user["node_id"]] = login.lower()
+        if member:
+            self.members.add(login.lower())
+            self._sorted_members = None
+        return user
+
+    def remove_member(self, login: str):
+        """把用户移出 Enterprise (同时移出所有 Team 和 Organization)"""
+        login = login.lower()
+        self.members.discard(login)
+        self._sorted_members = None
+        for team in self.teams.values():
+            team["members"].discard(login)
+        for org in self.orgs.values():
+            org["members"].discard(login)
+
+    def sorted_members(self) -> List[str]:
+        """按用户名排序的 Enterprise 成员 (login_lower)"""
+        if self._sorted_members is None:
+            self._sorted_members = sorted(self.members)
+        return self._sorted_members
+
+    def add_team(self, name: str, members: Optional[List[str]] = None) -> Dict:
+        """添加一个 Enterprise Team"""
+        team_id = self.next_id()
+        team = {"id": team_id, "slug": re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-"), "name": name,
+                "members": {m.lower() for m in members or []}}
+        self.teams[team_id] = team
+        return team
+
+    def add_org(self, login: str, members: Optional[List[str]] = None) -> Dict:
+        """添加一个 Organization"""
+        org = {"id": f"O_{self.next_id():010d}", "login": login, "name": login,
+               "members": {m.lower() for m in members or []}, "invitations": {}}
+        self.orgs[login.lower()] = org
+        return org
+
+    def add_invitation(self, email: Optional[str] = None, invitee: Optional[str] = None,
+                       created_at: Optional[str] = None) -> Dict:
+        """添加一个 Enterprise 待处理邀请"""
+        invitation = {
+            "id": f"EMI_{self.next_id():010d}",
+            "email": email,
+            "createdAt": created_at or datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "invitee": invitee
+        }
+        self.invitations[invitation["id"]] = invitation
+        return invitation
+
+    @classmethod
+    def seed(cls, slug: str = "fake-enterprise", users: int = 1000, teams: int = 10, team_size: int = 50,
+             orgs: int = 2, org_size: int = 200, pending_invitations: int = 0, outside_users: int = 0,
+             seed: int = 0) -> "FakeEnterprise":
+        """
+        生成合成的 Enterprise 数据 (相同参数生成的数据完全相同)
+
+        Args:
+            slug: Enterprise slug
+            users: Enterprise 成员数 (用户名 user00000, user00001, ...)
+            teams: Team 数 (team-000, team-001, ...)
+            team_size: 每个 Team 的成员数 (从成员中随机抽取)
+            orgs: Organization 数 (org-000, org-001, ...)
+            org_size: 每个 Organization 的成员数
+            pending_invitations: Enterprise 待处理邀请数 (邀请 invitee00000@example.com, ...)
+            outside_users: 存在但不属于 Enterprise 的用户数 (outside00000, ...)
+            seed: 随机种子
+
+        Returns:
+            模拟的 Enterprise
+        """
+        rng = random.Random(seed)
+        enterprise = cls(slug)
+        width = max(5, len(str(users)))
+        logins = [f"user{i:0{width}d}" for i in range(users)]
+        for login in logins:
+            enterprise.add_user(login, email=f"{login}@example.com")
+        for i in range(outside_users):
+            login = f"outside{i:05d}"
+            enterprise.add_user(login, email=f"{login}@example.com", member=False)
+        for i in range(teams):
+            enterprise.add_team(f"team-{i:03d}", rng.sample(logins, min(team_size, len(logins))))
+        for i in range(orgs):
+            enterprise.add_org(f"org-{i:03d}", rng.sample(logins, min(org_size, len(logins))))
+        created = datetime.utcnow() - timedelta(days=30)
+        for i in range(pending_invitations):
+            enterprise.add_invitation(email=f"invitee{i:05d}@example.com",
+                                      created_at=(created + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ"))
+        return enterprise
+
+
+class FakeRateLimit:
+    """按资源 (core / graphql) 计数的主限额模拟"""
+
+    def __init__(self, limit: int = 5000, window: float = 3600, clock=time.time):
+        """
+        Args:
+            limit: 每个窗口内的请求数
+            window: 窗口长度 (秒)
+            clock: 时钟函数 (便于测试)
+        """
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.buckets: Dict[str, Dict] = {}
+
+    def consume(self, resource: str, cost: int = 1) -> Tuple[bool, Dict[str, str]]:
+        """
+        消耗限额
+
+        Args:
+            resource: 限额类型
+            cost: 本次消耗的额度 (304 响应为 0)
+
+        Returns:
+            (是否允许, 速率限制响应头)
+        """
+        now = self.clock()
+        bucket = self.buckets.get(resource)
+        if not bucket or now >= bucket["reset"]:
+            bucket = self.buckets[resource] = {"used": 0, "reset": int(now + self.window)}
+        allowed = bucket["used"] + cost <= self.limit
+        if allowed:
+            bucket["used"] += cost
+        return allowed, {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, self.limit - bucket["used"])),
+            "X-RateLimit-Reset": str(bucket["reset"]),
+            "X-RateLimit-Used": str(bucket["used"]),
+            "X-RateLimit-Resource": resource
+        }
+
+
+# ==================== GraphQL 解析 ====================
+
+def _read_balanced(text: str, start: int, open_char: str, close_char: str) -> Tuple[str, int]:
+    """读取 text[start] 处开始的成对括号内容，返回 (内容, 结束位置之后的下标)"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == open_char:
+            depth += 1
+        elif text[i] == close_char:
+            depth -= 1
+            if depth == 0:
+                return text[start + 1:i], i + 1
+    raise ValueError(f"括号不匹配: {text[start:start + 40]}")
+
+
+def parse_selections(document: str) -> Tuple[str, List[Tuple[str, str, str, str]]]:
+    """
+    解析 GraphQL 文档的顶层字段 (足以覆盖同步脚本使用的语句，不是完整的 GraphQL 解析器)
+
+    Args:
+        document: GraphQL 查询或 mutation
+
+    Returns:
+        (操作类型 query / mutation, [(别名, 字段名, 参数文本, 子选择文本)])
+    """
+    text = document.strip()
+    operation = "mutation" if text.startswith("mutation") else "query"
+    i = 0
+    while text[i] != "{":
+        if text[i] == "(":
+            _, i = _read_balanced(text, i, "(", ")")
+        else:
+            i += 1
+    body, _ = _read_balanced(text, i, "{", "}")
+
+    token = re.compile(r"\s*([A-Za-z_]\w*)\s*")
+    fields = []
+    i = 0
+    while i < len(body):
+        if body[i] in " \t\r\n,":
+            i += 1
+            continue
+        match = token.match(body, i)
+        if not match:
+            raise ValueError(f"无法解析: {body[i:i + 40]}")
+        alias = name = match.group(1)
+        i = match.end()
+        if body.startswith(":", i):
+            match = token.match(body, i + 1)
+            if not match:
+                raise ValueError(f"无法解析: {body[i:i + 40]}")
+            name = match.group(1)
+            i = match.end()
+        args = selection = ""
+        if body.startswith("(", i):
+            args, i = _read_balanced(body, i, "(", ")")
+            while i < len(body) and body[i] in " \t\r\n":
+                i += 1
+        if body.startswith("{", i):
+            selection, i = _read_balanced(body, i, "{", "}")
+        fields.append((alias, name, args, selection))
+    return operation, fields
+
+
+def parse_arguments(args: str, variables: Dict) -> Dict:
+    """
+    解析字段参数 (input 对象展开为同一层)，变量引用替换为实际值
+
+    Args:
+        args: 参数文本，如 'input: {enterpriseId: $enterpriseId, email: $email}'
+        variables: 请求变量
+
+    Returns:
+        {参数名: 值}
+    """
+    values = {}
+    for name, value in re.findall(r'(\w+)\s*:\s*(\$\w+|-?\d+|"(?:[^"\\]|\\.)*"|true|false|null)', args):
+        if value.startswith("$"):
+            values[name] = variables.get(value[1:])
+        elif value.startswith('"'):
+            values[name] = json.loads(value)
+        elif value in ("true", "false", "null"):
+            values[name] = {"true": True, "false": False, "null": None}[value]
+        else:
+            values[name] = int(value)
+    return values
+
+
+def _connection_args(selection: str, field: str, variables: Dict) -> Dict:
+    """读取子选择中某个连接字段的参数 (first / after)"""
+    match = re.search(rf"\b{field}\s*\(([^)]*)\)", selection)
+    return parse_arguments(match.group(1), variables) if match else {}
+
+
+# ==================== 应用逻辑 ====================
+
+# 路径中紧随这些段之后的部分是参数，请求计数时替换为占位符
+ROUTE_PARAMETERS = {
+    "enterprises": "{enterprise}",
+    "orgs": "{org}",
+    "teams": "{team_id}",
+    "members": "{username}",
+    "memberships": "{username}",
+    "invitations": "{invitation_id}",
+    "users": "{username}",
+}
+# 路径末尾的固定动作段 (如 Team 批量成员接口 /memberships/add)，不替换为占位符
+ROUTE_ACTIONS = {"add", "remove"}
+
+
+def route_template(path: str) -> str:
+    """
+    将请求路径归一化为路由模板 (如 /orgs/{org}/members/{username})，用于按接口统计请求数
+
+    Args:
+        path: 请求路径
+
+    Returns:
+        路由模板
+    """
+    parts = path.split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in ROUTE_PARAMETERS and parts[i] and not (i == len(parts) - 1 and parts[i] in ROUTE_ACTIONS):
+            parts[i] = ROUTE_PARAMETERS[parts[i - 1]]
+    return "/".join(parts)
+
+
+class FakeGitHubApp:
+    """
+    模拟 GitHub API 的请求处理逻辑 (与传输层无关)
+
+    handle() 接收方法、路径、请求头和请求体，返回 (状态码, 响应头, 响应体)。
+    所有状态修改在同一把锁内完成；延迟在加锁之前模拟，因此并发请求的延迟可以重叠。
+    """
+
+    MAX_PAGE_SIZE = 100
+
+    def __init__(self, enterprise: FakeEnterprise, latency: float = 0.0, rate_limit: int = 5000,
+                 rate_limit_window: float = 3600, graphql_path: str = "/graphql", bulk_memberships: bool = True,
+                 error_rate: float = 0.0, seed: int = 0, invitation_limit: int = 0):
+        """
+        Args:
+            enterprise: 模拟的 Enterprise 数据
+            latency: 每个请求附加的延迟 (秒)
+            rate_limit: 每个窗口内 core / graphql 各自允许的请求数
+            rate_limit_window: 限额窗口 (秒)
+            graphql_path: GraphQL 接口路径
+            bulk_memberships: 是否提供 Team 批量成员接口 (为 False 时返回 404，模拟旧版本服务器)
+            error_rate: 随机返回 502 的请求比例 (在处理请求之前返回，状态不变)，用于验证重试
+            seed: 随机错误使用的随机种子
+            invitation_limit: 每个 Organization / Enterprise 可发送的邀请数 (0 表示不限制)，超过后返回
+                "Over invitation rate limit"；窗口不会自动重置，可清空 invitations_sent 模拟新的窗口
+        """
+        self.enterprise = enterprise
+        self.latency = latency
+        self.bulk_memberships = bulk_memberships
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        # 注入的 502 错误数
+        self.injected_errors = 0
+        self.invitation_limit = invitation_limit
+        # 已发送的邀请数 {"enterprise" 或 "org/<login>": 次数}
+        self.invitations_sent: Counter = Counter()
+        self.rate_limit = FakeRateLimit(rate_limit, rate_limit_window)
+        self.graphql_path = graphql_path
+        self.lock = threading.Lock()
+        # 请求计数 {(方法, 路由模板): 次数}
+        self.requests: Counter = Counter()
+
+    # ---------- 入口 ----------
+
+    def handle(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes]) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        处理一个请求
+
+        Args:
+            method: HTTP 方法
+            url: 路径 (可带查询参数) 或完整 URL
+            headers: 请求头
+            body: 请求体
+
+        Returns:
+            (状态码, 响应头, 响应体)
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urlparse(url)
+        path = parsed.path.rstrip("/") or "/"
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        origin = f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else f"http://{headers.get('host', 'localhost')}"
+        resource = "graphql" if path == self.graphql_path else "core"
+
+        with self.lock:
+            self.requests[(method, route_template(path))] += 1
+
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.injected_errors += 1
+                return 502, {"Content-Type": "application/json"}, json.dumps({"message": "Bad Gateway"}).encode()
+
+            # 速率限制先按 1 次计算；304 响应不计入 (在下方退还)
+            allowed, rate_headers = self.rate_limit.consume(resource)
+            if not allowed:
+                return 403, dict(rate_headers, **{"Content-Type": "application/json"}), json.dumps({
+                    "message": "API rate limit exceeded",
+                    "documentation_url": "https://docs.github.com/rest/overview/resources-in-the-rest-api#rate-limiting"
+                }).encode()
+
+            try:
+                payload = json.loads(body) if body else None
+            except ValueError:
+                return 400, dict(rate_headers), json.dumps({"message": "Problems parsing JSON"}).encode()
+
+            if resource == "graphql":
+                if method != "POST":
+                    status, data, extra = 404, {"message": "Not Found"}, {}
+                else:
+                    status, data, extra = 200, self.graphql(payload or {}), {}
+            else:
+                status, data, extra = self.rest(method, origin, path, query, payload)
+
+        response_headers = dict(rate_headers, **extra)
+        content = json.dumps(data).encode() if data is not None else b""
+        if content:
+            response_headers["Content-Type"] = "application/json; charset=utf-8"
+
+        if method == "GET" and status == 200:
+            etag = f'W/"{hashlib.sha1(content).hexdigest()}"'
+            response_headers["ETag"] = etag
+            if headers.get("if-none-match") == etag:
+                with self.lock:
+                    bucket = self.rate_limit.buckets[resource]
+                    bucket["used"] -= 1
+                    response_headers["X-RateLimit-Remaining"] = str(self.rate_limit.limit - bucket["used"])
+                    response_headers["X-RateLimit-Used"] = str(bucket["used"])
+                return 304, response_headers, b""
+        return status, response_headers, content
+
+    # ---------- REST ----------
+
+    def _paginate(self, origin: str, path: str, query: Dict[str, str], items: List) -> Tuple[int, List, Dict[str, str]]:
+        """按 per_page / page 分页，并生成 Link 头"""
+        try:
+            per_page = max(1, min(self.MAX_PAGE_SIZE, int(query.get("per_page", 30))))
+            page = max(1, int(query.get("page", 1)))
+        except ValueError:
+            return 422, {"message": "Invalid pagination parameters"}, {}
+        last = max(1, -(-len(items) // per_page))
+        links = []
+
+        def link(p: int, rel: str):
+            links.append(f'<{origin}{path}?{urlencode({"per_page": per_page, "page": p})}>; rel="{rel}"')
+
+        if page < last:
+            link(page + 1, "next")
+            link(last, "last")
+        if page > 1:
+            link(1, "first")
+            link(page - 1, "prev")
+        return 200, items[(page - 1) * per_page: page * per_page], {"Link": ", ".join(links)} if links else {}
+
+    def rest(self, method: str, origin: str, path: str, query: Dict[str, str], payload: Optional[Dict]) -> Tuple[int, object, Dict[str, str]]:
+        """
+        处理 REST 请求
+
+        Args:
+            method: HTTP 方法
+            origin: 请求的 scheme://host，用于生成 Link 头
+            path: 路径
+            query: 查询参数
+            payload: JSON 请求体
+
+        Returns:
+            (状态码, 响应数据, 额外响应头)
+        """
+        e = self.enterprise
+        not_found = (404, {"message": "Not Found"}, {})
+        parts = path.strip("/").split("/")
+
+        # /enterprises/{slug}/teams[/{id}/memberships[/{login} | /add | /remove]]
+        if len(parts) >= 3 and parts[0] == "enterprises" and parts[2] == "teams":
+            if parts[1] != e.slug:
+                return not_found
+            if len(parts) == 3:
+                if method == "GET":
+                    teams = [self._team_json(t) for t in sorted(e.teams.values(), key=lambda t: t["id"])]
+                    return self._paginate(origin, path, query, teams)
+                if method == "POST":
+                    name = (payload or {}).get("name")
+                    if not name:
+                        return 422, {"message": "Validation Failed", "errors": [{"field": "name", "code": "missing"}]}, {}
+                    if any(t["name"].lower() == name.lower() for t in e.teams.values()):
+                        return 422, {"message": "Validation Failed", "errors": [{"field": "name", "code": "already_exists"}]}, {}
+                    return 201, self._team_json(e.add_team(name)), {}
+                return not_found
+
+            try:
+                team = e.teams.get(int(parts[3]))
+            except ValueError:
+                team = None
+            if not team or len(parts) < 5 or parts[4] != "memberships":
+                return not_found
+            if len(parts) == 5 and method == "GET":
+                members = [self._user_json(login) for login in sorted(team["members"])]
+                return self._paginate(origin, path, query, members)
+            if len(parts) == 6 and method == "POST" and parts[5] in ("add", "remove"):
+                if not self.bulk_memberships:
+                    return not_found
+                usernames = (payload or {}).get("usernames")
+                if not isinstance(usernames, list) or not usernames:
+                    return 422, {"message": "Validation Failed", "errors": [{"field": "usernames", "code": "missing"}]}, {}
+                processed = []
+                for login in dict.fromkeys(u.lower() for u in usernames):
+                    if parts[5] == "add" and login in e.members:
+                        team["members"].add(login)
+                        processed.append(self._user_json(login))
+                    elif parts[5] == "remove" and login in team["members"]:
+                        team["members"].discard(login)
+                        processed.append(self._user_json(login))
+                return 200, processed, {}
+            if len(parts) == 6:
+                login = parts[5].lower()
+                if method == "PUT":
+                    if login not in e.users:
+                        return not_found
+                    if login not in e.members:
+                        return 422, {"message": f"User {parts[5]} cannot be found in the enterprise"}, {}
+                    team["members"].add(login)
+                    return 200, self._user_json(login), {}
+                if method == "DELETE":
+                    team["members"].discard(login)
+                    return 204, None, {}
+            return not_found
+
+        # /orgs/{org}/members[/{login}]，/orgs/{org}/invitations[/{id}]
+        if len(parts) >= 3 and parts[0] == "orgs":
+            org = e.orgs.get(parts[1].lower())
+            if not org:
+                return not_found
+            if parts[2] == "members":
+                if len(parts) == 3 and method == "GET":
+                    return self._paginate(origin, path, query, [self._user_json(login) for login in sorted(org["members"])])
+                if len(parts) == 4 and method == "DELETE":
+                    org["members"].discard(parts[3].lower())
+                    return 204, None, {}
+            if parts[2] == "invitations":
+                if len(parts) == 3 and method == "GET":
+                    invitations = sorted(org["invitations"].values(), key=lambda inv: inv["id"])
+                    return self._paginate(origin, path, query, invitations)
+                if len(parts) == 3 and method == "POST":
+                    return self._create_org_invitation(org, payload or {})
+                if len(parts) == 4 and method == "DELETE":
+                    try:
+                        invitation = org["invitations"].pop(int(parts[3]), None)
+                    except ValueError:
+                        invitation = None
+                    return (204, None, {}) if invitation else not_found
+            return not_found
+
+        return not_found
+
+    def _create_org_invitation(self, org: Dict, payload: Dict) -> Tuple[int, object, Dict[str, str]]:
+        """POST /orgs/{org}/invitations"""
+        e = self.enterprise
+        login = None
+        if payload.get("invitee_id"):
+            login = next((key for key, u in e.users.items() if u["id"] == payload["invitee_id"]), None)
+            if not login:
+                return 422, {"message": "Validation Failed", "errors": [{"field": "invitee_id", "code": "invalid"}]}, {}
+            if login in org["members"]:
+                return 422, {"message": "Validation Failed", "errors": [{"message": "Invitee is already a part of this organization"}]}, {}
+        elif not payload.get("email"):
+            return 422, {"message": "Validation Failed", "errors": [{"field": "email", "code": "missing"}]}, {}
+        email = payload.get("email")
+        for invitation in org["invitations"].values():
+            if (login and (invitation.get("login") or "").lower() == login) or \
+                    (email and (invitation.get("email") or "").lower() == email.lower()):
+                return 422, {"message": "Validation Failed", "errors": [{"message": "Invitee has already been invited"}]}, {}
+        if not self._consume_invitation(f"org/{org['login'].lower()}"):
+            return 422, {"message": "Over invitation rate limit"}, {}
+        invitation = {
+            "id": e.next_id(),
+            "login": e.users[login]["login"] if login else None,
+            "email": email,
+            "role": payload.get("role", "direct_member"),
+            "created_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        }
+        org["invitations"][invitation["id"]] = invitation
+        return 201, invitation, {}
+
+    def _consume_invitation(self, scope: str) -> bool:
+        """占用一个邀请额度，超过 invitation_limit 时返回 False"""
+        if self.invitation_limit and self.invitations_sent[scope] >= self.invitation_limit:
+            return False
+        self.invitations_sent[scope] += 1
+        return True
+
+    def _team_json(self, team: Dict) -> Dict:
+        return {"id": team["id"], "slug": team["slug"], "name": team["name"]}
+
+    def _user_json(self, login: str) -> Dict:
+        user = self.enterprise.users.get(login)
+        if not user:
+            return {"login": login}
+        return {"login": user["login"], "id": user["id"], "node_id": user["node_id"], "type": "User"}
+
+    # ---------- GraphQL ----------
+
+    def graphql(self, payload: Dict) -> Dict:
+        """
+        处理 GraphQL 请求 (按顶层字段逐个解析，字段之间互不影响)
+
+        Returns:
+            GraphQL 响应 {data, errors}
+        """
+        variables = payload.get("variables") or {}
+        try:
+            operation, fields = parse_selections(payload.get("query") or "")
+        except (ValueError, AttributeError, IndexError) as e:
+            return {"errors": [{"message": f"Parse error: {e}"}]}
+
+        data, errors = {}, []
+        for alias, name, args, selection in fields:
+            resolver = getattr(self, f"_{operation}_{name}", None)
+            if not resolver:
+                errors.append({"path": [alias], "message": f"Field '{name}' doesn't exist on type "
+                                                          f"'{'Mutation' if operation == 'mutation' else 'Query'}'"})
+                data[alias] = None
+                continue
+            value, error = resolver(parse_arguments(args, variables), selection, variables)
+            data[alias] = value
+            if error:
+                errors.append(dict(error, path=[alias]))
+        return {"data": data, "errors": errors} if errors else {"data": data}
+
+    def _page(self, items: List, args: Dict) -> Tuple[List, Dict]:
+        """游标分页 (游标为偏移量的字符串形式)"""
+        first = max(1, min(self.MAX_PAGE_SIZE, args.get("first") or self.MAX_PAGE_SIZE))
+        start = int(args["after"]) if args.get("after") else 0
+        page = items[start:start + first]
+        return page, {"hasNextPage": start + first < len(items), "endCursor": str(start + len(page)) if page else None}
+
+    def _enterprise_members(self, args: Dict) -> Dict:
+        users = self.enterprise.users
+        page, page_info = self._page(self.enterprise.sorted_members(), args)
+        return {"pageInfo": page_info, "edges": [{"node": {"login": users[login]["login"]}} for login in page]}
+
+    def _query_enterprise(self, args: Dict, selection: str, variables: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+        e = self.enterprise
+        if args.get("slug") != e.slug:
+            return None, {"type": "NOT_FOUND", "message": f"Could not resolve to an Enterprise with the slug of '{args.get('slug')}'."}
+        result = {"id": e.node_id, "name": e.name}
+        if re.search(r"\borganizations\s*\(", selection):
+            orgs = sorted(e.orgs.values(), key=lambda o: o["login"].lower())
+            page, page_info = self._page(orgs, _connection_args(selection, "organizations", variables))
+            result["organizations"] = {"pageInfo": page_info,
+                                       "nodes": [{"id": o["id"], "login": o["login"], "name": o["name"]} for o in page]}
+        if re.search(r"\bmembers\s*\(", selection):
+            result["members"] = self._enterprise_members(_connection_args(selection, "members", variables))
+        if "ownerInfo" in selection:
+            owner_info = {}
+            if "pendingUnaffiliatedMemberInvitations" in selection:
+                invitations = sorted(e.invitations.values(), key=lambda inv: inv["id"])
+                page, page_info = self._page(
+                    invitations, _connection_args(selection, "pendingUnaffiliatedMemberInvitations", variables))
+                owner_info["pendingUnaffiliatedMemberInvitations"] = {"pageInfo": page_info, "edges": [
+                    {"node": {"id": inv["id"], "email": inv["email"], "createdAt": inv["createdAt"],
+                              "invitee": {"login": e.users[inv["invitee"]]["login"]} if inv["invitee"] else None}}
+                    for inv in page]}
+            if re.search(r"\bpendingMemberInvitations\b", selection):
+                # 组织级邀请不在本模拟的 Enterprise 范围内，始终为空
+                owner_info["pendingMemberInvitations"] = {"pageInfo": {"hasNextPage": False, "endCursor": None},
+                                                          "edges": []}
+            result["ownerInfo"] = owner_info
+        return result, None
+
+    def _query_node(self, args: Dict, selection: str, variables: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+        if args.get("id") == self.enterprise.node_id:
+            return {"members": self._enterprise_members(_connection_args(selection, "members", variables))}, None
+        login = self.enterprise.users_by_node.get(args.get("id"))
+        if login:
+            return self._user_node(login), None
+        return None, {"type": "NOT_FOUND", "message": f"Could not resolve to a node with the global id of '{args.get('id')}'"}
+
+    def _user_node(self, login: str) -> Dict:
+        user = self.enterprise.users[login]
+        return {"id": user["node_id"], "databaseId": user["id"], "login": user["login"], "email": user["email"] or ""}
+
+    def _query_user(self, args: Dict, selection: str, variables: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+        login = (args.get("login") or "").lower()
+        if login not in self.enterprise.users:
+            return None, {"type": "NOT_FOUND", "message": f"Could not resolve to a User with the login of '{args.get('login')}'."}
+        return self._user_node(login), None
+
+    def _query_rateLimit(self, args: Dict, selection: str, variables: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+        # 每个 GraphQL 请求按 1 点计算
+        bucket = self.rate_limit.buckets.get("graphql") or {}
+        return {"cost": 1, "limit": self.rate_limit.limit,
+                "remaining": self.rate_limit.limit - bucket.get("used", 0)}, None
+
+    def _check_enterprise(self, args: Dict) -> Optional[Dict]:
+        if args.get("enterpriseId") != self.enterprise.node_id:
+            return {"type": "NOT_FOUND", "message": f"Could not resolve to a node with the global id of '{args.get('enterpriseId')}'"}
+        return None
+
+    def _mutation_inviteEnterpriseMember(self, args: Dict, selection: str, variables: Dict):
+        e = self.enterprise
+        error = self._check_enterprise(args)
+        if error:
+            return None, error
+        email = args.get("email") or ""
+        if any((inv["email"] or "").lower() == email.lower() for inv in e.invitations.values()):
+            return None, {"type": "UNPROCESSABLE", "message": f"{email} has already been invited (duplicate invitation)"}
+        invitee = next((login for login, u in e.users.items() if (u["email"] or "").lower() == email.lower()), None)
+        if invitee and invitee in e.members:
+            return None, {"type": "UNPROCESSABLE", "message": f"{email} is already a member of the enterprise"}
+        if not self._consume_invitation("enterprise"):
+            return None, {"type": "UNPROCESSABLE", "message": "Over invitation rate limit"}
+        invitation = e.add_invitation(email=email, invitee=invitee)
+        return {"invitation": {"id": invitation["id"], "email": email}}, None
+
+    def _mutation_removeEnterpriseMember(self, args: Dict, selection: str, variables: Dict):
+        e = self.enterprise
+        error = self._check_enterprise(args)
+        if error:
+            return None, error
+        login = e.users_by_node.get(args.get("userId"))
+        if not login or login not in e.members:
+            return None, {"type": "NOT_FOUND", "message": f"Could not resolve to an enterprise member with the id of '{args.get('userId')}'"}
+        e.remove_member(login)
+        return {"clientMutationId": None, "user": {"login": e.users[login]["login"]}}, None
+
+    def _mutation_cancelEnterpriseMemberInvitation(self, args: Dict, selection: str, variables: Dict):
+        invitation = self.enterprise.invitations.pop(args.get("invitationId"), None)
+        if not invitation:
+            return None, {"type": "NOT_FOUND", "message": f"Could not resolve to a node with the global id of '{args.get('invitationId')}'"}
+        return {"invitation": {"id": invitation["id"]}, "message": "Invitation cancelled"}, None
+
+    def _mutation_cancelEnterpriseAdminInvitation(self, args: Dict, selection: str, variables: Dict):
+        # 本模拟不包含管理员邀请
+        return None, {"type": "NOT_FOUND", "message": f"Could not resolve to a node with the global id of '{args.get('invitationId')}'"}
+
+    def _mutation_createEnterpriseOrganization(self, args: Dict, selection: str, variables: Dict):
+        e = self.enterprise
+        error = self._check_enterprise(args)
+        if error:
+            return None, error
+        login = args.get("login") or ""
+        if login.lower() in e.orgs:
+            return None, {"type": "UNPROCESSABLE", "message": f"Login {login} is unavailable"}
+        org = e.add_org(login, [a for a in args.get("adminLogins") or [] if a.lower() in e.users])
+        org["name"] = args.get("profileName") or login
+        return {"organization": {"id": org["id"], "login": org["login"], "name": org["name"]}}, None
+
+
+# ==================== 传输层 ====================
+
+class FakeGitHubAdapter(BaseAdapter):
+    """把请求直接交给 FakeGitHubApp 处理的 requests 传输适配器 (不经过网络)"""
+
+    def __init__(self, app: FakeGitHubApp):
+        super().__init__()
+        self.app = app
+
+    def send(self, request, **kwargs):
+        body = request.body.encode() if isinstance(request.body, str) else request.body
+        status, headers, content = self.app.handle(request.method, request.url, dict(request.headers), body)
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+def make_handler(app: FakeGitHubApp):
+    """创建绑定到指定应用的 HTTP 请求处理类"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _dispatch(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            status, headers, content = app.handle(self.command, self.path, dict(self.headers.items()), body)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    return Handler
+
+
+def make_server(app: FakeGitHubApp, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    创建 (未启动的) 多线程 HTTP 服务器
+
+    Args:
+        app: 模拟应用
+        host: 监听地址
+        port: 监听端口，0 表示随机端口
+
+    Returns:
+        服务器对象 (server_address 为实际地址)
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(app))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地模拟 GitHub Enterprise API 服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口 (默认 8000)")
+    parser.add_argument("--enterprise", default="fake-enterprise", help="Enterprise slug (默认 fake-enterprise)")
+    parser.add_argument("--users", type=int, default=1000, help="Enterprise 成员数 (默认 1000，最多建议 100000)")
+    parser.add_argument("--teams", type=int, default=10, help="Team 数 (默认 10)")
+    parser.add_argument("--team-size", type=int, default=50, help="每个 Team 的成员数 (默认 50)")
+    parser.add_argument("--orgs", type=int, default=2, help="Organization 数 (默认 2)")
+    parser.add_argument("--org-size", type=int, default=200, help="每个 Organization 的成员数 (默认 200)")
+    parser.add_argument("--pending-invitations", type=int, default=0, help="Enterprise 待处理邀请数 (默认 0)")
+    parser.add_argument("--outside-users", type=int, default=0, help="不属于 Enterprise 的用户数 (默认 0)")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子 (默认 0)")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的附加延迟 (秒，默认 0)")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="每个窗口内 core / graphql 各自的请求数 (默认 5000)")
+    parser.add_argument("--rate-limit-window", type=float, default=3600, help="限额窗口 (秒，默认 3600)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="随机返回 502 的请求比例 (0~1，默认 0)，用于验证重试")
+    parser.add_argument("--invitation-limit", type=int, default=0,
+                        help="每个 Organization / Enterprise 可发送的邀请数 (默认 0，不限制)，用于验证邀请额度调度")
+    parser.add_argument("--no-bulk-memberships", action="store_true",
+                        help="不提供 Team 批量成员接口 (返回 404，模拟旧版本服务器)")
+    args = parser.parse_args()
+
+    started = time.time()
+    enterprise = FakeEnterprise.seed(args.enterprise, users=args.users, teams=args.teams, team_size=args.team_size,
+                                     orgs=args.orgs, org_size=args.org_size,
+                                     pending_invitations=args.pending_invitations,
+                                     outside_users=args.outside_users, seed=args.seed)
+    print(f"✓ 已生成模拟数据: {len(enterprise.members)} 成员, {len(enterprise.teams)} Teams, "
+          f"{len(enterprise.orgs)} Organizations, {len(enterprise.invitations)} 待处理邀请 "
+          f"({time.time() - started:.1f} 秒)")
+
+    app = FakeGitHubApp(enterprise, latency=args.latency, rate_limit=args.rate_limit,
+                        rate_limit_window=args.rate_limit_window, bulk_memberships=not args.no_bulk_memberships,
+                        error_rate=args.error_rate, seed=args.seed, invitation_limit=args.invitation_limit)
+    server = make_server(app, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"🚀 模拟 GitHub API 已启动: http://{host}:{port}")
+    print(f"   export GITHUB_API_URL=http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+        print(f"📊 请求数: {sum(app.requests.values())}")
+        for (method, route), count in app.requests.most_common():
+            print(f"  • {method} {route}: {count}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
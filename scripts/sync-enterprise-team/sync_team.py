@@ -4,39 +4,2497 @@ GitHub Enterprise Team 成员同步脚本
 根据 JSON 配置文件同步 Enterprise Team 成员
 """
 
+import argparse
+import contextlib
+import cProfile
+import hashlib
 import json
 import os
+import pstats
+import random
+import re
+import sqlite3
 import sys
+import threading
+import time
+import tracemalloc
 import requests
+import urllib3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from datetime import datetime
-from typing import Dict, List, Set, Tuple, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+# ==================== GraphQL 语句 ====================
+
+ENTERPRISE_ID_QUERY = """
+query($slug: String!) {
+    enterprise(slug: $slug) {
+        id
+        name
+    }
+}
+"""
+
+ENTERPRISE_MEMBERS_QUERY = """
+query($enterpriseId: ID!, $cursor: String) {
+    node(id: $enterpriseId) {
+        ... on Enterprise {
+            members(first: 100, after: $cursor) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+                edges {
+                    node {
+                        ... on User {
+                            login
+                        }
+                        ... on EnterpriseUserAccount {
+                            login
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+PENDING_UNAFFILIATED_INVITATIONS_QUERY = """
+query($slug: String!, $cursor: String) {
+    enterprise(slug: $slug) {
+        ownerInfo {
+            pendingUnaffiliatedMemberInvitations(first: 100, after: $cursor) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+                edges {
+                    node {
+                        id
+                        email
+                        createdAt
+                        invitee {
+                            login
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+PENDING_MEMBER_INVITATIONS_QUERY = """
+query($slug: String!, $cursor: String) {
+    enterprise(slug: $slug) {
+        ownerInfo {
+            pendingMemberInvitations(first: 100, after: $cursor) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+                edges {
+                    node {
+                        id
+                        email
+                        createdAt
+                        invitee {
+                            login
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+CANCEL_MEMBER_INVITATION_MUTATION = """
+mutation($invitationId: ID!) {
+    cancelEnterpriseMemberInvitation(input: {invitationId: $invitationId}) {
+        invitation {
+            id
+        }
+        message
+    }
+}
+"""
+
+CANCEL_ADMIN_INVITATION_MUTATION = """
+mutation($invitationId: ID!) {
+    cancelEnterpriseAdminInvitation(input: {invitationId: $invitationId}) {
+        invitation {
+            id
+        }
+        message
+    }
+}
+"""
+
+REMOVE_ENTERPRISE_MEMBER_MUTATION = """
+mutation($enterpriseId: ID!, $userId: ID!) {
+    removeEnterpriseMember(input: {enterpriseId: $enterpriseId, userId: $userId}) {
+        clientMutationId
+    }
+}
+"""
+
+INVITE_ENTERPRISE_MEMBER_MUTATION = """
+mutation($enterpriseId: ID!, $email: String!) {
+    inviteEnterpriseMember(input: {enterpriseId: $enterpriseId, email: $email}) {
+        invitation {
+            id
+            email
+        }
+    }
+}
+"""
+
+ENTERPRISE_ORGANIZATIONS_QUERY = """
+query($slug: String!, $cursor: String) {
+    enterprise(slug: $slug) {
+        organizations(first: 100, after: $cursor) {
+            pageInfo {
+                hasNextPage
+                endCursor
+            }
+            nodes {
+                id
+                login
+                name
+            }
+        }
+    }
+}
+"""
+
+CREATE_ORGANIZATION_MUTATION = """
+mutation($enterpriseId: ID!, $login: String!, $profileName: String!, $adminLogins: [String!]!, $billingEmail: String!) {
+    createEnterpriseOrganization(input: {
+        enterpriseId: $enterpriseId,
+        login: $login,
+        profileName: $profileName,
+        adminLogins: $adminLogins,
+        billingEmail: $billingEmail
+    }) {
+        organization {
+            id
+            login
+            name
+        }
+    }
+}
+"""
+
+# ==================== 分页 ====================
+
+def parse_link_header(value: Optional[str]) -> Dict[str, str]:
+    """
+    解析 REST 响应的 Link 头
+    
+    Args:
+        value: Link 头，如 '<https://...&page=2>; rel="next", <https://...&page=5>; rel="last"'
+        
+    Returns:
+        {rel: url}
+    """
+    links = {}
+    for part in (value or "").split(","):
+        section = part.split(";")
+        if len(section) < 2:
+            continue
+        url = section[0].strip().strip("<>")
+        for param in section[1:]:
+            name, _, rel = param.strip().partition("=")
+            if name == "rel":
+                for r in rel.strip('"').split():
+                    links[r] = url
+    return links
+
+
+def last_page_number(links: Dict[str, str]) -> Optional[int]:
+    """从 Link 头的 rel="last" 中取出最后一页的页码，没有时返回 None"""
+    if "last" not in links:
+        return None
+    try:
+        return int(parse_qs(urlparse(links["last"]).query)["page"][0])
+    except (KeyError, ValueError, IndexError):
+        return None
+
+
+# ==================== 批量请求 ====================
+
+def build_user_lookup_query(count: int) -> str:
+    """
+    构建批量查询用户的 GraphQL 别名查询 (u0, u1, ... 对应变量 $l0, $l1, ...)
+    
+    Args:
+        count: 本次查询的用户数
+        
+    Returns:
+        GraphQL 查询语句
+    """
+    params = ", ".join(f"$l{i}: String!" for i in range(count))
+    fields = "\n".join(f"    u{i}: user(login: $l{i}) {{ id databaseId login email }}" for i in range(count))
+    return f"query({params}) {{\n{fields}\n}}"
+
+
+def build_mutation_batch(field: str, items: List[Tuple[str, Dict[str, Tuple[str, object]]]],
+                         shared: Dict[str, Tuple[str, object]], selection: str) -> Tuple[str, Dict]:
+    """
+    构建批量 mutation 的 GraphQL 别名文档 (m0, m1, ... 对应变量 $m0_xxx, $m1_xxx, ...)
+    
+    Args:
+        field: mutation 字段名 (如 removeEnterpriseMember)
+        items: [(key, {参数名: (GraphQL 类型, 值)})]
+        shared: 所有条目共用的参数 {参数名: (GraphQL 类型, 值)}
+        selection: 每个 mutation 返回的字段
+        
+    Returns:
+        (GraphQL 语句, 变量)
+    """
+    params = [f"${name}: {gql_type}" for name, (gql_type, _) in shared.items()]
+    variables = {name: value for name, (_, value) in shared.items()}
+    fields = []
+    for i, (_, args) in enumerate(items):
+        inputs = [f"{name}: ${name}" for name in shared]
+        for name, (gql_type, value) in args.items():
+            params.append(f"$m{i}_{name}: {gql_type}")
+            variables[f"m{i}_{name}"] = value
+            inputs.append(f"{name}: $m{i}_{name}")
+        fields.append(f"    m{i}: {field}(input: {{{', '.join(inputs)}}}) {{ {selection} }}")
+    return f"mutation({', '.join(params)}) {{\n" + "\n".join(fields) + "\n}", variables
+
+
+def parse_mutation_batch(result: Dict, items: List[Tuple[str, Dict]]) -> Tuple[Dict[str, Tuple[bool, str]], List, List[str]]:
+    """
+    按别名把批量 mutation 的响应映射回各条目
+    
+    Args:
+        result: 完整的 GraphQL 响应 (data + errors)
+        items: 构建文档时使用的条目列表
+        
+    Returns:
+        (已确定结果 {key: (成功标志, 错误信息)}, 结果未知的条目, 无法归属到别名的错误信息)
+    """
+    data = result.get("data") or {}
+    alias_errors: Dict[str, List[str]] = {}
+    general_errors = []
+    for error in result.get("errors") or []:
+        path = error.get("path") or []
+        if path and isinstance(path[0], str) and path[0].startswith("m"):
+            alias_errors.setdefault(path[0], []).append(error.get("message", str(error)))
+        else:
+            general_errors.append(error.get("message", str(error)))
+    
+    outcomes = {}
+    unresolved = []
+    for i, item in enumerate(items):
+        alias = f"m{i}"
+        if alias in alias_errors:
+            outcomes[item[0]] = (False, "; ".join(alias_errors[alias]))
+        elif data.get(alias) is not None:
+            outcomes[item[0]] = (True, "")
+        else:
+            unresolved.append(item)
+    return outcomes, unresolved, general_errors
+
+
+def mutation_request_failed(items: List[Tuple[str, Dict]], error: Exception) -> Dict[str, Tuple[bool, str]]:
+    """
+    批量 mutation 请求本身失败 (连接失败、超时、HTTP 错误，没有拿到可解析的响应) 时各条目的结果
+
+    服务器可能已经执行了其中部分或全部 mutation，而 mutation 不是幂等的，因此不拆分重发，全部报告为结果未知。
+
+    Args:
+        items: 构建文档时使用的条目列表
+        error: 请求抛出的异常
+
+    Returns:
+        {key: (False, 错误信息)}
+    """
+    message = f"请求失败，无法确认是否已执行: {error}"
+    return {key: (False, message) for key, _ in items}
+
+
+def parse_bulk_memberships(data: object, usernames: List[str]) -> Set[str]:
+    """
+    解析 Team 批量成员接口的响应，取出已处理的用户
+    
+    Args:
+        data: 响应数据 (用户对象列表)
+        usernames: 本次请求的用户名
+    
+    Returns:
+        已处理用户的小写用户名集合 (响应不是用户列表时为空集合，所有用户改为逐个处理)
+    """
+    if not isinstance(data, list):
+        return set()
+    requested = {normalize_login(username) for username in usernames}
+    return {normalize_login(user["login"]) for user in data
+            if isinstance(user, dict) and user.get("login")} & requested
+
+
+# ==================== 请求指标 ====================
+
+# REST 路径中紧随这些段之后的部分是参数，统计时替换为占位符
+ENDPOINT_PARAMETERS = {
+    "enterprises": "{enterprise}",
+    "orgs": "{org}",
+    "teams": "{team_id}",
+    "members": "{username}",
+    "memberships": "{username}",
+    "invitations": "{invitation_id}",
+    "users": "{username}",
+}
+# 路径中的固定动作段 (如 Team 批量成员接口 /memberships/add)，不替换为占位符
+ENDPOINT_ACTIONS = {"add", "remove"}
+
+
+def endpoint_template(path: str) -> str:
+    """
+    将 REST 请求路径归一化为接口模板，用于按接口汇总指标
+
+    Args:
+        path: 请求路径，如 /orgs/my-org/members/alice
+
+    Returns:
+        接口模板，如 /orgs/{org}/members/{username}
+    """
+    parts = path.rstrip("/").split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in ENDPOINT_PARAMETERS and parts[i] and not (i == len(parts) - 1 and parts[i] in ENDPOINT_ACTIONS):
+            parts[i] = ENDPOINT_PARAMETERS[parts[i - 1]]
+    return "/".join(parts) or "/"
+
+
+def graphql_operation(query: str) -> str:
+    """
+    取出 GraphQL 文档的第一个顶层字段 (忽略别名)，作为 GraphQL 请求的操作名
+
+    Args:
+        query: GraphQL 查询或突变语句
+
+    Returns:
+        操作名，如 enterprise、user、removeEnterpriseMember
+    """
+    match = re.search(r"\{\s*(?:\w+\s*:\s*)?(\w+)", query or "")
+    return match.group(1) if match else "unknown"
+
+
+def with_cost_field(query: str) -> str:
+    """
+    在 GraphQL 查询的顶层追加 rateLimit { cost }，使响应带上本次查询消耗的点数 (该字段本身不计费)
+
+    突变不能选择 rateLimit，原样返回。
+
+    Args:
+        query: GraphQL 查询或突变语句
+
+    Returns:
+        追加了 rateLimit 字段的查询
+    """
+    stripped = query.strip()
+    if stripped.startswith("mutation") or not stripped.endswith("}") or "rateLimit" in stripped:
+        return query
+    return stripped[:-1] + "  rateLimit { cost }\n}"
+
+
+class RequestMetrics:
+    """
+    按接口汇总的请求指标
+
+    每个 (HTTP 方法, 接口模板, GraphQL 操作名) 记录请求数、状态码、耗时 (不含速率限制等待)、
+    速率限制等待时间、请求 / 响应字节数、重试次数和 GraphQL 点数，运行结束时导出为
+    JSON 摘要和 Prometheus textfile collector 格式，用于区分慢运行的原因 (延迟、限流还是调用量)。
+    """
+
+    # 请求耗时直方图的桶边界 (秒)
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, enterprise: str, clock=time.time):
+        """
+        Args:
+            enterprise: Enterprise slug 名称 (作为 Prometheus 标签)
+            clock: 获取当前时间戳的函数 (便于测试替换)
+        """
+        self.enterprise = enterprise
+        self.clock = clock
+        self.started_at = clock()
+        self._lock = threading.Lock()
+        # (method, endpoint, operation) -> 统计
+        self.endpoints: Dict[Tuple[str, str, str], Dict] = {}
+
+    def _entry(self, method: str, endpoint: str, operation: str) -> Dict:
+        key = (method, endpoint, operation)
+        entry = self.endpoints.get(key)
+        if entry is None:
+            entry = self.endpoints[key] = {
+                "requests": 0, "errors": 0, "statuses": {}, "seconds": 0.0, "max_seconds": 0.0,
+                "wait_seconds": 0.0, "bytes_sent": 0, "bytes_received": 0, "retries": 0,
+                "graphql_cost": 0, "buckets": [0] * len(self.LATENCY_BUCKETS)
+            }
+        return entry
+
+    def record(self, method: str, endpoint: str, operation: str, status: int, seconds: float,
+               wait_seconds: float = 0.0, bytes_sent: int = 0, bytes_received: int = 0, retries: int = 0):
+        """
+        记录一次 API 调用 (包含其因速率限制产生的全部重试)
+
+        Args:
+            method: HTTP 方法
+            endpoint: 接口模板
+            operation: GraphQL 操作名 (REST 请求为空字符串)
+            status: 最终响应的状态码，连接失败时为 0
+            seconds: 各次发送的耗时之和 (不含等待)
+            wait_seconds: 因速率限制等待的时间
+            bytes_sent: 请求体字节数
+            bytes_received: 响应体字节数
+            retries: 因速率限制或瞬时错误重试的次数
+        """
+        with self._lock:
+            entry = self._entry(method, endpoint, operation)
+            entry["requests"] += 1
+            if status == 0 or status >= 400:
+                entry["errors"] += 1
+            entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["wait_seconds"] += wait_seconds
+            entry["bytes_sent"] += bytes_sent
+            entry["bytes_received"] += bytes_received
+            entry["retries"] += retries
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+
+    def record_cost(self, operation: str, cost: int):
+        """
+        记录 GraphQL 查询消耗的点数 (来自响应中的 rateLimit.cost)
+
+        Args:
+            operation: GraphQL 操作名
+            cost: 点数
+        """
+        with self._lock:
+            self._entry("POST", "/graphql", operation)["graphql_cost"] += cost
+
+    def summary(self, rate_limiter: Optional["RateLimitScheduler"] = None) -> Dict:
+        """
+        生成 JSON 摘要
+
+        Args:
+            rate_limiter: 速率限制调度器 (附带总等待时间和剩余额度)
+
+        Returns:
+            {enterprise, started_at, duration_seconds, totals, rate_limit, endpoints: [...]}，
+            endpoints 按耗时从高到低排序
+        """
+        with self._lock:
+            endpoints = [
+                {
+                    "method": method, "endpoint": endpoint, "operation": operation,
+                    "requests": entry["requests"], "errors": entry["errors"], "statuses": dict(entry["statuses"]),
+                    "seconds": round(entry["seconds"], 3),
+                    "avg_seconds": round(entry["seconds"] / entry["requests"], 4) if entry["requests"] else 0,
+                    "max_seconds": round(entry["max_seconds"], 3),
+                    "wait_seconds": round(entry["wait_seconds"], 3),
+                    "bytes_sent": entry["bytes_sent"], "bytes_received": entry["bytes_received"],
+                    "retries": entry["retries"], "graphql_cost": entry["graphql_cost"]
+                }
+                for (method, endpoint, operation), entry in self.endpoints.items()
+            ]
+        endpoints.sort(key=lambda e: -e["seconds"])
+        totals = {field: sum(e[field] for e in endpoints)
+                  for field in ("requests", "errors", "retries", "bytes_sent", "bytes_received", "graphql_cost")}
+        totals["seconds"] = round(sum(e["seconds"] for e in endpoints), 3)
+        totals["wait_seconds"] = round(sum(e["wait_seconds"] for e in endpoints), 3)
+        return {
+            "enterprise": self.enterprise,
+            "started_at": datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_seconds": round(self.clock() - self.started_at, 3),
+            "totals": totals,
+            "rate_limit": {
+                "wait_seconds": round(rate_limiter.total_wait, 3),
+                "budget": rate_limiter.budget()
+            } if rate_limiter else None,
+            "endpoints": endpoints
+        }
+
+    def write_json(self, path: str, rate_limiter: Optional["RateLimitScheduler"] = None):
+        """
+        将 JSON 摘要写入文件
+
+        Args:
+            path: 文件路径
+            rate_limiter: 速率限制调度器
+        """
+        _write_atomic(path, json.dumps(self.summary(rate_limiter), ensure_ascii=False, indent=2))
+
+    def prometheus_text(self, rate_limiter: Optional["RateLimitScheduler"] = None) -> str:
+        """
+        生成 Prometheus 文本格式的指标
+
+        Args:
+            rate_limiter: 速率限制调度器
+
+        Returns:
+            Prometheus 文本格式 (exposition format)
+        """
+        def labels(**values) -> str:
+            pairs = []
+            for key, value in dict(enterprise=self.enterprise, **values).items():
+                value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                pairs.append(f'{key}="{value}"')
+            return "{" + ",".join(pairs) + "}"
+
+        with self._lock:
+            items = sorted((key, dict(entry, statuses=dict(entry["statuses"]), buckets=list(entry["buckets"])))
+                           for key, entry in self.endpoints.items())
+
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, object]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample_name} {value}" for sample_name, value in samples)
+
+        metric("github_sync_requests_total", "counter", "API requests by endpoint and final status code.",
+               [(f"github_sync_requests_total{labels(method=m, endpoint=e, operation=o, status=status)}", count)
+                for (m, e, o), entry in items for status, count in sorted(entry["statuses"].items())])
+
+        histogram = []
+        for (m, e, o), entry in items:
+            for bound, count in zip(self.LATENCY_BUCKETS, entry["buckets"]):
+                histogram.append((f"github_sync_request_duration_seconds_bucket{labels(method=m, endpoint=e, operation=o, le=bound)}", count))
+            histogram.append((f"github_sync_request_duration_seconds_bucket{labels(method=m, endpoint=e, operation=o, le='+Inf')}", entry["requests"]))
+            histogram.append((f"github_sync_request_duration_seconds_sum{labels(method=m, endpoint=e, operation=o)}", round(entry["seconds"], 6)))
+            histogram.append((f"github_sync_request_duration_seconds_count{labels(method=m, endpoint=e, operation=o)}", entry["requests"]))
+        metric("github_sync_request_duration_seconds", "histogram",
+               "Time spent sending API requests, excluding rate limit waits.", histogram)
+
+        for name, field, help_text in (
+                ("github_sync_rate_limit_wait_seconds_total", "wait_seconds", "Time spent waiting for rate limits before requests."),
+                ("github_sync_request_retries_total", "retries", "Requests retried after being rate limited or failing transiently."),
+                ("github_sync_request_bytes_total", "bytes_sent", "Request body bytes sent."),
+                ("github_sync_response_bytes_total", "bytes_received", "Response body bytes received."),
+                ("github_sync_graphql_cost_total", "graphql_cost", "GraphQL rate limit points reported by rateLimit.cost.")):
+            metric(name, "counter", help_text,
+                   [(f"{name}{labels(method=m, endpoint=e, operation=o)}", round(entry[field], 6))
+                    for (m, e, o), entry in items if field != "graphql_cost" or e == "/graphql"])
+
+        if rate_limiter:
+            metric("github_sync_rate_limit_remaining", "gauge", "Remaining rate limit quota at the end of the run.",
+                   [(f"github_sync_rate_limit_remaining{labels(resource=resource)}", bucket["remaining"])
+                    for resource, bucket in sorted(rate_limiter.budget().items()) if bucket.get("remaining") is not None])
+        metric("github_sync_run_duration_seconds", "gauge", "Duration of the last sync run.",
+               [(f"github_sync_run_duration_seconds{labels()}", round(self.clock() - self.started_at, 3))])
+        metric("github_sync_last_run_timestamp_seconds", "gauge", "Unix time the last sync run finished.",
+               [(f"github_sync_last_run_timestamp_seconds{labels()}", round(self.clock(), 3))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, rate_limiter: Optional["RateLimitScheduler"] = None):
+        """
+        写入 Prometheus textfile collector 文件 (先写临时文件再重命名，避免采集到写了一半的文件)
+
+        Args:
+            path: 文件路径 (node_exporter 的 --collector.textfile.directory 下的 *.prom 文件)
+            rate_limiter: 速率限制调度器
+        """
+        _write_atomic(path, self.prometheus_text(rate_limiter))
+
+
+def _write_atomic(path: str, content: str):
+    """先写入同目录下的临时文件再重命名，读取方不会看到写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# ==================== 性能分析 ====================
+
+class SyncProfiler:
+    """
+    按同步阶段的性能分析 (注册为 GitHubEnterpriseTeamSync.phase_listeners)
+
+    - 每个阶段及每个 Organization / Team 子阶段记录耗时
+    - cpu=True 时每个顶层阶段用 cProfile 采集 (只跟踪当前线程，调用方需串行执行同步)
+    - memory=True 时每个顶层阶段前后各取一次 tracemalloc 快照，按代码行统计净增内存和阶段内峰值
+
+    结束后 report() 输出按耗时排序的热点报告，save() 另存每个阶段的 .prof 文件 (可用 snakeviz 等工具查看)。
+    """
+
+    # 报告中每个列表的条目数
+    TOP_N = 20
+
+    def __init__(self, cpu: bool = False, memory: bool = False, top: int = TOP_N, clock=time.perf_counter):
+        """
+        Args:
+            cpu: 是否用 cProfile 采集各阶段的函数耗时
+            memory: 是否用 tracemalloc 采集各阶段的内存分配
+            top: 报告中每个列表的条目数
+            clock: 计时函数 (便于测试替换)
+        """
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.clock = clock
+        # 顶层阶段 (按结束顺序) [{name, seconds, peak_mb, allocated_mb}]
+        self.phases: List[Dict] = []
+        # 子阶段 [{phase, name, seconds}]
+        self.resources: List[Dict] = []
+        # 阶段 -> cProfile 统计
+        self.stats: Dict[str, pstats.Stats] = {}
+        # 阶段 -> 按代码行的内存净增 (tracemalloc.StatisticDiff)
+        self.allocations: Dict[str, List] = {}
+        self._active: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def phase_started(self, name: str):
+        state = {}
+        if "/" not in name:
+            if self.memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracemalloc = True
+                if hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+                state["snapshot"] = self._snapshot()
+            if self.cpu:
+                state["profile"] = cProfile.Profile()
+                state["profile"].enable()
+        state["started"] = self.clock()
+        with self._lock:
+            self._active[name] = state
+
+    def phase_finished(self, name: str):
+        finished = self.clock()
+        with self._lock:
+            state = self._active.pop(name, None)
+        if state is None:
+            return
+        if "profile" in state:
+            state["profile"].disable()
+        seconds = finished - state["started"]
+
+        if "/" in name:
+            phase, resource = name.split("/", 1)
+            with self._lock:
+                self.resources.append({"phase": phase, "name": resource, "seconds": seconds})
+            return
+
+        entry = {"name": name, "seconds": seconds}
+        if "profile" in state:
+            self.stats[name] = pstats.Stats(state["profile"])
+        if "snapshot" in state:
+            entry["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            diffs = self._snapshot().compare_to(state["snapshot"], "lineno")
+            entry["allocated_mb"] = sum(diff.size_diff for diff in diffs) / 1024 / 1024
+            self.allocations[name] = [diff for diff in diffs if diff.size_diff > 0][:self.top]
+        with self._lock:
+            self.phases.append(entry)
+
+    def _snapshot(self) -> "tracemalloc.Snapshot":
+        """取 tracemalloc 快照 (排除 tracemalloc 和 cProfile 自身的分配)"""
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, cProfile.__file__)))
+
+    def stop(self):
+        """停止由本对象启动的 tracemalloc"""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def hot_spots(self) -> List[Dict]:
+        """
+        合并所有阶段的 cProfile 统计，按函数自身耗时排序
+
+        Returns:
+            [{function, calls, tottime, cumtime, phase}]，phase 为该函数自身耗时最多的阶段
+        """
+        functions: Dict[Tuple, Dict] = {}
+        for phase, stats in self.stats.items():
+            for func, (_, calls, tottime, cumtime, _) in stats.stats.items():
+                entry = functions.setdefault(func, {"function": _format_function(func), "calls": 0, "tottime": 0.0,
+                                                    "cumtime": 0.0, "phase": phase, "phase_tottime": 0.0})
+                entry["calls"] += calls
+                entry["tottime"] += tottime
+                entry["cumtime"] += cumtime
+                if tottime > entry["phase_tottime"]:
+                    entry["phase"], entry["phase_tottime"] = phase, tottime
+        ranked = sorted(functions.values(), key=lambda e: -e["tottime"])[:self.top]
+        for entry in ranked:
+            del entry["phase_tottime"]
+        return ranked
+
+    def report(self) -> str:
+        """
+        生成热点报告
+
+        Returns:
+            报告文本: 阶段耗时、最慢的 Organization / Team、CPU 热点、内存分配热点
+        """
+        total = sum(phase["seconds"] for phase in self.phases) or 1.0
+        lines = [f"\n{'='*60}", "🔬 性能分析报告", f"{'='*60}", "", "⏱️  阶段耗时:"]
+        header = f"  {'阶段':<20}{'耗时(s)':>10}{'占比':>8}"
+        if self.memory:
+            header += f"{'峰值(MB)':>12}{'净增(MB)':>12}"
+        lines.append(header)
+        for phase in self.phases:
+            line = f"  {phase['name']:<20}{phase['seconds']:>10.2f}{phase['seconds'] / total:>8.1%}"
+            if "peak_mb" in phase:
+                line += f"{phase['peak_mb']:>12.1f}{phase['allocated_mb']:>12.1f}"
+            lines.append(line)
+
+        if self.resources:
+            lines += ["", f"🐢 最慢的 Organization / Team (前 {self.top}):"]
+            for resource in sorted(self.resources, key=lambda r: -r["seconds"])[:self.top]:
+                lines.append(f"  {resource['seconds']:>8.2f}s  {resource['phase']}  {resource['name']}")
+
+        if self.stats:
+            lines += ["", f"🔥 CPU 热点 (按函数自身耗时排序，前 {self.top}):",
+                      f"  {'#':>3} {'自身(s)':>9} {'累计(s)':>9} {'调用次数':>10}  函数 [主要阶段]"]
+            for rank, spot in enumerate(self.hot_spots(), 1):
+                lines.append(f"  {rank:>3} {spot['tottime']:>9.3f} {spot['cumtime']:>9.3f} {spot['calls']:>10}  "
+                             f"{spot['function']} [{spot['phase']}]")
+
+        if self.allocations:
+            spots = sorted(((diff, phase) for phase, diffs in self.allocations.items() for diff in diffs),
+                           key=lambda item: -item[0].size_diff)[:self.top]
+            lines += ["", f"🧠 内存分配热点 (阶段内净增，前 {self.top}):"]
+            for rank, (diff, phase) in enumerate(spots, 1):
+                frame = diff.traceback[0]
+                lines.append(f"  {rank:>3} {diff.size_diff / 1024:>10.1f} KiB {diff.count_diff:>8} 个对象  "
+                             f"{os.path.basename(frame.filename)}:{frame.lineno} [{phase}]")
+        return "\n".join(lines) + "\n"
+
+    def save(self, directory: str) -> List[str]:
+        """
+        保存报告 (profile_report.txt) 和每个阶段的 cProfile 数据 ({阶段}.prof)
+
+        Args:
+            directory: 输出目录
+
+        Returns:
+            写入的文件路径列表
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, "profile_report.txt")]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            f.write(self.report())
+        for phase, stats in self.stats.items():
+            path = os.path.join(directory, f"{phase}.prof")
+            stats.dump_stats(path)
+            paths.append(path)
+        return paths
+
+
+def _format_function(func: Tuple[str, int, str]) -> str:
+    """将 cProfile 的 (文件, 行号, 函数名) 格式化为 文件名:行号(函数名)，内置函数只保留名称"""
+    filename, lineno, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+# ==================== 配置解析 ====================
+
+def normalize_login(login: str) -> str:
+    """
+    规范化 GitHub 用户名，用作成员比较的唯一标识 (GitHub 用户名不区分大小写)
+    
+    Args:
+        login: 用户名
+        
+    Returns:
+        去除首尾空白并转为小写的用户名
+    """
+    return login.strip().lower()
+
+
+def normalize_members(members: List) -> Dict[str, Dict[str, str]]:
+    """
+    解析配置中的成员列表 (支持字符串或 {username, email} 对象)
+    
+    Args:
+        members: 配置中的成员列表
+        
+    Returns:
+        字典 {username_lower: {'username': ..., 'email': ...}}
+    """
+    identifiers = {}
+    for member in members:
+        if isinstance(member, dict):
+            username = member.get('username', '').strip()
+            email = member.get('email', '').strip()
+            if username:
+                identifiers[normalize_login(username)] = {'username': username, 'email': email}
+        elif isinstance(member, str) and member.strip():
+            member = member.strip()
+            if "@" in member:
+                username = member.split('@')[0]
+                identifiers[normalize_login(username)] = {'username': username, 'email': member}
+            else:
+                identifiers[normalize_login(member)] = {'username': member, 'email': ''}
+    return identifiers
+
+
+def config_usernames(members: List) -> Set[str]:
+    """
+    收集成员列表中显式配置的用户名 (小写)，仅有邮箱的字符串成员不计入
+    
+    Args:
+        members: 配置中的成员列表
+        
+    Returns:
+        用户名集合 (小写)
+    """
+    usernames = set()
+    for member in members:
+        if isinstance(member, dict):
+            username = member.get('username', '').strip()
+            if username:
+                usernames.add(normalize_login(username))
+        elif isinstance(member, str) and member.strip() and "@" not in member:
+            usernames.add(normalize_login(member))
+    return usernames
+
+
+def reserved_usernames(reserved_members: List) -> Set[str]:
+    """
+    解析 reserved_members (支持字符串或 {username} 对象)
+    
+    Args:
+        reserved_members: 配置中的保留成员列表
+        
+    Returns:
+        用户名集合 (小写)
+    """
+    reserved = set()
+    for member in reserved_members:
+        if isinstance(member, str):
+            if member.strip():
+                reserved.add(normalize_login(member))
+        elif isinstance(member, dict):
+            username = member.get('username', '').strip()
+            if username:
+                reserved.add(normalize_login(username))
+    return reserved
+
+
+# ==================== 增量同步 ====================
+
+def resource_hashes(config: Dict) -> Dict[str, str]:
+    """
+    计算配置中每个资源期望状态的内容摘要
+    
+    资源键为 org:<login>、team:<name> (小写) 以及 enterprise (Enterprise 成员清理，
+    取决于 reserved_members 和所有 Organization / Team 中的用户名)。
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        字典 {资源键: sha256 摘要}
+    """
+    def digest(obj) -> str:
+        return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    
+    hashes = {}
+    all_usernames = set()
+    for org in config.get("orgs", []):
+        if not org.get("login"):
+            continue
+        all_usernames |= config_usernames(org.get("members", []))
+        hashes[f"org:{org['login'].lower()}"] = digest({
+            "login": org["login"],
+            "admin": org.get("admin"),
+            "billing_email": org.get("billing_email"),
+            "members": normalize_members(org.get("members", []))
+        })
+    for team in config.get("teams", []):
+        if not team.get("name"):
+            continue
+        all_usernames |= config_usernames(team.get("members", []))
+        hashes[f"team:{team['name'].lower()}"] = digest({
+            "name": team["name"],
+            "id": team.get("id"),
+            "slug": team.get("slug"),
+            "members": normalize_members(team.get("members", []))
+        })
+    hashes["enterprise"] = digest({
+        "enterprise": config.get("enterprise"),
+        "reserved_members": sorted(reserved_usernames(config.get("reserved_members", []))),
+        "usernames": sorted(all_usernames)
+    })
+    return hashes
+
+
+class SyncState:
+    """
+    增量同步状态文件 (JSON)
+    
+    记录上次成功应用的配置、每个资源已收敛时的内容摘要以及上次全量同步的时间。
+    只有同步无错误且没有待接受邀请的资源才记录摘要，其余资源下次运行时会再次同步。
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, path: str, data: Optional[Dict] = None):
+        """
+        Args:
+            path: 状态文件路径
+            data: 已读取的状态数据
+        """
+        self.path = path
+        self.data = data or {
+            "version": self.VERSION,
+            "enterprise": None,
+            "applied_at": None,
+            "last_full_sync": None,
+            "resources": {},
+            "config": None
+        }
+    
+    @classmethod
+    def load(cls, path: str) -> "SyncState":
+        """读取状态文件，文件不存在或无法解析时返回空状态"""
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️  读取同步状态文件失败，将执行全量同步: {e}")
+            return cls(path)
+        if data.get("version") != cls.VERSION:
+            print(f"⚠️  同步状态文件版本不匹配，将执行全量同步")
+            return cls(path)
+        return cls(path, data)
+    
+    def select(self, hashes: Dict[str, str], enterprise: str, full_sync_interval: float,
+               now: Optional[float] = None) -> Optional[Set[str]]:
+        """
+        选出需要同步的资源
+        
+        Args:
+            hashes: 当前配置的资源摘要 (见 resource_hashes)
+            enterprise: Enterprise slug
+            full_sync_interval: 全量同步间隔 (秒)，超过该间隔时执行全量同步以纠正配置外的改动
+            now: 当前时间戳
+            
+        Returns:
+            需要同步的资源键集合；需要全量同步时返回 None
+        """
+        now = time.time() if now is None else now
+        last_full_sync = self.data.get("last_full_sync")
+        if self.data.get("enterprise") != enterprise or last_full_sync is None:
+            return None
+        if now - last_full_sync >= full_sync_interval:
+            return None
+        resources = self.data.get("resources", {})
+        return {key for key, value in hashes.items() if resources.get(key) != value}
+    
+    def record(self, config: Dict, hashes: Dict[str, str], converged: Set[str], synced: Set[str],
+               full_sync: bool, enterprise: str):
+        """
+        记录本次同步结果
+        
+        Args:
+            config: 本次应用的配置
+            hashes: 本次配置的资源摘要
+            converged: 本次同步后已收敛的资源键
+            synced: 本次同步过的资源键 (其中未收敛的资源会清除旧摘要)
+            full_sync: 本次是否为全量同步
+            enterprise: Enterprise slug
+        """
+        resources = {key: value for key, value in self.data.get("resources", {}).items() if key in hashes}
+        for key in synced:
+            if key in converged:
+                resources[key] = hashes[key]
+            else:
+                resources.pop(key, None)
+        
+        now = time.time()
+        self.data.update({
+            "version": self.VERSION,
+            "enterprise": enterprise,
+            "applied_at": datetime.now().isoformat(),
+            "resources": resources,
+            "config": config
+        })
+        if full_sync:
+            self.data["last_full_sync"] = now
+    
+    def save(self):
+        """写入状态文件 (先写临时文件再替换，避免中断时损坏)"""
+        _write_atomic(self.path, json.dumps(self.data, ensure_ascii=False, indent=2))
+
+
+def converged_resources(report: Dict, cleanup_ok: bool) -> Set[str]:
+    """
+    根据同步报告找出已收敛的资源 (没有错误，也没有新发送、仍在等待接受或因额度延后的邀请)
+    
+    Args:
+        report: 同步报告数据
+        cleanup_ok: Enterprise 成员清理是否成功完成
+        
+    Returns:
+        资源键集合
+    """
+    converged = set()
+    for org_report in report.get("orgs", []):
+        if not any(org_report.get(field) for field in ("errors", "invited", "pending", "deferred")):
+            converged.add(f"org:{org_report['login'].lower()}")
+    for team_report in report.get("teams", []):
+        if not any(team_report.get(field) for field in ("errors", "invited", "pending", "deferred")):
+            converged.add(f"team:{team_report['name'].lower()}")
+    if cleanup_ok and not report.get("enterprise_remove_errors"):
+        converged.add("enterprise")
+    return converged
+
+
+# ==================== 邀请生命周期 ====================
+
+# 邀请因额度用完被拒绝时错误信息中的关键字 (REST: "Over invitation rate limit"，GraphQL 错误信息类似)
+INVITATION_QUOTA_MESSAGES = ("invitation rate limit", "invitation limit", "too many invitations")
+
+
+def invitation_quota_error(message: str) -> bool:
+    """判断邀请失败是否因为邀请额度用完 (应延后而不是记为失败)"""
+    message = str(message).lower()
+    return any(keyword in message for keyword in INVITATION_QUOTA_MESSAGES)
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """
+    解析 API 返回的 ISO 8601 时间 (如 2024-01-01T00:00:00Z)，没有时区的时间按本地时间处理
+    
+    Args:
+        value: 时间字符串
+    
+    Returns:
+        Unix 时间戳；为空或无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class InvitationLedger:
+    """
+    本地邀请记录与邀请队列 (JSON)
+    
+    记录本工具发出的每个邀请 (首次 / 最近发送时间、邀请 ID、发送次数) 以及首次看到的外部邀请，
+    用于判断待处理邀请是否仍然有效：未超过 reissue_age 的邀请保留不动，超过后才撤销并重新发送。
+    已过期的邀请不再出现在待处理列表中，规划时会直接重新邀请。
+    
+    GitHub 限制每个 Organization / Enterprise 在一段时间内可发送的邀请数。记录中同时保存每个范围在
+    quota_window 内已放行的邀请时间和因额度用完而延后的邀请队列：每次运行按优先级 (相同时先入队的优先)
+    放行剩余额度内的邀请，其余留在队列中由之后的运行继续发送。
+    
+    键为 "<范围>:<邮箱或用户名 (小写)>"，范围为 enterprise 或 org/<login>。
+    """
+    
+    VERSION = 1
+    # 默认重新发送邀请的间隔 (秒)，与 GitHub 邀请的有效期一致
+    DEFAULT_REISSUE_AGE = 7 * 24 * 3600
+    # 每个范围在 DEFAULT_QUOTA_WINDOW 内默认最多放行的邀请数
+    DEFAULT_QUOTA = 500
+    # 邀请额度的统计窗口 (秒)
+    DEFAULT_QUOTA_WINDOW = 24 * 3600
+    # 超过该时间没有再出现的记录会被清理 (秒)
+    RETENTION = 30 * 24 * 3600
+    
+    def __init__(self, path: Optional[str] = None, reissue_age: float = DEFAULT_REISSUE_AGE,
+                 data: Optional[Dict] = None, clock=time.time, quota: int = DEFAULT_QUOTA,
+                 quota_window: float = DEFAULT_QUOTA_WINDOW):
+        """
+        Args:
+            path: 记录文件路径，为 None 时只在本次运行内记录
+            reissue_age: 待处理邀请超过该时间 (秒) 后撤销并重新发送，<= 0 时每次运行都重新发送
+            data: 已读取的记录数据
+            clock: 时间函数 (测试时可替换)
+            quota: 每个范围在 quota_window 内最多放行的邀请数，<= 0 时不限制
+            quota_window: 邀请额度的统计窗口 (秒)
+        """
+        self.path = path
+        self.reissue_age = reissue_age
+        self.data = data or {"version": self.VERSION, "invitations": {}}
+        for field in ("released", "exhausted", "queue"):
+            self.data.setdefault(field, {})
+        self.clock = clock
+        self.quota = quota
+        self.quota_window = quota_window
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def load(cls, path: str, **options) -> "InvitationLedger":
+        """读取记录文件 (options 传给构造函数)，文件不存在或无法解析时返回空记录"""
+        if not os.path.exists(path):
+            return cls(path, **options)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️  读取邀请记录失败，将按邀请创建时间判断: {e}")
+            return cls(path, **options)
+        if data.get("version") != cls.VERSION:
+            print(f"⚠️  邀请记录版本不匹配，已忽略")
+            return cls(path, **options)
+        return cls(path, data=data, **options)
+    
+    @staticmethod
+    def _key(scope: str, identifier: str) -> str:
+        return f"{scope}:{identifier.lower()}"
+    
+    def is_fresh(self, invitation: Dict, scope: str, identifier: str) -> bool:
+        """
+        判断待处理邀请是否仍然有效 (无需撤销重发)
+        
+        邀请时间取 API 返回的创建时间和本地记录的最近发送时间中较晚的一个；两者都没有时从首次看到该邀请起计算。
+        
+        Args:
+            invitation: 待处理邀请 (含 created_at)
+            scope: 邀请范围 (enterprise 或 org/<login>)
+            identifier: 邮箱或用户名
+        
+        Returns:
+            是否保留该邀请
+        """
+        if self.reissue_age <= 0:
+            return False
+        now = self.clock()
+        with self._lock:
+            entry = self.data["invitations"].setdefault(self._key(scope, identifier), {"first_seen_at": now})
+            entry["seen_at"] = now
+            invited_at = max(filter(None, (parse_timestamp(invitation.get("created_at")), entry.get("last_invited_at"))),
+                             default=entry["first_seen_at"])
+        return now - invited_at < self.reissue_age
+    
+    def record_sent(self, scope: str, identifier: str, invitation_id=None):
+        """
+        记录一次成功发送的邀请
+        
+        Args:
+            scope: 邀请范围 (enterprise 或 org/<login>)
+            identifier: 邮箱或用户名
+            invitation_id: 新邀请的 ID
+        """
+        now = self.clock()
+        key = self._key(scope, identifier)
+        with self._lock:
+            entry = self.data["invitations"].setdefault(key, {"first_seen_at": now})
+            entry.setdefault("first_invited_at", now)
+            entry.update({"last_invited_at": now, "seen_at": now, "id": invitation_id,
+                          "count": entry.get("count", 0) + 1})
+            self.data["queue"].pop(key, None)
+    
+    def _remaining(self, scope: str, now: float) -> Optional[int]:
+        """剩余邀请额度 (调用方持有锁)；不限制时返回 None"""
+        if self.quota <= 0:
+            return None
+        # 先建立该范围的放行记录：schedule 会在其后追加本次放行的时间
+        released = [t for t in self.data["released"].get(scope, []) if t > now - self.quota_window]
+        self.data["released"][scope] = released
+        if self.data["exhausted"].get(scope, 0) > now:
+            return 0
+        return max(0, self.quota - len(released))
+    
+    def remaining(self, scope: str) -> Optional[int]:
+        """
+        范围内剩余的邀请额度
+        
+        Args:
+            scope: 邀请范围 (enterprise 或 org/<login>)
+            
+        Returns:
+            本窗口内还可放行的邀请数；不限制时返回 None
+        """
+        with self._lock:
+            return self._remaining(scope, self.clock())
+    
+    def schedule(self, candidates: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        按剩余额度放行待发送的邀请
+        
+        每个范围内按优先级从高到低、相同时按入队时间 (本次新增的排在队列已有条目之后) 放行，
+        放行的邀请立即占用额度 (发送失败也不退还)，其余邀请进入队列。
+        
+        Args:
+            candidates: 待发送的邀请 [{scope, identifier, priority, ...}]
+            
+        Returns:
+            (放行的邀请, 延后的邀请)，元素为传入的字典
+        """
+        now = self.clock()
+        released, deferred = [], []
+        with self._lock:
+            queue = self.data["queue"]
+            by_scope: Dict[str, List[Tuple]] = {}
+            for order, candidate in enumerate(candidates):
+                queued = queue.get(self._key(candidate["scope"], candidate["identifier"]))
+                queued_at = queued["queued_at"] if queued else now
+                by_scope.setdefault(candidate["scope"], []).append(
+                    (-candidate.get("priority", 0), queued_at, order, candidate))
+            for scope, items in by_scope.items():
+                items.sort(key=lambda item: item[:3])
+                remaining = self._remaining(scope, now)
+                if remaining is not None:
+                    self.data["released"][scope].extend([now] * min(remaining, len(items)))
+                for position, (_, queued_at, _, candidate) in enumerate(items):
+                    key = self._key(scope, candidate["identifier"])
+                    if remaining is None or position < remaining:
+                        released.append(candidate)
+                        continue
+                    deferred.append(candidate)
+                    queue[key] = {"scope": scope, "identifier": candidate["identifier"],
+                                  "priority": candidate.get("priority", 0), "queued_at": queued_at}
+        return released, deferred
+    
+    def defer(self, candidate: Dict):
+        """
+        邀请因额度用完被拒绝：该范围在本窗口内不再放行邀请，邀请放回队列
+        
+        Args:
+            candidate: schedule 放行的邀请 {scope, identifier, priority}
+        """
+        now = self.clock()
+        with self._lock:
+            self.data["exhausted"][candidate["scope"]] = now + self.quota_window
+            self.data["queue"].setdefault(self._key(candidate["scope"], candidate["identifier"]), {
+                "scope": candidate["scope"], "identifier": candidate["identifier"],
+                "priority": candidate.get("priority", 0), "queued_at": now
+            })
+    
+    def prune(self):
+        """清理超过 RETENTION 没有再出现的记录和队列条目，以及已过期的额度记录"""
+        now = self.clock()
+        cutoff = now - self.RETENTION
+        with self._lock:
+            self.data["invitations"] = {key: entry for key, entry in self.data["invitations"].items()
+                                        if entry.get("seen_at", 0) >= cutoff}
+            self.data["queue"] = {key: entry for key, entry in self.data["queue"].items()
+                                  if entry.get("queued_at", 0) >= cutoff}
+            self.data["released"] = {scope: [t for t in times if t > now - self.quota_window]
+                                     for scope, times in self.data["released"].items()}
+            self.data["released"] = {scope: times for scope, times in self.data["released"].items() if times}
+            self.data["exhausted"] = {scope: until for scope, until in self.data["exhausted"].items() if until > now}
+    
+    def save(self):
+        """清理旧记录后写入记录文件 (先写临时文件再替换)；没有文件路径时不写入"""
+        if not self.path:
+            return
+        self.prune()
+        _write_atomic(self.path, json.dumps(self.data, ensure_ascii=False, indent=2))
+
+
+def invite_quota_report(ledger: InvitationLedger, org_logins: List[str]) -> Dict[str, int]:
+    """
+    汇总本次涉及的各范围剩余邀请额度 (同步与异步引擎共用，写入报告的 invite_quota)
+    
+    Args:
+        ledger: 本地邀请记录
+        org_logins: 本次同步的 Organization login
+        
+    Returns:
+        {范围: 剩余邀请数}；不限制邀请额度时为空字典
+    """
+    quota = {}
+    for scope in ["enterprise"] + [f"org/{login.lower()}" for login in org_logins]:
+        remaining = ledger.remaining(scope)
+        if remaining is not None:
+            quota[scope] = remaining
+    return quota
+
+
+# ==================== 变更计划 ====================
+
+PLAN_VERSION = 1
+
+
+def summarize_plan(plan: Dict) -> List[str]:
+    """
+    生成变更计划的可读摘要
+    
+    Args:
+        plan: 变更计划
+        
+    Returns:
+        摘要文本行
+    """
+    lines = [f"\n{'='*60}", "📝 变更计划", f"{'='*60}"]
+    totals = {"create": 0, "add": 0, "invite": 0, "cancel": 0, "pending": 0, "remove": 0}
+    
+    for org in plan.get("orgs", []):
+        lines.append(f"Organization: {org['login']}" + (" (新建)" if org.get("create") else ""))
+        lines.extend(f"  ❌ {error}" for error in org.get("errors", []))
+        lines.extend(f"  ↺ 撤销旧邀请: {c['username']}" for c in org.get("cancel_invitations", []))
+        lines.extend(f"  + {i['username']} ({i['email']})" if i['email'] else f"  + {i['username']}"
+                     for i in org.get("invites", []))
+        lines.extend(f"  ⏳ 保留邀请: {p['username']}" for p in org.get("pending", []))
+        lines.extend(f"  - {username}" for username in org.get("removes", []))
+        totals["create"] += bool(org.get("create"))
+        totals["invite"] += len(org.get("invites", []))
+        totals["cancel"] += len(org.get("cancel_invitations", []))
+        totals["pending"] += len(org.get("pending", []))
+        totals["remove"] += len(org.get("removes", []))
+    
+    for team in plan.get("teams", []):
+        lines.append(f"Team: {team['name']}" + (" (新建)" if team.get("create") else ""))
+        lines.extend(f"  ❌ {error}" for error in team.get("errors", []))
+        lines.extend(f"  + {a['username']}" for a in team.get("adds", []))
+        lines.extend(f"  ↺ 撤销旧的 Enterprise 邀请: {c['email']}" for c in team.get("cancel_invitations", []))
+        lines.extend(f"  📧 {i['email']} (Enterprise 邀请)" for i in team.get("invites", []))
+        lines.extend(f"  ⏳ 保留 Enterprise 邀请: {p['email']}" for p in team.get("pending", []))
+        lines.extend(f"  ⚠️ 待处理邀请列表不完整，跳过邀请: {email}" for email in team.get("skipped_invites", []))
+        lines.extend(f"  - {username}" for username in team.get("removes", []))
+        totals["create"] += bool(team.get("create"))
+        totals["add"] += len(team.get("adds", []))
+        totals["invite"] += len(team.get("invites", []))
+        totals["cancel"] += len(team.get("cancel_invitations", []))
+        totals["pending"] += len(team.get("pending", []))
+        totals["remove"] += len(team.get("removes", []))
+    
+    cleanup = plan.get("cleanup")
+    if cleanup is not None:
+        if cleanup.get("skipped"):
+            lines.append("Enterprise 清理: 无法获取成员列表，跳过")
+        else:
+            lines.append(f"Enterprise 清理: 移除 {len(cleanup.get('removes', []))} 人")
+            lines.extend(f"  - {username}" for username in cleanup.get("removes", []))
+            totals["remove"] += len(cleanup.get("removes", []))
+    
+    lines.append(f"共计: 创建 {totals['create']}，添加 {totals['add']}，邀请 {totals['invite']}，"
+                 f"撤销邀请 {totals['cancel']}，保留邀请 {totals['pending']}，移除 {totals['remove']}")
+    return lines
+
+
+def save_plan(plan: Dict, plan_file: str):
+    """将变更计划保存为 JSON 文件"""
+    with open(plan_file, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+
+
+def load_plan(plan_file: str) -> Dict:
+    """
+    读取变更计划 JSON 文件
+    
+    Raises:
+        ValueError: 计划版本不受支持
+    """
+    with open(plan_file, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"不支持的变更计划版本: {plan.get('version')}")
+    return plan
+
+
+class RateLimitScheduler:
+    """
+    统一的速率限制调度器
+    
+    跟踪 REST 主限额 (core)、GraphQL 点数限额 (graphql) 以及次级限额 (secondary rate limit)：
+    - 每次响应后读取 X-RateLimit-* 响应头更新剩余额度
+    - 剩余额度低于阈值时在重置窗口内均匀分配请求 (pacing)，而不是一次性耗尽
+    - 额度耗尽或触发次级限额时，等待到重置时间 / Retry-After 后再继续
+    """
+    
+    # 剩余额度低于上限的该比例时开始均匀分配请求
+    PACING_THRESHOLD = 0.05
+    # 触发次级限额但没有 Retry-After 时的默认等待时间 (秒)
+    SECONDARY_LIMIT_DEFAULT_WAIT = 60
+    
+    def __init__(self, clock=time.time, sleep=time.sleep):
+        """
+        Args:
+            clock: 获取当前时间戳的函数 (便于测试替换)
+            sleep: 休眠函数 (便于测试替换)
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # resource -> {limit, remaining, reset, used}
+        self.buckets: Dict[str, Dict] = {}
+        # 次级限额解除时间 (对所有资源生效)
+        self.blocked_until = 0.0
+        self.total_wait = 0.0
+    
+    def acquire(self, resource: str):
+        """
+        发送请求前调用：必要时等待，使请求不会超出限额
+        
+        Args:
+            resource: 限额类型 (core 或 graphql)
+        """
+        delay = self.reserve(resource)
+        if delay > 0:
+            self.sleep(delay)
+    
+    def reserve(self, resource: str) -> float:
+        """
+        预扣一个请求额度并计算发送前需要等待的时间 (不休眠，供异步调用方使用)
+        
+        Args:
+            resource: 限额类型 (core 或 graphql)
+            
+        Returns:
+            需要等待的秒数
+        """
+        with self._lock:
+            now = self.clock()
+            delay = max(0.0, self.blocked_until - now)
+            bucket = self.buckets.get(resource)
+            if bucket and bucket.get("remaining") is not None and bucket.get("reset"):
+                remaining = bucket["remaining"]
+                until_reset = bucket["reset"] - now
+                if until_reset > 0:
+                    if remaining <= 0:
+                        # 额度已耗尽，等待到重置时间
+                        delay = max(delay, until_reset + 1)
+                    elif bucket.get("limit") and remaining < bucket["limit"] * self.PACING_THRESHOLD:
+                        # 额度即将耗尽，将剩余请求均匀分布到重置窗口内
+                        delay = max(delay, until_reset / remaining)
+                # 预扣一个额度，避免并发请求同时看到相同的剩余额度
+                bucket["remaining"] = remaining - 1
+            self.total_wait += delay
+        return delay
+    
+    def wait(self, seconds: float):
+        """
+        休眠并累计等待时间
+        
+        Args:
+            seconds: 等待秒数
+        """
+        self.record_wait(seconds)
+        self.sleep(seconds)
+    
+    def record_wait(self, seconds: float):
+        """
+        累计因速率限制等待的时间 (由调用方自行休眠，如 asyncio.sleep)
+        
+        Args:
+            seconds: 等待秒数
+        """
+        with self._lock:
+            self.total_wait += seconds
+    
+    def update(self, resource: str, response: requests.Response):
+        """
+        根据响应头更新限额状态
+        
+        Args:
+            resource: 发送请求时使用的限额类型
+            response: 响应对象
+        """
+        headers = response.headers
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        resource = headers.get("X-RateLimit-Resource", resource)
+        try:
+            bucket = {
+                "limit": int(headers.get("X-RateLimit-Limit", 0)) or None,
+                "remaining": int(headers["X-RateLimit-Remaining"]),
+                "reset": float(headers.get("X-RateLimit-Reset", 0)) or None,
+                "used": int(headers.get("X-RateLimit-Used", 0))
+            }
+        except ValueError:
+            return
+        with self._lock:
+            self.buckets[resource] = bucket
+    
+    def rate_limit_wait(self, response: requests.Response) -> Optional[float]:
+        """
+        判断响应是否因速率限制被拒绝
+        
+        Args:
+            response: 响应对象
+            
+        Returns:
+            需要等待的秒数；如果不是速率限制响应则返回 None
+        """
+        status = response.status_code
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        retry_after = response.headers.get("Retry-After")
+        
+        if status in (403, 429):
+            body = response.text.lower()
+            if retry_after or "secondary rate limit" in body or "abuse" in body:
+                # 次级限额：所有请求都需要暂停
+                try:
+                    wait = float(retry_after)
+                except (TypeError, ValueError):
+                    wait = self.SECONDARY_LIMIT_DEFAULT_WAIT
+                with self._lock:
+                    self.blocked_until = max(self.blocked_until, self.clock() + wait)
+                return wait
+            if remaining == "0":
+                return self._wait_until_reset(response)
+        elif status == 200 and remaining == "0" and b"RATE_LIMITED" in response.content:
+            # GraphQL 点数耗尽时返回 200 + RATE_LIMITED 错误
+            return self._wait_until_reset(response)
+        return None
+    
+    def _wait_until_reset(self, response: requests.Response) -> float:
+        """计算距离主限额重置的等待时间"""
+        try:
+            reset = float(response.headers.get("X-RateLimit-Reset", 0))
+        except ValueError:
+            reset = 0
+        return max(1.0, reset - self.clock() + 1)
+    
+    def remaining(self, resource: str) -> Optional[int]:
+        """
+        获取某类限额的剩余额度
+        
+        Args:
+            resource: 限额类型 (core 或 graphql)
+            
+        Returns:
+            剩余额度，尚未收到该类响应时返回 None
+        """
+        with self._lock:
+            bucket = self.buckets.get(resource)
+            return bucket.get("remaining") if bucket else None
+    
+    def budget(self) -> Dict[str, Dict]:
+        """
+        获取所有限额的当前状态
+        
+        Returns:
+            字典 {resource: {limit, remaining, reset, used}}
+        """
+        with self._lock:
+            return {resource: dict(bucket) for resource, bucket in self.buckets.items()}
+
+
+# GraphQL 错误中表示服务端暂时不可用的类型 (可重试)；NOT_FOUND、FORBIDDEN 等其他类型重试也不会成功
+TRANSIENT_GRAPHQL_ERROR_TYPES = {"SERVICE_UNAVAILABLE", "TIMEOUT", "INTERNAL", "INTERNAL_ERROR"}
+# 没有 type 的 GraphQL 错误中表示查询超时 / 服务端异常的消息片段
+TRANSIENT_GRAPHQL_MESSAGES = ("something went wrong while executing your query", "timeout", "timed out")
+
+
+def graphql_transient_error(result: Dict) -> bool:
+    """
+    判断 GraphQL 响应是否为可重试的瞬时错误 (没有返回任何数据且所有错误都是瞬时错误)
+
+    with_cost_field 为每个查询追加的 rateLimit 不算返回了数据。
+
+    Args:
+        result: 完整的 GraphQL 响应 (data + errors)
+
+    Returns:
+        是否可以重试
+    """
+    errors = result.get("errors") if isinstance(result, dict) else None
+    if not errors:
+        return False
+    if any(value is not None for key, value in (result.get("data") or {}).items() if key != "rateLimit"):
+        return False
+    for error in errors:
+        if not isinstance(error, dict):
+            return False
+        if error.get("type") in TRANSIENT_GRAPHQL_ERROR_TYPES:
+            continue
+        message = str(error.get("message", "")).lower()
+        if error.get("type") or not any(fragment in message for fragment in TRANSIENT_GRAPHQL_MESSAGES):
+            return False
+    return True
+
+
+def request_not_sent(error: requests.exceptions.RequestException) -> bool:
+    """
+    判断请求是否确定没有发出 (连接建立失败)，此时非幂等请求也可以安全重试
+
+    Args:
+        error: requests 抛出的异常
+
+    Returns:
+        请求是否确定没有到达服务器
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class RetryPolicy:
+    """
+    统一的瞬时错误重试策略 (同步与异步引擎共用，在传输层使用)
+
+    - 可重试的错误：连接失败 / 超时、500 / 502 / 503 / 504、GraphQL 查询的瞬时错误 (见 graphql_transient_error)
+    - 幂等请求 (GET / PUT / DELETE 以及 GraphQL 查询) 出现上述错误都会重试；
+      非幂等请求 (其他 POST、GraphQL mutation) 结果不确定时不重试，只在请求确定没有发出 (连接建立失败) 时重试
+    - 指数退避加全抖动：第 n 次重试前等待 [0, min(max_delay, base_delay * 2^n)] 内的随机时间，有 Retry-After 时按其等待
+    - 整次运行共享重试预算，用完后不再重试，避免服务端故障时成倍放大请求量
+
+    速率限制的等待与重试由 RateLimitScheduler 处理，不计入本策略的预算。
+    """
+
+    # 单个请求的最大重试次数
+    DEFAULT_MAX_RETRIES = 3
+    # 第一次重试前的最大等待时间 (秒)
+    DEFAULT_BASE_DELAY = 1.0
+    # 单次等待的上限 (秒)
+    DEFAULT_MAX_DELAY = 30.0
+    # 每次运行的总重试次数
+    DEFAULT_BUDGET = 100
+    # 可重试的 HTTP 状态码
+    RETRYABLE_STATUSES = (500, 502, 503, 504)
+    # 幂等的 HTTP 方法
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, budget: int = DEFAULT_BUDGET,
+                 random_func: Callable[[], float] = random.random, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            max_retries: 单个请求的最大重试次数
+            base_delay: 第一次重试前的最大等待时间 (秒)
+            max_delay: 单次等待的上限 (秒)
+            budget: 每次运行的总重试次数
+            random_func: 返回 [0, 1) 随机数的函数 (便于测试替换)
+            sleep: 休眠函数 (便于测试替换)
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.random = random_func
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # 已使用的重试次数、因预算用完而放弃的重试次数、累计退避时间 (秒)
+        self.used = 0
+        self.denied = 0
+        self.total_delay = 0.0
+
+    def is_idempotent(self, method: str, query: Optional[str] = None) -> bool:
+        """
+        判断请求是否幂等
+
+        Args:
+            method: HTTP 方法
+            query: GraphQL 文档 (GraphQL 请求时提供，mutation 视为非幂等)
+
+        Returns:
+            是否幂等
+        """
+        if query is not None:
+            return not query.lstrip().startswith("mutation")
+        return method.upper() in self.IDEMPOTENT_METHODS
+
+    def retryable_status(self, status: int) -> bool:
+        """状态码是否为可重试的服务端瞬时错误"""
+        return status in self.RETRYABLE_STATUSES
+
+    def next_delay(self, retries: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        申请一次重试并计算等待时间
+
+        Args:
+            retries: 该请求已经重试的次数
+            retry_after: 响应的 Retry-After 头 (秒)
+
+        Returns:
+            重试前需要等待的秒数；已达到单个请求的重试上限或预算用完时返回 None
+        """
+        if retries >= self.max_retries:
+            return None
+        with self._lock:
+            if self.used >= self.budget:
+                if not self.denied:
+                    print(f"  ⚠️  本次运行的重试预算 ({self.budget} 次) 已用完，之后的瞬时错误不再重试")
+                self.denied += 1
+                return None
+            self.used += 1
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.random() * min(self.max_delay, self.base_delay * (2 ** retries))
+        delay = min(max(delay, 0.0), self.max_delay)
+        with self._lock:
+            self.total_delay += delay
+        return delay
+
+
+class MutationExecutor:
+    """
+    有界并发的变更执行器
+    
+    用线程池并发执行成员添加 / 移除等变更请求：
+    - 同时进行的请求数不超过 max_workers
+    - 速率限制剩余额度不足时自动降低并发 (back-pressure)
+    - 结果按提交顺序返回，由调用线程统一写入报告，报告本身无需加锁
+    """
+    
+    def __init__(self, max_workers: int, rate_limiter: RateLimitScheduler, resource: str = "core"):
+        """
+        Args:
+            max_workers: 最大并发数
+            rate_limiter: 速率限制调度器
+            resource: 这些变更消耗的限额类型
+        """
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter
+        self.resource = resource
+    
+    def allowed_concurrency(self) -> int:
+        """根据当前速率限制状态计算允许的并发数"""
+        if self.rate_limiter.blocked_until > self.rate_limiter.clock():
+            return 1
+        bucket = self.rate_limiter.budget().get(self.resource)
+        if not bucket or not bucket.get("limit") or bucket.get("remaining") is None:
+            return self.max_workers
+        ratio = bucket["remaining"] / bucket["limit"]
+        if ratio < RateLimitScheduler.PACING_THRESHOLD:
+            return 1
+        if ratio < RateLimitScheduler.PACING_THRESHOLD * 4:
+            return max(1, self.max_workers // 2)
+        return self.max_workers
+    
+    def run(self, tasks: List[Tuple[str, Callable[[], Tuple[bool, str]]]]) -> List[Tuple[str, bool, str]]:
+        """
+        并发执行变更任务
+        
+        Args:
+            tasks: 任务列表 [(key, 无参函数)]，函数返回 (成功标志, 消息)
+            
+        Returns:
+            按提交顺序排列的结果 [(key, 成功标志, 消息)]
+        """
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(tasks)
+        if self.max_workers == 1:
+            # 单线程时在调用方线程中依次执行 (cProfile 等只跟踪当前线程的工具可以看到全部调用)
+            for index, (_, fn) in enumerate(tasks):
+                try:
+                    results[index] = fn()
+                except Exception as e:
+                    results[index] = (False, str(e))
+            return [(key, results[i][0], results[i][1]) for i, (key, _) in enumerate(tasks)]
+        in_flight = {}
+        
+        def collect(futures):
+            for future in futures:
+                index = in_flight.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = (False, str(e))
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for index, (_, fn) in enumerate(tasks):
+                while len(in_flight) >= self.allowed_concurrency():
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[pool.submit(fn)] = index
+            done, _ = wait(in_flight)
+            collect(done)
+        
+        return [(key, results[i][0], results[i][1]) for i, (key, _) in enumerate(tasks)]
+
+
+class InvitationIndex:
+    """
+    Enterprise 待处理邀请索引
+    
+    同一份邀请同时按邮箱 (小写) 和被邀请人用户名 (小写) 索引。读取一次后，
+    发送 / 撤销邀请成功时就地增删，不再重新查询整个邀请列表。
+    按邮箱的读取接口 (get / in / [] / items) 与原先的 {email_lower: 邀请信息} 字典兼容。
+    """
+    
+    def __init__(self, invitations: Optional[List[Dict]] = None, loaded: bool = True):
+        """
+        Args:
+            invitations: 邀请信息列表 [{id, email, created_at, invitee, ...}]，同一邮箱以先出现的为准
+            loaded: 邀请列表是否完整读取 (读取中途失败时为 False，此时不能据此判断用户没有待处理邀请)
+        """
+        self.loaded = loaded
+        self.by_id: Dict[str, Dict] = {}
+        self.by_email: Dict[str, str] = {}
+        self.by_login: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        for invitation in invitations or []:
+            self.add(invitation, replace=False)
+    
+    def add(self, invitation: Dict, replace: bool = True):
+        """
+        添加一条邀请
+        
+        Args:
+            invitation: 邀请信息，至少包含 id 以及 email / invitee 之一
+            replace: 邮箱或用户名已有其他邀请时是否覆盖
+        """
+        email = (invitation.get("email") or "").lower()
+        login = normalize_login(invitation.get("invitee") or "")
+        with self._lock:
+            if not replace and ((email and email in self.by_email) or (login and login in self.by_login)):
+                return
+            self.by_id[invitation["id"]] = invitation
+            if email:
+                self.by_email[email] = invitation["id"]
+            if login:
+                self.by_login[login] = invitation["id"]
+    
+    def remove(self, invitation_id: str):
+        """移除一条邀请 (撤销或已接受)"""
+        with self._lock:
+            invitation = self.by_id.pop(invitation_id, None)
+            if not invitation:
+                return
+            for index, key in ((self.by_email, invitation.get("email")), (self.by_login, invitation.get("invitee"))):
+                if key and index.get(key.lower()) == invitation_id:
+                    del index[key.lower()]
+    
+    def find(self, email: Optional[str] = None, login: Optional[str] = None) -> Optional[Dict]:
+        """按邮箱或用户名查找邀请 (邮箱优先)"""
+        invitation_id = self.by_email.get((email or "").lower()) or self.by_login.get(normalize_login(login or ""))
+        return self.by_id.get(invitation_id) if invitation_id else None
+    
+    def get(self, email: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        """按邮箱查找邀请"""
+        return self.find(email=email) or default
+    
+    def __contains__(self, email: str) -> bool:
+        return (email or "").lower() in self.by_email
+    
+    def __getitem__(self, email: str) -> Dict:
+        return self.by_id[self.by_email[email.lower()]]
+    
+    def __len__(self) -> int:
+        return len(self.by_id)
+    
+    def items(self) -> List[Tuple[str, Dict]]:
+        """[(email_lower, 邀请信息)]，仅包含有邮箱的邀请"""
+        return [(email, self.by_id[invitation_id]) for email, invitation_id in list(self.by_email.items())]
+    
+    def values(self) -> List[Dict]:
+        """所有邀请"""
+        return list(self.by_id.values())
+
+
+class MemberIndex:
+    """
+    大小写不敏感的成员索引 {规范化用户名: 原始用户名}
+    
+    成员列表读取后构建一次，此后判断成员关系为 O(1)，计算差异只与差异大小相关，
+    不再为每个 Team 或每个待添加用户重新构建整个 Enterprise 的小写用户名集合。
+    修改操作不加锁，由持有者 (如 EnterpriseSnapshot) 负责同步。
+    """
+    
+    def __init__(self, logins: Iterable[str] = ()):
+        """
+        Args:
+            logins: 初始成员用户名
+        """
+        self.logins: Dict[str, str] = {normalize_login(login): login for login in logins if login}
+    
+    def add(self, login: str):
+        """添加成员"""
+        self.logins[normalize_login(login)] = login
+    
+    def discard(self, login: str):
+        """移除成员 (不存在时忽略)"""
+        self.logins.pop(normalize_login(login), None)
+    
+    def get(self, login: str, default: Optional[str] = None) -> Optional[str]:
+        """按任意大小写查找成员，返回原始用户名"""
+        return self.logins.get(normalize_login(login), default)
+    
+    def keys(self):
+        """规范化用户名视图 (支持与 set / dict.keys() 做集合运算)"""
+        return self.logins.keys()
+    
+    def items(self):
+        """(规范化用户名, 原始用户名) 视图"""
+        return self.logins.items()
+    
+    def __contains__(self, login: str) -> bool:
+        return isinstance(login, str) and normalize_login(login) in self.logins
+    
+    def __getitem__(self, login: str) -> str:
+        return self.logins[normalize_login(login)]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.logins.values()))
+    
+    def __len__(self) -> int:
+        return len(self.logins)
+
+
+class NameIndex:
+    """
+    按名称 (不区分大小写) 查找 Enterprise Team / Organization 的索引，本次运行内共享
+
+    - 首次查找时通过 loader 完整读取一次列表，之后的查找都在索引上完成，创建成功后就地更新
+    - 配置了身份缓存时条目跨运行持久化：preload 的名称全部命中缓存时不读取列表 (此时索引不完整，
+      查找未命中的名称时再完整读取一次)；使用缓存 ID 的操作失败时调用 discard 使条目失效
+    """
+
+    def __init__(self, loader: Optional[Callable[[], Tuple[bool, Dict[str, Dict]]]] = None,
+                 entries: Optional[Dict[str, Dict]] = None, key_field: str = "name",
+                 cache: Optional["IdentityCache"] = None, kind: str = "", scope: str = ""):
+        """
+        Args:
+            loader: 读取完整列表的函数，返回 (成功标志, {名称小写: 条目})；为 None 时 entries 即为完整列表
+            entries: 初始条目 {名称小写: 条目}
+            key_field: 条目中作为名称的字段 (Team 为 name，Organization 为 login)
+            cache: 持久化缓存 (IdentityCache)，为 None 时不持久化
+            kind: 缓存中的记录类型 (如 team / org)
+            scope: 缓存键前缀 (Enterprise slug)，区分同一 API 地址下的不同 Enterprise
+        """
+        self.loader = loader
+        self.entries: Dict[str, Dict] = dict(entries or {})
+        self.key_field = key_field
+        self.cache = cache
+        self.kind = kind
+        self.scope = scope
+        # 是否已包含完整列表 (未命中即表示不存在)
+        self.complete = loader is None
+        self._lock = threading.Lock()
+
+    def _cache_key(self, key: str) -> str:
+        return f"{self.scope}/{key}"
+
+    def load(self) -> bool:
+        """
+        完整读取一次列表 (已完整时直接返回)
+
+        Returns:
+            索引是否完整
+        """
+        with self._lock:
+            if self.complete:
+                return True
+            success, entries = self.loader()
+            if success:
+                self._fill(entries)
+        return success
+
+    def _fill(self, entries: Dict[str, Dict]):
+        """用读取到的完整列表替换索引 (调用方持有锁)，并写入持久化缓存"""
+        self.entries = dict(entries)
+        self.complete = True
+        if self.cache and entries:
+            self.cache.set_many(self.kind, {self._cache_key(key): entry for key, entry in entries.items()})
+
+    def _preload_cached(self, names: Optional[List[str]]) -> bool:
+        """names 全部命中持久化缓存时把缓存条目加入索引，返回是否全部命中"""
+        keys = list(dict.fromkeys(name.lower() for name in names or [] if name))
+        if self.complete or not self.cache or not keys:
+            return False
+        cached = self.cache.get_many(self.kind, [self._cache_key(key) for key in keys])
+        if len(cached) != len(keys):
+            return False
+        with self._lock:
+            for key in keys:
+                self.entries.setdefault(key, cached[self._cache_key(key)])
+        return True
+
+    def _lookup(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            return self.entries.get(name.lower())
+
+    def preload(self, names: Optional[List[str]] = None) -> bool:
+        """
+        为即将查找的名称准备索引：全部命中持久化缓存时使用缓存条目，否则完整读取列表
+
+        Args:
+            names: 即将查找的名称
+
+        Returns:
+            索引是否可用 (完整或已包含全部 names)
+        """
+        return self._preload_cached(names) or self.load()
+
+    def get(self, name: str) -> Optional[Dict]:
+        """
+        按名称查找，索引不完整且未命中时完整读取一次列表
+
+        Args:
+            name: Team 名称或 Organization login
+
+        Returns:
+            条目，不存在 (或列表读取失败) 时返回 None
+        """
+        entry = self._lookup(name)
+        if entry or not self.load():
+            return entry
+        return self._lookup(name)
+
+    def add(self, entry: Dict):
+        """创建成功后加入索引 (并写入持久化缓存)"""
+        key = entry[self.key_field].lower()
+        with self._lock:
+            self.entries[key] = entry
+        if self.cache:
+            self.cache.set(self.kind, self._cache_key(key), entry)
+
+    def discard(self, name: str) -> bool:
+        """
+        使条目失效 (如缓存的 ID 已不存在)，之后的查找会重新读取完整列表
+
+        Args:
+            name: Team 名称或 Organization login
+
+        Returns:
+            是否可以重新读取 (有 loader)
+        """
+        key = name.lower()
+        with self._lock:
+            self.entries.pop(key, None)
+            if self.loader is not None:
+                self.complete = False
+        if self.cache:
+            self.cache.invalidate(self.kind, self._cache_key(key))
+        return self.loader is not None
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name.lower() in self.entries
+
+    def __getitem__(self, name: str) -> Dict:
+        with self._lock:
+            return self.entries[name.lower()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.entries)
+
+
+class EnterpriseSnapshot:
+    """
+    一次同步运行内共享的 Enterprise 状态快照
+    
+    在 sync_from_config 开始时读取一次，各阶段 (Organization 同步、Team 同步、
+    Enterprise 清理) 都从这里读取，成功的变更操作会就地更新快照，
+    避免每个 Team 都重新遍历整个 Enterprise 成员列表。
+    """
+    
+    def __init__(self, members: MemberIndex, pending_invitations: InvitationIndex,
+                 teams: NameIndex, orgs: NameIndex,
+                 members_loaded: bool = True, teams_loaded: bool = True, orgs_loaded: bool = True,
+                 invitations_loaded: Optional[bool] = None):
+        """
+        Args:
+            members: Enterprise 成员索引
+            pending_invitations: Enterprise 待处理邀请索引
+            teams: Enterprise Teams 索引 {name_lower: {id, slug, name}} (也可传入字典)
+            orgs: Enterprise Organizations 索引 {login_lower: {id, login, name}} (也可传入字典)
+            members_loaded: 成员列表是否读取成功
+            teams_loaded: Team 列表是否读取成功
+            orgs_loaded: Organization 列表是否读取成功
+            invitations_loaded: 待处理邀请列表是否完整读取，默认取 pending_invitations.loaded
+        """
+        self.members = members if isinstance(members, MemberIndex) else MemberIndex(members)
+        self.pending_invitations = pending_invitations
+        self.teams = teams if isinstance(teams, NameIndex) else NameIndex(entries=teams, key_field="name")
+        self.orgs = orgs if isinstance(orgs, NameIndex) else NameIndex(entries=orgs, key_field="login")
+        self.members_loaded = members_loaded
+        self.teams_loaded = teams_loaded
+        self.orgs_loaded = orgs_loaded
+        self.invitations_loaded = pending_invitations.loaded if invitations_loaded is None else invitations_loaded
+        # 多个资源并发同步时，更新操作需要加锁
+        self._lock = threading.Lock()
+    
+    def remove_member(self, username: str):
+        """成员被移出 Enterprise 后更新快照"""
+        with self._lock:
+            self.members.discard(username)
+    
+    def add_invitation(self, email: str, invitation: Dict):
+        """发送 Enterprise 邀请后更新快照"""
+        self.pending_invitations.add(dict(invitation, email=invitation.get("email") or email))
+    
+    def remove_invitation(self, invitation_id: str):
+        """撤销 Enterprise 邀请后更新快照"""
+        self.pending_invitations.remove(invitation_id)
+    
+    def add_team(self, team: Dict):
+        """创建 Enterprise Team 后更新快照"""
+        self.teams.add(team)
+    
+    def add_org(self, org: Dict):
+        """创建 Organization 后更新快照"""
+        self.orgs.add(org)
+
+
+class IdentityCache:
+    """
+    持久化的身份缓存 (SQLite)
+    
+    缓存几乎不会变化的标识：Enterprise slug → Node ID，用户名 → Node ID / 数据库 ID / 公开邮箱，
+    Team 名称 → ID / slug，Organization login → Node ID，重复运行和并行运行 (共用同一个数据库文件) 都可以跳过这些查询。
+    每条记录带有过期时间；记录数超过 max_entries 时按最近访问时间淘汰；
+    使用缓存标识的变更失败时调用 invalidate 使对应记录失效。
+    """
+    
+    # 默认记录有效期 (秒)
+    DEFAULT_TTL = 7 * 24 * 3600
+    # 默认最大记录数
+    DEFAULT_MAX_ENTRIES = 100000
+    # 单条 SQL 中 IN 列表的最大长度 (SQLite 默认变量上限为 999)
+    QUERY_CHUNK_SIZE = 500
+    
+    def __init__(self, path: str = ":memory:", namespace: str = "", ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            path: 数据库文件路径，默认为内存数据库 (仅本进程内有效)
+            namespace: 命名空间，用于区分不同的 API 地址
+            ttl: 记录有效期 (秒)
+            max_entries: 最大记录数
+            clock: 时间函数
+        """
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL 模式允许多个同步进程同时读写同一个缓存文件
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS identities (
+                namespace TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, kind, key)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS identities_accessed_at ON identities (accessed_at)")
+    
+    def get(self, kind: str, key: str) -> Optional[Dict]:
+        """读取一条未过期的记录，不存在时返回 None"""
+        return self.get_many(kind, [key]).get(key.lower())
+    
+    def get_many(self, kind: str, keys: List[str]) -> Dict[str, Dict]:
+        """
+        批量读取未过期的记录
+        
+        Args:
+            kind: 记录类型 (如 enterprise, user)
+            keys: 键列表 (不区分大小写)
+            
+        Returns:
+            字典 {key_lower: value}，不存在或已过期的键不包含在结果中
+        """
+        keys = list(dict.fromkeys(k.lower() for k in keys if k))
+        now = self.clock()
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.QUERY_CHUNK_SIZE):
+                chunk = keys[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM identities WHERE namespace = ? AND kind = ? AND expires_at > ? "
+                    f"AND key IN ({placeholders})",
+                    [self.namespace, kind, now] + chunk
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                self.conn.executemany(
+                    "UPDATE identities SET accessed_at = ? WHERE namespace = ? AND kind = ? AND key = ?",
+                    [(now, self.namespace, kind, key) for key in found]
+                )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+    
+    def set(self, kind: str, key: str, value: Dict, ttl: Optional[float] = None):
+        """写入一条记录"""
+        self.set_many(kind, {key: value}, ttl)
+    
+    def set_many(self, kind: str, values: Dict[str, Dict], ttl: Optional[float] = None):
+        """
+        批量写入记录，写入后超出 max_entries 的部分按最近访问时间淘汰
+        
+        Args:
+            kind: 记录类型
+            values: {key: value}，value 需可 JSON 序列化
+            ttl: 有效期 (秒)，默认使用 self.ttl
+        """
+        if not values:
+            return
+        now = self.clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO identities (namespace, kind, key, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(self.namespace, kind, key.lower(), json.dumps(value), expires_at, now) for key, value in values.items()]
+                )
+                self._evict(now)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+    
+    def invalidate(self, kind: Optional[str] = None, key: Optional[str] = None):
+        """
+        使记录失效
+        
+        Args:
+            kind: 记录类型，为 None 时清空当前命名空间的所有记录
+            key: 键，为 None 时清空该类型的所有记录
+        """
+        sql = "DELETE FROM identities WHERE namespace = ?"
+        params = [self.namespace]
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+            if key is not None:
+                sql += " AND key = ?"
+                params.append(key.lower())
+        with self._lock:
+            self.conn.execute(sql, params)
+    
+    def _evict(self, now: float):
+        """删除过期记录，并在超出 max_entries 时淘汰最久未访问的记录 (需在持有锁时调用)"""
+        self.conn.execute("DELETE FROM identities WHERE expires_at <= ?", (now,))
+        count = self.conn.execute("SELECT COUNT(*) FROM identities").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM identities WHERE rowid IN "
+                "(SELECT rowid FROM identities ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self.conn.close()
+
+
+class ResponseCache:
+    """
+    REST GET 响应的条件请求缓存 (SQLite)
+    
+    以 Token 摘要 + URL 为键保存 ETag、响应体和 Link 头。再次请求同一 URL 时带上 If-None-Match，
+    服务器返回 304 Not Modified 时直接复用缓存的响应体 (GitHub 不把 304 计入主速率限制)。
+    """
+    
+    # 默认最大记录数
+    DEFAULT_MAX_ENTRIES = 20000
+    
+    def __init__(self, path: str = ":memory:", token: str = "", max_entries: int = DEFAULT_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            path: 数据库文件路径，默认为内存数据库 (仅本进程内有效)
+            token: 请求使用的 Token，仅保存其摘要，用于隔离不同 Token 可见的响应
+            max_entries: 最大记录数，超出时淘汰最久未使用的记录
+            clock: 时间函数
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.clock = clock
+        self.scope = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                body BLOB NOT NULL,
+                link TEXT,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+    
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(f"{self.scope}\n{url}".encode("utf-8")).hexdigest()
+    
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        读取 URL 的缓存响应
+        
+        Returns:
+            {etag, body, link}，没有缓存时返回 None
+        """
+        key = self._key(url)
+        with self._lock:
+            row = self.conn.execute("SELECT etag, body, link FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (self.clock(), key))
+        if not row:
+            return None
+        return {"etag": row[0], "body": bytes(row[1]), "link": row[2]}
+    
+    def set(self, url: str, etag: str, body: bytes, link: Optional[str] = None):
+        """保存 URL 的响应，超出 max_entries 时淘汰最久未使用的记录"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, etag, body, link, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (self._key(url), etag, body, link, self.clock())
+                )
+                count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                if count > self.max_entries:
+                    self.conn.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+    
+    def invalidate(self, url: Optional[str] = None):
+        """删除 URL 的缓存响应，url 为 None 时清空所有记录"""
+        with self._lock:
+            if url is None:
+                self.conn.execute("DELETE FROM responses")
+            else:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (self._key(url),))
+    
+    def record_revalidated(self):
+        """记录一次 304 命中"""
+        with self._lock:
+            self.revalidated += 1
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self.conn.close()
 
 
 class GitHubEnterpriseTeamSync:
     """GitHub Enterprise Team 成员同步器"""
     
-    def __init__(self, token: str, enterprise: str):
+    # 默认 API 地址
+    DEFAULT_BASE_URL = "https://api.github.com"
+    # 默认请求超时 (秒)，可在调用时通过 timeout 参数覆盖
+    DEFAULT_TIMEOUT = 30
+    # 默认连接池大小
+    DEFAULT_POOL_SIZE = 10
+    # REST 列表接口每页条目数
+    PAGE_SIZE = 100
+    # 批量查询用户信息时每个 GraphQL 请求包含的用户数
+    USER_LOOKUP_BATCH_SIZE = 50
+    # 批量执行 mutation 时每个 GraphQL 请求包含的 mutation 数
+    MUTATION_BATCH_SIZE = 25
+    # Team 批量成员接口每个请求包含的用户数
+    TEAM_MEMBERSHIP_BATCH_SIZE = 100
+    # 批量接口返回这些状态码时视为不可用 (如旧版本 GitHub Enterprise Server)，本次运行内改为逐个处理
+    BULK_UNAVAILABLE_STATUSES = (404, 405, 410)
+    # 因速率限制被拒绝后的最大重试次数
+    MAX_RATE_LIMIT_RETRIES = 5
+    # 成员变更请求的默认并发数
+    DEFAULT_MAX_WORKERS = 8
+    # 同时规划 / 创建的 Organization 和 Team 数
+    DEFAULT_RESOURCE_WORKERS = 4
+    # 增量同步模式下的默认全量同步间隔 (秒)
+    DEFAULT_FULL_SYNC_INTERVAL = 24 * 3600
+    
+    def __init__(self, token: str, enterprise: str, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 resolve_missing_emails: bool = False, max_workers: int = DEFAULT_MAX_WORKERS,
+                 base_url: str = DEFAULT_BASE_URL, graphql_url: Optional[str] = None,
+                 identity_cache: Optional[IdentityCache] = None, response_cache: Optional[ResponseCache] = None,
+                 resource_workers: int = DEFAULT_RESOURCE_WORKERS, retry_policy: Optional[RetryPolicy] = None,
+                 invitation_ledger: Optional[InvitationLedger] = None):
         """
         初始化同步器
         
         Args:
             token: GitHub Personal Access Token (需要 admin:enterprise 权限)
             enterprise: Enterprise slug 名称
+            pool_size: HTTP 连接池大小 (每个 host 保持的 keep-alive 连接数)
+            timeout: 默认请求超时时间 (秒)
+            resolve_missing_emails: 对不在 Enterprise 且配置中没有 email 的用户，是否查询其公开邮箱以发送邀请
+            max_workers: 成员变更请求 (添加 / 移除 Team 成员) 的最大并发数，应不大于 pool_size
+            base_url: REST API 地址 (可指向本地模拟服务器)
+            graphql_url: GraphQL API 地址，默认为 {base_url}/graphql
+            identity_cache: 持久化身份缓存，为 None 时每次运行都重新查询 Enterprise ID 和用户标识
+            response_cache: REST GET 响应的条件请求缓存，为 None 时不发送 If-None-Match
+            resource_workers: 同时规划 / 创建的 Organization 和 Team 数 (为 1 时逐个处理)
+            retry_policy: 瞬时错误重试策略，默认为 RetryPolicy()
+            invitation_ledger: 本地邀请记录，默认只在本次运行内记录 (按邀请创建时间判断是否重新发送)
         """
         self.token = token
         self.enterprise = enterprise
-        self.base_url = "https://api.github.com"
-        self.graphql_url = "https://api.github.com/graphql"
+        self.base_url = base_url.rstrip("/")
+        self.graphql_url = graphql_url or f"{self.base_url}/graphql"
         self.headers = {
             "Accept": "application/vnd.github+json",
             "Authorization": f"token {token}",
             "X-GitHub-Api-Version": "2022-11-28"
         }
+        self.timeout = timeout
+        self.resolve_missing_emails = resolve_missing_emails
+        
+        # 所有 REST 和 GraphQL 请求共用同一个 Session，复用 keep-alive 连接避免重复 TLS 握手
+        self.session = self._create_session(pool_size)
+        self.pool_size = pool_size
+        # 所有请求共用同一个速率限制调度器
+        self.rate_limiter = RateLimitScheduler()
+        # 所有请求共用同一个重试策略 (重试预算按整次运行计算)
+        self.retry_policy = retry_policy or RetryPolicy()
+        # 按接口汇总的请求指标
+        self.metrics = RequestMetrics(enterprise)
+        # Team 成员变更的并发执行器
+        self.executor = MutationExecutor(max_workers, self.rate_limiter)
+        # Organization / Team 级别的并发数
+        self.resource_workers = max(1, resource_workers)
+        # 跨运行共享的身份缓存和 REST 响应缓存
+        self.identity_cache = identity_cache
+        self.response_cache = response_cache
+        # 跨运行的邀请记录 (决定待处理邀请保留还是重新发送)
+        self.invitation_ledger = invitation_ledger or InvitationLedger()
+        
+        # 本次运行已解析的用户身份 {login_lower: {login, node_id, database_id, email}}
+        self.identities: Dict[str, Dict] = {}
         
         # 获取 Enterprise Node ID (用于 GraphQL)
         self.enterprise_id = None
         self._fetch_enterprise_id()
         
+        # 本次运行的 Enterprise 状态快照 (由 sync_from_config 构建)
+        self.snapshot: Optional[EnterpriseSnapshot] = None
+        # 没有快照时按需读取的待处理邀请索引
+        self.invitations: Optional[InvitationIndex] = None
+        # Team 批量成员接口是否可用 (首次返回 BULK_UNAVAILABLE_STATUSES 后置为 False)
+        self.bulk_team_memberships = True
+        # 本次运行的 Team / Organization 名称索引 (首次查找时读取一次列表；配置了身份缓存时跨运行持久化)
+        self.teams = NameIndex(self.get_enterprise_teams, key_field="name",
+                               cache=identity_cache, kind="team", scope=enterprise)
+        self.orgs = NameIndex(self.get_enterprise_organizations, key_field="login",
+                              cache=identity_cache, kind="org", scope=enterprise)
+        # 同步阶段的监听者 (需实现 phase_started(name) / phase_finished(name))，用于基准测试和性能分析
+        self.phase_listeners: List = []
+        
         # 报告数据
         self.report = {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -44,6 +2502,157 @@ class GitHubEnterpriseTeamSync:
             "teams": []
         }
     
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """
+        创建带连接池的 HTTP Session
+        
+        Args:
+            pool_size: 连接池大小
+            
+        Returns:
+            配置好的 requests.Session
+        """
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.headers["Connection"] = "keep-alive"
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def _send(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        """
+        通过共享 Session 发送请求 (所有 API 调用的唯一出口)
+        
+        发送前由速率限制调度器控制节奏，因速率限制被拒绝时等待后自动重试；
+        连接失败、5xx 和 GraphQL 瞬时错误按 self.retry_policy 退避重试 (非幂等请求只在确定没有发出时重试)。
+        配置了响应缓存时，GET 请求带上缓存的 ETag，服务器返回 304 时使用缓存的响应体。
+        每次调用 (含重试) 的耗时、等待时间、状态码和字节数记录到 self.metrics。
+        
+        Args:
+            method: HTTP 方法
+            url: 请求 URL
+            idempotent: 请求是否幂等，默认按 HTTP 方法 / GraphQL 操作类型判断
+            **kwargs: 其他请求参数 (未指定 timeout 时使用默认超时)
+            
+        Returns:
+            响应对象
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        resource = "graphql" if url == self.graphql_url else "core"
+        if idempotent is None:
+            query = (kwargs.get("json") or {}).get("query") if resource == "graphql" else None
+            idempotent = self.retry_policy.is_idempotent(method, query)
+        
+        cached = None
+        if method == "GET" and self.response_cache and "params" not in kwargs:
+            cached = self.response_cache.get(url)
+            if cached:
+                kwargs["headers"] = dict(kwargs.get("headers") or {}, **{"If-None-Match": cached["etag"]})
+        
+        if resource == "graphql":
+            endpoint, operation = "/graphql", graphql_operation((kwargs.get("json") or {}).get("query"))
+        else:
+            endpoint, operation = endpoint_template(urlparse(url).path[len(urlparse(self.base_url).path):]), ""
+        elapsed = waited = 0.0
+        attempt = retries = 0  # 速率限制重试次数、瞬时错误重试次数
+        while True:
+            started = time.perf_counter()
+            self.rate_limiter.acquire(resource)
+            sent = time.perf_counter()
+            waited += sent - started
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                elapsed += time.perf_counter() - sent
+                delay = None
+                if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                  requests.exceptions.ChunkedEncodingError)) and (idempotent or request_not_sent(e)):
+                    delay = self.retry_policy.next_delay(retries)
+                if delay is None:
+                    self.metrics.record(method, endpoint, operation, 0, elapsed, waited, retries=attempt + retries)
+                    raise
+                print(f"  🔁 {method} {endpoint} 连接失败 ({type(e).__name__})，{delay:.1f} 秒后重试...")
+                self.retry_policy.sleep(delay)
+                retries += 1
+                continue
+            elapsed += time.perf_counter() - sent
+            self.rate_limiter.update(resource, response)
+            
+            wait = self.rate_limiter.rate_limit_wait(response)
+            if wait is not None:
+                if attempt == self.MAX_RATE_LIMIT_RETRIES:
+                    break
+                print(f"  ⏳ 触发 API 速率限制 ({resource})，等待 {wait:.0f} 秒后重试...")
+                self.rate_limiter.wait(wait)
+                waited += wait
+                attempt += 1
+                continue
+            
+            if idempotent and self._transient_response(response, resource):
+                delay = self.retry_policy.next_delay(retries, response.headers.get("Retry-After"))
+                if delay is not None:
+                    print(f"  🔁 {method} {endpoint} 返回瞬时错误 ({response.status_code})，{delay:.1f} 秒后重试...")
+                    self.retry_policy.sleep(delay)
+                    retries += 1
+                    continue
+            break
+        
+        body = response.request.body if response.request is not None else None
+        self.metrics.record(method, endpoint, operation, response.status_code, elapsed, waited,
+                            bytes_sent=len(body) if body else 0, bytes_received=len(response.content),
+                            retries=attempt + retries)
+        
+        if method == "GET" and self.response_cache and "params" not in kwargs:
+            if cached and response.status_code == 304:
+                self.response_cache.record_revalidated()
+                response.status_code = 200
+                response._content = cached["body"]
+                if cached["link"]:
+                    response.headers["Link"] = cached["link"]
+            elif response.status_code == 200 and response.headers.get("ETag"):
+                self.response_cache.set(url, response.headers["ETag"], response.content, response.headers.get("Link"))
+        
+        return response
+    
+    def _transient_response(self, response: requests.Response, resource: str) -> bool:
+        """响应是否为可重试的瞬时错误 (5xx，或 GraphQL 查询返回的瞬时错误)"""
+        if self.retry_policy.retryable_status(response.status_code):
+            return True
+        if resource != "graphql" or response.status_code != 200 or b'"errors"' not in response.content:
+            return False
+        try:
+            return graphql_transient_error(response.json())
+        except ValueError:
+            return False
+    
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        标记一个同步阶段，通知 phase_listeners 阶段的开始和结束
+        
+        阶段依次为: snapshot → plan_orgs → plan_teams → plan_cleanup → apply → enterprise_cleanup → report；
+        规划阶段中每个 Organization / Team 另有子阶段 "plan_orgs/{login}"、"plan_teams/{name}" (可能并发)
+        
+        Args:
+            name: 阶段名称
+        """
+        for listener in self.phase_listeners:
+            listener.phase_started(name)
+        try:
+            yield
+        finally:
+            for listener in reversed(self.phase_listeners):
+                listener.phase_finished(name)
+    
+    def close(self):
+        """关闭 Session，释放连接池中的连接，并关闭缓存"""
+        self.session.close()
+        if self.identity_cache:
+            self.identity_cache.close()
+        if self.response_cache:
+            self.response_cache.close()
+    
     def _make_request(self, method: str, url: str, **kwargs) -> Tuple[bool, Dict]:
         """
         发起 HTTP 请求的通用方法
@@ -57,7 +2666,7 @@ class GitHubEnterpriseTeamSync:
             (成功标志, 响应的 JSON 数据)
         """
         try:
-            response = requests.request(method, url, headers=self.headers, **kwargs)
+            response = self._send(method, url, **kwargs)
             response.raise_for_status()
             return True, response.json() if response.text else {}
         except requests.exceptions.RequestException as e:
@@ -66,13 +2675,105 @@ class GitHubEnterpriseTeamSync:
                 error_msg = f"{error_msg} - {e.response.text}"
             return False, {"error": error_msg}
     
-    def _graphql_request(self, query: str, variables: Optional[Dict] = None) -> Dict:
+    def _fetch_page(self, url: str) -> Tuple[bool, object, Dict[str, str]]:
+        """
+        读取 REST 列表接口的一页
+        
+        Args:
+            url: 带分页参数的 URL
+            
+        Returns:
+            (成功标志, 本页条目或错误信息, 解析后的 Link 头)
+        """
+        try:
+            response = self._send("GET", url)
+            response.raise_for_status()
+            return True, response.json() if response.text else [], parse_link_header(response.headers.get("Link"))
+        except requests.exceptions.RequestException as e:
+            error_msg = str(e)
+            if hasattr(e.response, 'text'):
+                error_msg = f"{error_msg} - {e.response.text}"
+            return False, {"error": error_msg}, {}
+    
+    def iter_pages(self, url: str) -> Iterator[Tuple[bool, object]]:
+        """
+        按顺序逐页读取 REST 列表接口 (流式)
+        
+        第一页响应的 Link 头带有 rel="last" 时，其余各页并发请求 (并发数同成员变更执行器，接近速率限制时自动降低，
+        且不超过连接池按资源并发数平分的份额 pool_size // resource_workers，避免多个资源同时分页时超出连接池；
+        允许的并发数为 1 时逐页读取)，仍按页码顺序产出；只有 rel="next" 时逐页跟随；
+        没有 Link 头时退回到 "本页不足 PAGE_SIZE 条即为最后一页" 的判断。
+        某页失败时产出 (False, 错误信息) 后停止，未开始的请求被取消。
+        
+        Args:
+            url: 不带查询参数的列表接口 URL
+            
+        Yields:
+            (成功标志, 本页条目列表或错误信息)
+        """
+        def page_url(page: int) -> str:
+            return f"{url}?per_page={self.PAGE_SIZE}&page={page}"
+        
+        success, data, links = self._fetch_page(page_url(1))
+        yield success, data
+        if not success or not data:
+            return
+        
+        last_page = last_page_number(links)
+        if last_page is not None and last_page < 2:
+            return
+        workers = 1
+        if last_page is not None and self.executor.max_workers > 1:
+            workers = min(self.executor.allowed_concurrency(), self.pool_size // self.resource_workers, last_page - 1)
+        if workers > 1:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            futures = [pool.submit(self._fetch_page, page_url(page)) for page in range(2, last_page + 1)]
+            try:
+                for future in futures:
+                    success, data, _ = future.result()
+                    yield success, data
+                    if not success:
+                        return
+            finally:
+                for future in futures:
+                    future.cancel()
+                pool.shutdown(wait=True)
+            return
+        
+        page = 1
+        while ("next" in links) if links else len(data) >= self.PAGE_SIZE:
+            page += 1
+            success, data, links = self._fetch_page(page_url(page))
+            yield success, data
+            if not success or not data:
+                return
+    
+    def list_all(self, url: str) -> Tuple[bool, List[Dict]]:
+        """
+        读取 REST 列表接口的所有条目
+        
+        Args:
+            url: 不带查询参数的列表接口 URL
+            
+        Returns:
+            (成功标志, 所有条目；失败时为错误信息)
+        """
+        items = []
+        for success, data in self.iter_pages(url):
+            if not success:
+                return False, data
+            items.extend(data)
+        return True, items
+    
+    def _graphql_request(self, query: str, variables: Optional[Dict] = None, allow_partial: bool = False) -> Dict:
         """
         发起 GraphQL 请求
         
         Args:
             query: GraphQL 查询或突变语句
             variables: GraphQL 变量
+            allow_partial: 为 True 时，若响应同时包含 data 和 errors (如批量查询中部分用户不存在)，
+                           返回部分数据而不抛出异常
             
         Returns:
             响应的数据
@@ -81,20 +2782,11 @@ class GitHubEnterpriseTeamSync:
             Exception: GraphQL 请求失败或返回错误
         """
         try:
-            payload = {"query": query}
-            if variables:
-                payload["variables"] = variables
-            
-            response = requests.post(
-                self.graphql_url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            result = response.json()
+            result = self._graphql_raw(query, variables)
             
             if "errors" in result:
-                import json
+                if allow_partial and result.get("data"):
+                    return result["data"]
                 print(f"  [DEBUG] GraphQL 完整错误响应: {json.dumps(result, ensure_ascii=False, indent=2)}")
                 raise Exception(f"GraphQL 错误: {result['errors']}")
             
@@ -105,20 +2797,97 @@ class GitHubEnterpriseTeamSync:
                 print(f"响应内容: {e.response.text}")
             raise
     
+    def _graphql_raw(self, query: str, variables: Optional[Dict] = None) -> Dict:
+        """
+        发起 GraphQL 请求并返回完整响应 (包含 data 和 errors)，不因 GraphQL 错误抛出异常
+        
+        Args:
+            query: GraphQL 查询或突变语句
+            variables: GraphQL 变量
+            
+        Returns:
+            完整的响应 JSON
+            
+        Raises:
+            requests.exceptions.RequestException: HTTP 请求失败
+        """
+        payload = {"query": with_cost_field(query)}
+        if variables:
+            payload["variables"] = variables
+        
+        response = self._send("POST", self.graphql_url, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        rate_limit = (result.get("data") or {}).pop("rateLimit", None)
+        if rate_limit and rate_limit.get("cost") is not None:
+            self.metrics.record_cost(graphql_operation(query), rate_limit["cost"])
+        return result
+    
+    def run_mutation_batch(self, field: str, items: List[Tuple[str, Dict[str, Tuple[str, object]]]],
+                           shared: Optional[Dict[str, Tuple[str, object]]] = None,
+                           selection: str = "clientMutationId") -> Dict[str, Tuple[bool, str]]:
+        """
+        将多个同类 mutation 打包成带别名的 GraphQL 文档批量执行
+        
+        每个请求最多包含 MUTATION_BATCH_SIZE 个 mutation；按别名把错误映射回对应的条目，
+        响应中出现无法归属到具体别名的 GraphQL 错误时，把未完成的条目拆成更小的批次重试。
+        请求本身失败 (连接失败、超时、5xx) 时服务器可能已经执行了 mutation，不再重发，各条目报告为结果未知。
+        
+        Args:
+            field: mutation 字段名 (如 removeEnterpriseMember)
+            items: [(key, {参数名: (GraphQL 类型, 值)})]，key 用于在结果中标识条目
+            shared: 所有条目共用的参数 {参数名: (GraphQL 类型, 值)}
+            selection: 每个 mutation 返回的字段
+            
+        Returns:
+            字典 {key: (成功标志, 错误信息)}
+        """
+        outcomes = {}
+        for start in range(0, len(items), self.MUTATION_BATCH_SIZE):
+            chunk = items[start:start + self.MUTATION_BATCH_SIZE]
+            outcomes.update(self._run_mutation_chunk(field, chunk, shared or {}, selection))
+        return outcomes
+    
+    def _run_mutation_chunk(self, field: str, chunk: List[Tuple[str, Dict[str, Tuple[str, object]]]],
+                            shared: Dict[str, Tuple[str, object]], selection: str) -> Dict[str, Tuple[bool, str]]:
+        """执行一个批次的 mutation (见 run_mutation_batch)"""
+        query, variables = build_mutation_batch(field, chunk, shared, selection)
+        try:
+            result = self._graphql_raw(query, variables)
+        except Exception as e:
+            return mutation_request_failed(chunk, e)
+        
+        outcomes, unresolved, general_errors = parse_mutation_batch(result, chunk)
+        
+        if unresolved and general_errors and len(chunk) > 1:
+            # 批次整体失败时对半拆分；部分成功时只重试未完成的条目
+            if len(unresolved) == len(chunk):
+                mid = len(chunk) // 2
+                outcomes.update(self._run_mutation_chunk(field, chunk[:mid], shared, selection))
+                outcomes.update(self._run_mutation_chunk(field, chunk[mid:], shared, selection))
+            else:
+                outcomes.update(self._run_mutation_chunk(field, unresolved, shared, selection))
+        else:
+            for key, _ in unresolved:
+                outcomes[key] = (False, "; ".join(general_errors) or "响应为空")
+        
+        return outcomes
+    
     def _fetch_enterprise_id(self):
         """获取 Enterprise 的 Node ID (用于 GraphQL 操作)"""
-        query = """
-        query($slug: String!) {
-            enterprise(slug: $slug) {
-                id
-                name
-            }
-        }
-        """
+        cached = self.identity_cache.get("enterprise", self.enterprise) if self.identity_cache else None
+        if cached:
+            self.enterprise_id = cached["id"]
+            print(f"✓ 获取 Enterprise ID: {self.enterprise_id} (缓存)")
+            return
+        
+        query = ENTERPRISE_ID_QUERY
         try:
             data = self._graphql_request(query, {"slug": self.enterprise})
             if data and "enterprise" in data:
                 self.enterprise_id = data["enterprise"]["id"]
+                if self.identity_cache:
+                    self.identity_cache.set("enterprise", self.enterprise, {"id": self.enterprise_id})
                 print(f"✓ 获取 Enterprise ID: {self.enterprise_id}")
             else:
                 print(f"⚠ 警告: 无法获取 Enterprise ID")
@@ -126,108 +2895,116 @@ class GitHubEnterpriseTeamSync:
             print(f"⚠ 警告: 获取 Enterprise ID 失败: {e}")
             print("  GraphQL 邀请功能将不可用")
     
-    def get_user_email(self, username: str) -> Optional[str]:
+    def resolve_users(self, logins: List[str]) -> Dict[str, Dict]:
+        """
+        批量解析用户的 Node ID、数据库 ID 和公开邮箱
+        
+        使用 GraphQL 别名查询，每个请求解析 USER_LOOKUP_BATCH_SIZE 个用户；
+        已解析过的用户直接从本次运行的身份表或持久化身份缓存中返回。
+        
+        Args:
+            logins: GitHub 用户名列表
+            
+        Returns:
+            字典 {login_lower: {login, node_id, database_id, email}}，不存在的用户不包含在结果中
+        """
+        resolved = {}
+        missing = []
+        for login in dict.fromkeys(l for l in logins if l):
+            identity = self.identities.get(normalize_login(login))
+            if identity:
+                resolved[normalize_login(login)] = identity
+            else:
+                missing.append(login)
+        
+        if missing and self.identity_cache:
+            cached = self.identity_cache.get_many("user", missing)
+            self.identities.update(cached)
+            resolved.update(cached)
+            missing = [login for login in missing if normalize_login(login) not in cached]
+        
+        for start in range(0, len(missing), self.USER_LOOKUP_BATCH_SIZE):
+            chunk = missing[start:start + self.USER_LOOKUP_BATCH_SIZE]
+            variables = {f"l{i}": login for i, login in enumerate(chunk)}
+            
+            try:
+                data = self._graphql_request(build_user_lookup_query(len(chunk)), variables, allow_partial=True)
+            except Exception as e:
+                print(f"  ⚠️ 批量解析用户失败: {e}")
+                continue
+            
+            fetched = {}
+            for i, login in enumerate(chunk):
+                user = (data or {}).get(f"u{i}")
+                if user:
+                    fetched[normalize_login(login)] = {
+                        "login": user.get("login") or login,
+                        "node_id": user.get("id"),
+                        "database_id": user.get("databaseId"),
+                        "email": user.get("email")
+                    }
+            self.identities.update(fetched)
+            resolved.update(fetched)
+            if self.identity_cache:
+                self.identity_cache.set_many("user", fetched)
+        
+        return resolved
+    
+    def invalidate_identity(self, login: str):
+        """使用户的身份记录失效 (使用该身份的变更失败时调用，下次重新查询)"""
+        self.identities.pop(normalize_login(login), None)
+        if self.identity_cache:
+            self.identity_cache.invalidate("user", login)
+    
+    def get_user_emails(self, usernames: List[str]) -> Dict[str, str]:
         """
-        通过用户名获取用户的主邮箱地址
+        批量获取用户的公开邮箱
         
         Args:
-            username: GitHub 用户名
+            usernames: GitHub 用户名列表
             
         Returns:
-            用户邮箱，如果无法获取则返回 None
-        """
-        query = """
-        query($login: String!) {
-            user(login: $login) {
-                email
-                login
-            }
-        }
+            字典 {username_lower: email}，无法获取邮箱的用户不包含在结果中
         """
-        try:
-            data = self._graphql_request(query, {"login": username})
-            if data and "user" in data and data["user"]:
-                return data["user"].get("email")
-            return None
-        except Exception as e:
-            print(f"  ⚠️ 无法获取用户 {username} 的邮箱: {e}")
-            return None
+        return {login: identity["email"] for login, identity in self.resolve_users(usernames).items()
+                if identity.get("email")}
     
-    def get_team_members(self, team_id: int) -> Tuple[bool, Dict[str, str]]:
+    def get_team_members(self, team_id: int) -> Tuple[bool, Set[str]]:
         """
-        获取 Team 的所有成员及其邮箱
+        获取 Team 的所有成员 (仅用户名，不查询邮箱)
         
         Args:
             team_id: Team 的 ID
             
         Returns:
-            (成功标志, 成员字典 {username: email} 或错误信息)
+            (成功标志, 成员用户名集合)
         """
         url = f"{self.base_url}/enterprises/{self.enterprise}/teams/{team_id}/memberships"
-        members = {}
-        page = 1
+        members = set()
         
-        while True:
-            success, data = self._make_request(
-                "GET", 
-                f"{url}?per_page=100&page={page}"
-            )
-            
+        for success, data in self.iter_pages(url):
             if not success:
-                return False, {}
-            
-            if not data:
-                break
+                return False, set()
             
-            # 获取每个成员的邮箱
             for member in data:
-                username = member["login"]
-                email = self.get_user_email(username)
-                members[username] = email if email else ""
-            
-            if len(data) < 100:
-                break
-            page += 1
+                members.add(member["login"])
         
         return True, members
     
-    def get_enterprise_members(self) -> Tuple[bool, Set[str]]:
+    def get_enterprise_members(self) -> Tuple[bool, MemberIndex]:
         """
         获取 Enterprise 的所有成员 (使用 GraphQL API)
         
         Returns:
-            (成功标志, 成员用户名集合)
+            (成功标志, 大小写不敏感的成员索引)
         """
         if not self.enterprise_id:
             print(f"  ⚠️  无法获取企业成员列表: Enterprise ID 未获取")
-            return False, set()
+            return False, MemberIndex()
         
-        query = """
-        query($enterpriseId: ID!, $cursor: String) {
-            node(id: $enterpriseId) {
-                ... on Enterprise {
-                    members(first: 100, after: $cursor) {
-                        pageInfo {
-                            hasNextPage
-                            endCursor
-                        }
-                        edges {
-                            node {
-                                ... on User {
-                                    login
-                                }
-                                ... on EnterpriseUserAccount {
-                                    login
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
+        query = ENTERPRISE_MEMBERS_QUERY
         
-        members = set()
+        members = MemberIndex()
         cursor = None
         
         try:
@@ -259,115 +3036,97 @@ class GitHubEnterpriseTeamSync:
             return True, members
         except Exception as e:
             print(f"  ⚠️  无法获取企业成员列表: {e}")
-            return False, set()
+            return False, MemberIndex()
+    
+    def _get_invitation_connection(self, query: str, field: str) -> Tuple[bool, List[Dict]]:
+        """
+        按游标读取一类 Enterprise 待处理邀请的全部节点
+        
+        Args:
+            query: 带 $cursor 参数的 GraphQL 查询
+            field: ownerInfo 下的连接字段名
+            
+        Returns:
+            (成功标志, 邀请节点列表)
+        """
+        nodes = []
+        cursor = None
+        try:
+            while True:
+                variables = {"slug": self.enterprise}
+                if cursor:
+                    variables["cursor"] = cursor
+                data = self._graphql_request(query, variables)
+                owner_info = ((data or {}).get("enterprise") or {}).get("ownerInfo") or {}
+                connection = owner_info.get(field) or {}
+                nodes.extend(edge["node"] for edge in connection.get("edges", []) if edge.get("node"))
+                page_info = connection.get("pageInfo") or {}
+                if not page_info.get("hasNextPage"):
+                    break
+                cursor = page_info.get("endCursor")
+            return True, nodes
+        except Exception as e:
+            print(f"  ⚠️  获取 {field} 出错: {e}")
+            return False, nodes
     
-    def get_pending_invitations(self) -> Dict[str, Dict]:
+    def get_pending_invitations(self) -> InvitationIndex:
         """
         获取 Enterprise 的待处理邀请 (使用 GraphQL API)
         
-        inviteEnterpriseMember 创建的是 EnterpriseMemberInvitation (unaffiliated member)
-        需要用 pendingUnaffiliatedMemberInvitations 查询
+        inviteEnterpriseMember 创建的是 EnterpriseMemberInvitation (unaffiliated member)，
+        需要用 pendingUnaffiliatedMemberInvitations 查询；pendingMemberInvitations 为组织级邀请。
+        两个连接并发读取 (串行模式下依次读取) 并各自按游标翻页，同一邮箱以 EnterpriseMemberInvitation 为准。
         
         Returns:
-            字典，key 为邮箱(小写)，value 为邀请信息 {id, email, created_at}
+            待处理邀请索引 (按邮箱和被邀请人用户名)；任一连接读取失败时索引的 loaded 为 False
         """
         if not self.enterprise_id:
-            return {}
+            return InvitationIndex(loaded=False)
         
-        pending = {}
+        connections = ((PENDING_UNAFFILIATED_INVITATIONS_QUERY, "pendingUnaffiliatedMemberInvitations"),
+                       (PENDING_MEMBER_INVITATIONS_QUERY, "pendingMemberInvitations"))
+        if self.executor.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                results = list(pool.map(lambda args: self._get_invitation_connection(*args), connections))
+        else:
+            # 串行模式 (如 --profile-cpu) 下在当前线程依次读取，cProfile 才能跟踪到全部调用
+            results = [self._get_invitation_connection(*args) for args in connections]
+        (unaffiliated_ok, unaffiliated_nodes), (member_ok, member_nodes) = results
         
-        # 查询 pendingUnaffiliatedMemberInvitations (EnterpriseMemberInvitation 类型)
-        # 这是 inviteEnterpriseMember 创建的邀请类型
-        query_unaffiliated = """
-        query($slug: String!) {
-            enterprise(slug: $slug) {
-                ownerInfo {
-                    pendingUnaffiliatedMemberInvitations(first: 100) {
-                        edges {
-                            node {
-                                id
-                                email
-                                createdAt
-                                invitee {
-                                    login
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
+        invitations = []
+        for node in unaffiliated_nodes:
+            invitations.append({
+                "id": node.get("id"),
+                "email": node.get("email"),
+                "created_at": node.get("createdAt", ""),
+                "invitee": (node.get("invitee") or {}).get("login")
+            })
+        for node in member_nodes:
+            invitations.append({
+                "id": node.get("id"),
+                "email": node.get("email"),
+                "created_at": node.get("createdAt", ""),
+                "invitee": (node.get("invitee") or {}).get("login"),
+                "type": "organization_invitation"
+            })
+        return InvitationIndex([inv for inv in invitations if inv["id"] and (inv["email"] or inv["invitee"])],
+                               loaded=unaffiliated_ok and member_ok)
+    
+    def invitation_index(self) -> InvitationIndex:
         """
+        当前的待处理邀请索引
         
-        try:
-            data = self._graphql_request(query_unaffiliated, {"slug": self.enterprise})
-            
-            if data and "enterprise" in data and data["enterprise"]:
-                enterprise = data["enterprise"]
-                owner_info = enterprise.get("ownerInfo", {})
-                invitations_data = owner_info.get("pendingUnaffiliatedMemberInvitations", {})
-                edges = invitations_data.get("edges", [])
-                
-                print(f"  [DEBUG] pendingUnaffiliatedMemberInvitations 返回 {len(edges)} 条邀请")
-                
-                for edge in edges:
-                    node = edge.get("node", {})
-                    if node and node.get("email"):
-                        email = node["email"].lower()
-                        pending[email] = {
-                            "id": node.get("id"),
-                            "email": node.get("email"),
-                            "created_at": node.get("createdAt", ""),
-                            "invitee": node.get("invitee", {}).get("login") if node.get("invitee") else None
-                        }
-        except Exception as e:
-            print(f"  [DEBUG] 获取 pendingUnaffiliatedMemberInvitations 出错: {e}")
-        
-        # 也查询 pendingMemberInvitations (OrganizationInvitation 类型，组织级邀请)
-        query_member = """
-        query($slug: String!) {
-            enterprise(slug: $slug) {
-                ownerInfo {
-                    pendingMemberInvitations(first: 100) {
-                        edges {
-                            node {
-                                id
-                                email
-                                createdAt
-                            }
-                        }
-                    }
-                }
-            }
-        }
+        有快照时使用快照中的索引；否则首次调用时读取一次，之后随发送 / 撤销邀请就地更新。
         """
-        
-        try:
-            data = self._graphql_request(query_member, {"slug": self.enterprise})
-            
-            if data and "enterprise" in data and data["enterprise"]:
-                enterprise = data["enterprise"]
-                owner_info = enterprise.get("ownerInfo", {})
-                invitations_data = owner_info.get("pendingMemberInvitations", {})
-                edges = invitations_data.get("edges", [])
-                
-                print(f"  [DEBUG] pendingMemberInvitations 返回 {len(edges)} 条邀请")
-                
-                for edge in edges:
-                    node = edge.get("node", {})
-                    if node and node.get("email"):
-                        email = node["email"].lower()
-                        if email not in pending:  # 避免重复
-                            pending[email] = {
-                                "id": node.get("id"),
-                                "email": node.get("email"),
-                                "created_at": node.get("createdAt", ""),
-                                "type": "organization_invitation"
-                            }
-        except Exception as e:
-            print(f"  [DEBUG] 获取 pendingMemberInvitations 出错: {e}")
-        
-        return pending
+        if self.snapshot:
+            return self.snapshot.pending_invitations
+        if self.invitations is None:
+            self.invitations = self.get_pending_invitations()
+        return self.invitations
+    
+    def _loaded_invitation_index(self) -> Optional[InvitationIndex]:
+        """已读取的待处理邀请索引 (未读取时为 None，不触发查询)"""
+        return self.snapshot.pending_invitations if self.snapshot else self.invitations
     
     def cancel_enterprise_invitation(self, invitation_id: str, invitation_type: str = None) -> Tuple[bool, str]:
         """
@@ -382,44 +3141,46 @@ class GitHubEnterpriseTeamSync:
         """
         if not invitation_id:
             return False, "邀请 ID 为空"
-        
-        # 优先尝试 cancelEnterpriseMemberInvitation (用于 unaffiliated member 邀请)
-        # 这是 inviteEnterpriseMember 创建的邀请类型
-        mutation_member = """
-        mutation($invitationId: ID!) {
-            cancelEnterpriseMemberInvitation(input: {invitationId: $invitationId}) {
-                invitation {
-                    id
-                }
-                message
-            }
-        }
+        return self.cancel_enterprise_invitations([invitation_id])[invitation_id]
+    
+    def cancel_enterprise_invitations(self, invitation_ids: List[str]) -> Dict[str, Tuple[bool, str]]:
         """
+        批量撤销 Enterprise 邀请 (使用批量 GraphQL mutation)
         
-        try:
-            variables = {"invitationId": invitation_id}
-            data = self._graphql_request(mutation_member, variables)
-            return True, "已撤销邀请 (EnterpriseMemberInvitation)"
-        except Exception as e:
-            print(f"  [DEBUG] cancelEnterpriseMemberInvitation 失败: {e}")
+        先用 cancelEnterpriseMemberInvitation 批量撤销 (inviteEnterpriseMember 创建的邀请类型)，
+        仅对失败的邀请再批量尝试 cancelEnterpriseAdminInvitation。
+        
+        Args:
+            invitation_ids: 邀请的 Node ID 列表
             
-            # 如果失败，尝试 cancelEnterpriseAdminInvitation (用于 admin 邀请)
-            mutation_admin = """
-            mutation($invitationId: ID!) {
-                cancelEnterpriseAdminInvitation(input: {invitationId: $invitationId}) {
-                    invitation {
-                        id
-                    }
-                    message
-                }
-            }
-            """
-            try:
-                variables = {"invitationId": invitation_id}
-                data = self._graphql_request(mutation_admin, variables)
-                return True, "已撤销邀请 (EnterpriseAdminInvitation)"
-            except Exception as e2:
-                return False, f"撤销邀请失败: member={str(e)}, admin={str(e2)}"
+        Returns:
+            字典 {invitation_id: (成功标志, 消息)}
+        """
+        member_outcomes = self.run_mutation_batch(
+            "cancelEnterpriseMemberInvitation",
+            [(inv_id, {"invitationId": ("ID!", inv_id)}) for inv_id in invitation_ids],
+            selection="invitation { id }"
+        )
+        failed = [inv_id for inv_id, (success, _) in member_outcomes.items() if not success]
+        admin_outcomes = self.run_mutation_batch(
+            "cancelEnterpriseAdminInvitation",
+            [(inv_id, {"invitationId": ("ID!", inv_id)}) for inv_id in failed],
+            selection="invitation { id }"
+        ) if failed else {}
+        
+        results = {}
+        for inv_id in invitation_ids:
+            if member_outcomes[inv_id][0]:
+                results[inv_id] = (True, "已撤销邀请 (EnterpriseMemberInvitation)")
+            elif admin_outcomes[inv_id][0]:
+                results[inv_id] = (True, "已撤销邀请 (EnterpriseAdminInvitation)")
+            else:
+                results[inv_id] = (False, f"撤销邀请失败: member={member_outcomes[inv_id][1]}, admin={admin_outcomes[inv_id][1]}")
+                continue
+            index = self._loaded_invitation_index()
+            if index is not None:
+                index.remove(inv_id)
+        return results
     
     def get_user_email(self, username: str) -> Optional[str]:
         """
@@ -431,16 +3192,7 @@ class GitHubEnterpriseTeamSync:
         Returns:
             用户邮箱，如果无法获取则返回 None
         """
-        url = f"{self.base_url}/users/{username}"
-        
-        try:
-            success, data = self._make_request("GET", url)
-            if success and data.get("email"):
-                return data["email"]
-        except Exception as e:
-            pass
-        
-        return None
+        return self.get_user_emails([username]).get(normalize_login(username))
     
     def add_member_to_team(self, team_id: int, username: str) -> Tuple[bool, str]:
         """
@@ -480,6 +3232,44 @@ class GitHubEnterpriseTeamSync:
         else:
             return False, f"移除失败: {data}"
     
+    def bulk_update_team_members(self, team_id: int, action: str, usernames: List[str]) -> Dict[str, Tuple[bool, str]]:
+        """
+        使用 Team 批量成员接口添加或移除成员，每个请求最多 TEAM_MEMBERSHIP_BATCH_SIZE 个用户
+        
+        请求失败、批量接口不可用或响应中没有的用户不出现在返回值中，由调用方逐个调用
+        add_member_to_team / remove_member_from_team 处理 (同时得到每个用户的具体错误)。
+        
+        Args:
+            team_id: Team 的 ID
+            action: add 或 remove
+            usernames: 用户名列表
+            
+        Returns:
+            已确定结果的用户 {username: (成功标志, 消息)}
+        """
+        url = f"{self.base_url}/enterprises/{self.enterprise}/teams/{team_id}/memberships/{action}"
+        message = "已添加到 Team" if action == "add" else "已从 Team 移除"
+        results = {}
+        for start in range(0, len(usernames), self.TEAM_MEMBERSHIP_BATCH_SIZE):
+            if not self.bulk_team_memberships:
+                break
+            chunk = usernames[start:start + self.TEAM_MEMBERSHIP_BATCH_SIZE]
+            try:
+                # 批量添加 / 移除的结果与执行次数无关，按幂等请求重试
+                response = self._send("POST", url, idempotent=True, json={"usernames": chunk})
+                if response.status_code in self.BULK_UNAVAILABLE_STATUSES:
+                    print(f"  ⚠️  Team 批量成员接口不可用 ({response.status_code})，改为逐个处理")
+                    self.bulk_team_memberships = False
+                    break
+                response.raise_for_status()
+                processed = parse_bulk_memberships(response.json() if response.text else None, chunk)
+            except (requests.exceptions.RequestException, ValueError):
+                continue
+            for username in chunk:
+                if normalize_login(username) in processed:
+                    results[username] = (True, message)
+        return results
+    
     def remove_from_enterprise(self, username: str) -> Tuple[bool, str]:
         """
         从 Enterprise 移除成员 (使用 GraphQL API)
@@ -490,51 +3280,52 @@ class GitHubEnterpriseTeamSync:
         Returns:
             (成功标志, 消息)
         """
-        if not self.enterprise_id:
-            return False, "无法移除: Enterprise ID 未获取"
-        
-        # 首先获取用户的 ID
-        user_query = """
-        query($login: String!) {
-            user(login: $login) {
-                id
-            }
-        }
+        return self.remove_from_enterprise_batch([username])[username]
+    
+    def remove_from_enterprise_batch(self, usernames: List[str]) -> Dict[str, Tuple[bool, str]]:
         """
+        批量从 Enterprise 移除成员 (批量解析用户 ID + 批量 removeEnterpriseMember mutation)
         
-        try:
-            user_data = self._graphql_request(user_query, {"login": username})
-            if not user_data or "user" not in user_data or not user_data["user"]:
-                return False, f"找不到用户 {username}"
-            
-            user_id = user_data["user"]["id"]
-            
-            # 使用 GraphQL mutation 移除成员
-            mutation = """
-            mutation($enterpriseId: ID!, $userId: ID!) {
-                removeEnterpriseMember(input: {enterpriseId: $enterpriseId, userId: $userId}) {
-                    clientMutationId
-                }
-            }
-            """
+        Args:
+            usernames: 用户名列表
             
-            variables = {
-                "enterpriseId": self.enterprise_id,
-                "userId": user_id
-            }
-            self._graphql_request(mutation, variables)
-            return True, "已从 Enterprise 移除"
-        except Exception as e:
-            return False, f"移除失败: {str(e)}"
+        Returns:
+            字典 {username: (成功标志, 消息)}
+        """
+        if not self.enterprise_id:
+            return {username: (False, "无法移除: Enterprise ID 未获取") for username in usernames}
+        
+        results = {}
+        items = []
+        identities = self.resolve_users(usernames)
+        for username in dict.fromkeys(usernames):
+            identity = identities.get(normalize_login(username))
+            if identity and identity.get("node_id"):
+                items.append((username, {"userId": ("ID!", identity["node_id"])}))
+            else:
+                results[username] = (False, f"找不到用户 {username}")
+        
+        outcomes = self.run_mutation_batch(
+            "removeEnterpriseMember", items,
+            shared={"enterpriseId": ("ID!", self.enterprise_id)}
+        )
+        for username, (success, error) in outcomes.items():
+            if success:
+                if self.snapshot:
+                    self.snapshot.remove_member(username)
+                results[username] = (True, "已从 Enterprise 移除")
+            else:
+                self.invalidate_identity(username)
+                results[username] = (False, f"移除失败: {error}")
+        return results
     
-    def invite_to_enterprise(self, email: str, retry_count: int = 0) -> Tuple[bool, str]:
+    def invite_to_enterprise(self, email: str) -> Tuple[bool, str]:
         """
         邀请用户加入 Enterprise (使用 GraphQL API)
-        如果已有待处理邀请，先删除再重新发送
+        如果已有待处理邀请，先撤销旧邀请再重新发送一次；连接失败等瞬时错误由传输层的重试策略处理
         
         Args:
             email: 用户邮箱
-            retry_count: 当前重试次数（用于防止无限递归）
             
         Returns:
             (成功标志, 消息)
@@ -542,77 +3333,71 @@ class GitHubEnterpriseTeamSync:
         if not self.enterprise_id:
             return False, "无法邀请: Enterprise ID 未获取"
         
-        mutation = """
-        mutation($enterpriseId: ID!, $email: String!) {
-            inviteEnterpriseMember(input: {enterpriseId: $enterpriseId, email: $email}) {
-                invitation {
-                    id
-                    email
-                }
-            }
+        mutation = INVITE_ENTERPRISE_MEMBER_MUTATION
+        variables = {
+            "enterpriseId": self.enterprise_id,
+            "email": email
         }
-        """
         
-        try:
-            variables = {
-                "enterpriseId": self.enterprise_id,
-                "email": email
-            }
-            data = self._graphql_request(mutation, variables)
-            
-            if data and "inviteEnterpriseMember" in data and data["inviteEnterpriseMember"]:
-                result = data["inviteEnterpriseMember"]
-                if result.get("invitation"):
-                    invitation = result.get("invitation")
-                    return True, f"已发送邀请 (ID: {invitation['id']})"
+        for attempt in range(2):
+            try:
+                data = self._graphql_request(mutation, variables)
+            except Exception as e:
+                error_msg = str(e)
+                # 邀请已存在时撤销旧邀请后重新发送 (只重新发送一次)
+                if attempt == 0 and ("duplicate" in error_msg.lower() or "already" in error_msg.lower()):
+                    print(f"     🔄 检测到邀请已存在，正在清理旧邀请...")
+                    if self._cancel_existing_invitation(email):
+                        continue
+                return False, f"邀请失败: {error_msg[:100]}"
             
-            # 检查错误信息
-            error_str = str(data) if data else ""
+            invitation = ((data or {}).get("inviteEnterpriseMember") or {}).get("invitation")
+            if invitation:
+                index = self._loaded_invitation_index()
+                if index is not None:
+                    index.add({
+                        "id": invitation["id"],
+                        "email": invitation.get("email") or email,
+                        "created_at": datetime.now().isoformat(),
+                        "invitee": None
+                    })
+                self.invitation_ledger.record_sent("enterprise", email, invitation["id"])
+                return True, f"已发送邀请 (ID: {invitation['id']})"
             
-            # 如果还未重试，尝试删除所有待处理邀请然后重新发送
-            if retry_count == 0:
+            # 响应中没有邀请：可能被旧邀请挡住，撤销旧邀请后重新发送
+            if attempt == 0:
                 print(f"     🔄 发送邀请失败或响应异常，尝试清理旧邀请...")
-                try:
-                    pending = self.get_pending_invitations()
-                    if pending and email.lower() in pending:
-                        old_inv = pending[email.lower()]
-                        print(f"     🗑️  找到旧邀请 (ID: {old_inv['id']}，创建于: {old_inv['created_at']})，正在删除...")
-                        cancel_success, cancel_msg = self.cancel_enterprise_invitation(old_inv["id"])
-                        if cancel_success:
-                            print(f"     ✅ 旧邀请已删除，重新发送...")
-                            return self.invite_to_enterprise(email, retry_count=1)
-                except Exception as cleanup_e:
-                    print(f"     ⚠️  清理过程出错: {cleanup_e}")
+                if self._cancel_existing_invitation(email):
+                    continue
             
             # 输出完整的响应以调试
-            import json
             print(f"  [DEBUG] 邀请响应: {json.dumps(data, ensure_ascii=False, indent=2)}")
-            return False, f"响应异常: {error_str[:100]}"
-        except Exception as e:
-            error_msg = str(e)
-            
-            # 如果还未重试，尝试删除旧邀请
-            if retry_count == 0 and ("duplicate" in error_msg.lower() or "already" in error_msg.lower()):
-                print(f"     🔄 检测到邀请已存在，正在清理旧邀请...")
-                try:
-                    pending = self.get_pending_invitations()
-                    if pending and email.lower() in pending:
-                        old_inv = pending[email.lower()]
-                        print(f"     🗑️  找到旧邀请 (ID: {old_inv['id']})，正在删除...")
-                        cancel_success, cancel_msg = self.cancel_enterprise_invitation(old_inv["id"])
-                        if cancel_success:
-                            print(f"     ✅ 旧邀请已删除，重新发送...")
-                            return self.invite_to_enterprise(email, retry_count=1)
-                    else:
-                        # 没找到待处理邀请，直接重试（可能 API 缓存延迟）
-                        print(f"     ⏳ 等待 API 更新后重试...")
-                        import time
-                        time.sleep(1)
-                        return self.invite_to_enterprise(email, retry_count=1)
-                except Exception as cleanup_e:
-                    print(f"     ⚠️  清理过程出错: {cleanup_e}")
+            return False, f"响应异常: {str(data)[:100] if data else ''}"
+    
+    def _cancel_existing_invitation(self, email: str) -> bool:
+        """
+        撤销该邮箱的待处理 Enterprise 邀请 (invite_to_enterprise 重新发送前调用)
+        
+        Args:
+            email: 用户邮箱
             
-            return False, f"邀请失败: {error_msg[:100]}"
+        Returns:
+            是否找到并撤销了旧邀请
+        """
+        try:
+            old_inv = self.invitation_index().find(email=email)
+            if not old_inv:
+                return False
+            print(f"     🗑️  找到旧邀请 (ID: {old_inv['id']}，创建于: {old_inv['created_at']})，正在删除...")
+            cancel_success, cancel_msg = self.cancel_enterprise_invitation(old_inv["id"])
+            if cancel_success:
+                print(f"     ✅ 旧邀请已删除，重新发送...")
+            else:
+                print(f"     ⚠️  {cancel_msg}")
+            return cancel_success
+        except Exception as cleanup_e:
+            print(f"     ⚠️  清理过程出错: {cleanup_e}")
+            return False
     
     def is_email(self, identifier: str) -> bool:
         """判断是否为邮箱地址"""
@@ -640,7 +3425,9 @@ class GitHubEnterpriseTeamSync:
             )
             
             if success:
-                return True, {"id": data.get("id"), "slug": data.get("slug"), "name": data.get("name")}
+                team = {"id": data.get("id"), "slug": data.get("slug"), "name": data.get("name") or team_name}
+                self.teams.add(team)
+                return True, team
             else:
                 return False, f"创建 Team 失败: {data}"
         except Exception as e:
@@ -677,23 +3464,7 @@ class GitHubEnterpriseTeamSync:
         if not self.enterprise_id:
             return False, {}
         
-        query = """
-        query($slug: String!, $cursor: String) {
-            enterprise(slug: $slug) {
-                organizations(first: 100, after: $cursor) {
-                    pageInfo {
-                        hasNextPage
-                        endCursor
-                    }
-                    nodes {
-                        id
-                        login
-                        name
-                    }
-                }
-            }
-        }
-        """
+        query = ENTERPRISE_ORGANIZATIONS_QUERY
         
         orgs = {}
         cursor = None
@@ -749,23 +3520,7 @@ class GitHubEnterpriseTeamSync:
         if not billing_email:
             return False, "无法创建: 需要提供 billing_email"
         
-        mutation = """
-        mutation($enterpriseId: ID!, $login: String!, $profileName: String!, $adminLogins: [String!]!, $billingEmail: String!) {
-            createEnterpriseOrganization(input: {
-                enterpriseId: $enterpriseId,
-                login: $login,
-                profileName: $profileName,
-                adminLogins: $adminLogins,
-                billingEmail: $billingEmail
-            }) {
-                organization {
-                    id
-                    login
-                    name
-                }
-            }
-        }
-        """
+        mutation = CREATE_ORGANIZATION_MUTATION
         
         try:
             variables = {
@@ -779,6 +3534,7 @@ class GitHubEnterpriseTeamSync:
             
             if data and "createEnterpriseOrganization" in data:
                 org = data["createEnterpriseOrganization"]["organization"]
+                self.orgs.add({"id": org.get("id"), "login": org["login"], "name": org.get("name")})
                 return True, f"已创建 Organization: {org['login']}"
             else:
                 return False, "响应格式不正确"
@@ -797,21 +3553,16 @@ class GitHubEnterpriseTeamSync:
         Returns:
             (成功标志, org 信息或错误消息)
         """
-        # 先获取所有 orgs
-        success, orgs = self.get_enterprise_organizations()
+        # 先在本次运行的 Organization 索引中查找
+        org = self.orgs.get(org_login)
+        if org:
+            return True, org
         
-        if success and org_login.lower() in orgs:
-            return True, orgs[org_login.lower()]
-        
-        # 不存在则创建
+        # 不存在则创建 (创建成功后索引已就地更新，无需重新读取列表)
         print(f"  📝 Organization '{org_login}' 不存在，正在创建...")
         success, message = self.create_organization(org_login, admin_login, billing_email)
         if success:
-            # 重新获取以得到完整信息
-            success, orgs = self.get_enterprise_organizations()
-            if success and org_login.lower() in orgs:
-                return True, orgs[org_login.lower()]
-            return True, {"login": org_login}
+            return True, self.orgs.get(org_login) or {"login": org_login}
         return False, message
     
     def get_organization_members(self, org_login: str) -> Tuple[bool, Set[str]]:
@@ -826,27 +3577,14 @@ class GitHubEnterpriseTeamSync:
         """
         url = f"{self.base_url}/orgs/{org_login}/members"
         members = set()
-        page = 1
         
         try:
-            while True:
-                success, data = self._make_request(
-                    "GET",
-                    f"{url}?per_page=100&page={page}"
-                )
-                
+            for success, data in self.iter_pages(url):
                 if not success:
                     return False, set()
                 
-                if not data:
-                    break
-                
                 for member in data:
                     members.add(member["login"])
-                
-                if len(data) < 100:
-                    break
-                page += 1
             
             return True, members
         except Exception as e:
@@ -865,16 +3603,10 @@ class GitHubEnterpriseTeamSync:
         """
         url = f"{self.base_url}/orgs/{org_login}/invitations"
         pending = {}
-        page = 1
         
         try:
-            while True:
-                success, data = self._make_request(
-                    "GET",
-                    f"{url}?per_page=100&page={page}"
-                )
-                
-                if not success or not data:
+            for success, data in self.iter_pages(url):
+                if not success:
                     break
                 
                 for inv in data:
@@ -887,10 +3619,6 @@ class GitHubEnterpriseTeamSync:
                             "role": inv.get("role"),
                             "created_at": inv.get("created_at", "")
                         }
-                
-                if len(data) < 100:
-                    break
-                page += 1
             
             return pending
         except Exception as e:
@@ -938,11 +3666,10 @@ class GitHubEnterpriseTeamSync:
         if email:
             payload["email"] = email
         elif username:
-            # 需要先获取用户 ID
-            user_url = f"{self.base_url}/users/{username}"
-            success, user_data = self._make_request("GET", user_url)
-            if success and user_data.get("id"):
-                payload["invitee_id"] = user_data["id"]
+            # 需要先获取用户的数据库 ID (批量预解析过的用户不会再发请求)
+            identity = self.resolve_users([username]).get(normalize_login(username))
+            if identity and identity.get("database_id"):
+                payload["invitee_id"] = identity["database_id"]
             else:
                 return False, f"找不到用户 {username}"
         else:
@@ -951,8 +3678,12 @@ class GitHubEnterpriseTeamSync:
         try:
             success, data = self._make_request("POST", url, json=payload)
             if success:
+                self.invitation_ledger.record_sent(f"org/{org_login.lower()}", email or username,
+                                                   data.get("id") if isinstance(data, dict) else None)
                 return True, "已发送邀请"
             else:
+                if "invitee_id" in payload:
+                    self.invalidate_identity(username)
                 return False, f"邀请失败: {data}"
         except Exception as e:
             return False, f"邀请失败: {str(e)}"
@@ -979,133 +3710,126 @@ class GitHubEnterpriseTeamSync:
         except Exception as e:
             return False, f"移除失败: {str(e)}"
     
-    def sync_organization(self, org_config: Dict) -> Dict:
+    def plan_organization(self, org_config: Dict) -> Dict:
         """
-        同步单个 Organization 的成员
+        规划单个 Organization 的变更 (只读取，不做任何修改)
         
         Args:
-            org_config: Organization 配置 {login, admin, billing_email, members: [...]}
+            org_config: Organization 配置 {login, admin, billing_email, invite_priority, members: [...]}
             
         Returns:
-            同步报告
+            Organization 变更计划 {login, admin, billing_email, priority, create, cancel_invitations, invites, pending,
+            removes, errors}
         """
         org_login = org_config.get("login")
-        admin_login = org_config.get("admin", "")
-        billing_email = org_config.get("billing_email", "")
         target_members = org_config.get("members", [])
-        
-        print(f"\n{'='*60}")
-        print(f"正在同步 Organization: {org_login}")
-        print(f"{'='*60}")
-        
-        org_report = {
+        entry = {
             "login": org_login,
-            "added": [],
-            "removed": [],
-            "invited": [],
+            "admin": org_config.get("admin", ""),
+            "billing_email": org_config.get("billing_email", ""),
+            "priority": org_config.get("invite_priority", 0),
+            "create": False,
+            "cancel_invitations": [],
+            "invites": [],
+            "pending": [],
+            "removes": [],
             "errors": []
         }
         
-        # 1. 确保 Organization 存在
-        print(f"\n📋 检查 Organization...")
-        success, result = self.get_or_create_organization(org_login, admin_login, billing_email)
-        if not success:
-            error_msg = f"无法获取/创建 Organization: {result}"
-            print(f"  ❌ {error_msg}")
-            org_report["errors"].append(error_msg)
-            return org_report
-        print(f"  ✅ Organization 已就绪: {org_login}")
-        
-        # 2. 获取当前 Organization 成员
-        print(f"\n📋 获取当前 Organization 成员...")
-        success, current_members = self.get_organization_members(org_login)
-        if not success:
-            error_msg = "无法获取 Organization 成员列表"
-            print(f"  ❌ {error_msg}")
-            org_report["errors"].append(error_msg)
-            return org_report
+        print(f"📋 规划 Organization: {org_login}")
         
-        print(f"  ✅ 当前成员数: {len(current_members)}")
+        # 1. 检查 Organization 是否存在 (本次运行共享的 Organization 索引)
+        entry["create"] = self.orgs.get(org_login) is None
         
-        # 3. 获取待处理邀请
-        print(f"\n📋 获取待处理邀请...")
-        pending_invitations = self.get_organization_pending_invitations(org_login)
-        if pending_invitations:
-            print(f"  ✅ 待处理邀请数: {len(pending_invitations)}")
-        else:
-            print(f"  ℹ️  无待处理邀请")
-        
-        # 4. 处理目标成员
-        current_identifiers = {m.lower(): m for m in current_members}
-        
-        target_identifiers = {}  # username_lower -> {'username':..., 'email':...}
-        for member in target_members:
-            if isinstance(member, dict):
-                username = member.get('username', '').strip()
-                email = member.get('email', '').strip()
-                if username:
-                    target_identifiers[username.lower()] = {'username': username, 'email': email}
-            elif isinstance(member, str):
-                if self.is_email(member):
-                    username = member.split('@')[0]
-                    target_identifiers[username.lower()] = {'username': username, 'email': member}
-                else:
-                    target_identifiers[member.lower()] = {'username': member, 'email': ''}
-        
-        current_keys = set(current_identifiers.keys())
-        target_keys = set(target_identifiers.keys())
-        
-        to_add = target_keys - current_keys
-        to_remove = current_keys - target_keys
-        
-        print(f"\n🔍 差异分析:")
-        print(f"  • 当前成员: {len(current_keys)}")
-        print(f"  • 目标成员: {len(target_keys)}")
-        print(f"  • 需要添加: {len(to_add)}")
-        print(f"  • 需要移除: {len(to_remove)}")
-        
-        # 5. 添加成员
-        if to_add:
-            print(f"\n➕ 添加成员到 Organization...")
-            for key in to_add:
-                info = target_identifiers[key]
-                username = info['username']
-                email = info['email']
-                
-                # 检查是否已有待处理邀请
-                if email and email.lower() in pending_invitations:
-                    # 先撤销旧邀请
-                    old_inv = pending_invitations[email.lower()]
-                    print(f"  🔄 {email}: 已有待处理邀请，先撤销...")
-                    self.cancel_organization_invitation(org_login, old_inv["id"])
-                elif key in pending_invitations:
-                    old_inv = pending_invitations[key]
-                    print(f"  🔄 {username}: 已有待处理邀请，先撤销...")
-                    self.cancel_organization_invitation(org_login, old_inv["id"])
-                
-                # 发送邀请
-                success, message = self.add_member_to_organization(org_login, username=username, email=email)
-                if success:
-                    print(f"  ✅ {username}: {message}")
-                    org_report["invited"].append(username)
-                else:
-                    print(f"  ❌ {username}: {message}")
-                    org_report["errors"].append(f"{username}: {message}")
-        
-        # 6. 移除成员
-        if to_remove:
-            print(f"\n➖ 从 Organization 移除成员...")
-            for key in to_remove:
-                username = current_identifiers[key]
-                success, message = self.remove_member_from_organization(org_login, username)
-                if success:
-                    print(f"  ✅ {username}: {message}")
-                    org_report["removed"].append(username)
-                else:
-                    print(f"  ❌ {username}: {message}")
-                    org_report["errors"].append(f"{username}: {message}")
+        # 2. 获取当前成员和待处理邀请 (新建的 Organization 两者都为空)
+        current_members = set()
+        pending_invitations = {}
+        if not entry["create"]:
+            success, current_members = self.get_organization_members(org_login)
+            if not success and self.orgs.discard(org_login):
+                # 索引中的条目可能来自已过期的持久化缓存，重新读取列表后再确认一次
+                entry["create"] = self.orgs.get(org_login) is None and self.orgs.complete
+                if not entry["create"]:
+                    success, current_members = self.get_organization_members(org_login)
+            if not entry["create"]:
+                if not success:
+                    error_msg = "无法获取 Organization 成员列表"
+                    print(f"  ❌ [{org_login}] {error_msg}")
+                    entry["errors"].append(error_msg)
+                    return entry
+                pending_invitations = self.get_organization_pending_invitations(org_login)
+        if entry["create"]:
+            print(f"  📝 [{org_login}] Organization 不存在，将创建")
+            current_members = set()
+        
+        # 3. 差异分析
+        current_identifiers = MemberIndex(current_members)
+        target_identifiers = normalize_members(target_members)  # username_lower -> {'username':..., 'email':...}
+        to_add = target_identifiers.keys() - current_identifiers.keys()
+        to_remove = current_identifiers.keys() - target_identifiers.keys()
+        
+        # 没有 email 的用户需要通过数据库 ID 邀请，先批量解析
+        by_username = [target_identifiers[key]['username'] for key in to_add if not target_identifiers[key]['email']]
+        if by_username:
+            self.resolve_users(by_username)
+        
+        scope = f"org/{org_login.lower()}"
+        for key in sorted(to_add):
+            info = target_identifiers[key]
+            # 已有待处理邀请的用户：邀请仍然有效时保留，否则先撤销旧邀请再重新发送
+            old_inv = pending_invitations.get(info['email'].lower()) if info['email'] else None
+            old_inv = old_inv or pending_invitations.get(key)
+            if old_inv:
+                if self.invitation_ledger.is_fresh(old_inv, scope, info['email'] or key):
+                    entry["pending"].append({"username": info['username'], "email": info['email'],
+                                             "created_at": old_inv.get("created_at", "")})
+                    continue
+                entry["cancel_invitations"].append({"id": old_inv["id"], "username": info['username']})
+            entry["invites"].append({"username": info['username'], "email": info['email']})
+        entry["removes"] = [current_identifiers[key] for key in sorted(to_remove)]
+        
+        print(f"  • [{org_login}] 当前成员: {len(current_identifiers)}，目标成员: {len(target_identifiers)}，"
+              f"需要邀请: {len(entry['invites'])}，保留邀请: {len(entry['pending'])}，需要移除: {len(to_remove)}")
+        return entry
+    
+    def sync_organization(self, org_config: Dict) -> Dict:
+        """
+        同步单个 Organization 的成员 (规划后立即执行)
+        
+        Args:
+            org_config: Organization 配置 {login, admin, billing_email, members: [...]}
+            
+        Returns:
+            同步报告
+        """
+        plan = self.new_plan()
+        plan["orgs"].append(self.plan_organization(org_config))
+        return self.apply_plan(plan)["orgs"][0]
+    
+    def _reinvite_to_organization(self, org_login: str, invite: Dict, old_invitation_id=None) -> Tuple[bool, str]:
+        """撤销旧的 Organization 邀请 (如有) 后重新发送邀请"""
+        if old_invitation_id:
+            self.cancel_organization_invitation(org_login, old_invitation_id)
+        return self.add_member_to_organization(org_login, username=invite["username"], email=invite["email"])
+    
+    def get_enterprise_teams(self) -> Tuple[bool, Dict[str, Dict]]:
+        """
+        获取 Enterprise 下的所有 Teams
+        
+        Returns:
+            (成功标志, teams 字典 {name_lower: {id, slug, name}})
+        """
+        url = f"{self.base_url}/enterprises/{self.enterprise}/teams"
+        teams = {}
+        
+        for success, data in self.iter_pages(url):
+            if not success:
+                return False, {}
+            
+            for team in data:
+                teams[team["name"].lower()] = {"id": team["id"], "slug": team["slug"], "name": team["name"]}
         
-        return org_report
+        return True, teams
     
     def get_team_by_name(self, team_name: str) -> Tuple[bool, Dict]:
         """
@@ -1117,249 +3841,218 @@ class GitHubEnterpriseTeamSync:
         Returns:
             (成功标志, team 信息字典或错误信息)
         """
-        url = f"{self.base_url}/enterprises/{self.enterprise}/teams"
-        page = 1
-        
-        while True:
-            success, data = self._make_request(
-                "GET",
-                f"{url}?per_page=100&page={page}"
-            )
-            
-            if not success:
-                return False, f"无法获取 teams 列表: {data}"
-            
-            if not data:
-                break
-            
-            # 查找匹配的 team
-            for team in data:
-                if team["name"].lower() == team_name.lower():
-                    return True, {"id": team["id"], "slug": team["slug"]}
-            
-            if len(data) < 100:
-                break
-            page += 1
-        
+        # 本次运行内只读取一次完整列表，之后的查找都在索引上完成
+        team = self.teams.get(team_name)
+        if team:
+            return True, {"id": team["id"], "slug": team["slug"]}
+        if not self.teams.complete:
+            return False, "无法获取 teams 列表"
         return False, f"未找到名为 '{team_name}' 的 team"
     
-    def sync_team(self, team_name: str, target_members: List[str], team_id: int = None, team_slug: str = None, auto_create: bool = True) -> Dict:
+    def plan_team(self, team_name: str, target_members: List[str], team_id: int = None, team_slug: str = None,
+                  auto_create: bool = True, invite_priority: int = 0) -> Dict:
         """
-        同步单个 Team 的成员
+        规划单个 Team 的变更 (只读取，不做任何修改)
         
         Args:
             team_name: Team 名称
             target_members: 目标成员列表
             team_id: Team 的 ID (可选，如果不提供会自动查找)
             team_slug: Team 的 slug (可选，用于显示)
-            auto_create: 是否自动创建不存在的 Team
+            auto_create: Team 不存在时是否计划创建
+            invite_priority: Enterprise 邀请的优先级 (邀请额度不足时数值大的先发送)
             
         Returns:
-            同步报告
+            Team 变更计划 {name, id, slug, priority, create, adds, cancel_invitations, invites, pending, skipped_invites,
+            removes, errors}
         """
-        # 如果没有提供 ID，尝试通过名称查找或创建
-        if not team_id:
-            print(f"\n🔍 正在查找 Team: {team_name}...")
-            success, result = self.get_team_by_name(team_name)
-            if not success:
-                if auto_create:
-                    print(f"  📝 Team 不存在，正在创建...")
-                    success, result = self.create_enterprise_team(team_name)
-                    if not success:
-                        print(f"  ❌ 创建 Team 失败: {result}")
-                        return {
-                            "name": team_name,
-                            "slug": None,
-                            "added": [],
-                            "removed": [],
-                            "invited": [],
-                            "errors": [f"创建 Team 失败: {result}"]
-                        }
-                    print(f"  ✅ 已创建 Team (ID: {result['id']}, slug: {result['slug']})")
-                else:
-                    print(f"  ❌ {result}")
-                    return {
-                        "name": team_name,
-                        "slug": None,
-                        "added": [],
-                        "removed": [],
-                        "invited": [],
-                        "errors": [result]
-                    }
-            team_id = result["id"]
-            team_slug = result["slug"]
-            if success and not auto_create:
-                print(f"  ✅ 找到 Team (ID: {team_id}, slug: {team_slug})")
-        
-        print(f"\n{'='*60}")
-        print(f"正在同步 Team: {team_name} (ID: {team_id}, slug: {team_slug})")
-        print(f"{'='*60}")
-        
-        team_report = {
+        entry = {
             "name": team_name,
             "id": team_id,
             "slug": team_slug,
-            "added": [],
-            "removed": [],
-            "invited": [],
+            "priority": invite_priority,
+            "create": False,
+            "adds": [],
+            "cancel_invitations": [],
+            "invites": [],
+            "pending": [],
+            "skipped_invites": [],
+            "removes": [],
             "errors": []
         }
         
-        # 1. 获取当前 Team 成员
-        print("\n📋 获取当前 Team 成员...")
-        success, current_members = self.get_team_members(team_id)
+        print(f"📋 规划 Team: {team_name}")
+        
+        # 1. 查找 Team (未提供 ID 时)
+        if not team_id:
+            success, result = self.get_team_by_name(team_name)
+            if success:
+                entry["id"] = result["id"]
+                entry["slug"] = result["slug"]
+            elif auto_create:
+                print(f"  📝 [{team_name}] Team 不存在，将创建")
+                entry["create"] = True
+            else:
+                print(f"  ❌ [{team_name}] {result}")
+                entry["errors"].append(result)
+                return entry
+        
+        # 2. 获取当前 Team 成员 (新建的 Team 没有成员)
+        current_members = set()
+        if entry["id"]:
+            success, current_members = self.get_team_members(entry["id"])
+            if not success and not team_id and self.teams.discard(team_name):
+                # 索引中的 Team ID 可能来自已过期的持久化缓存，重新读取列表后再试一次
+                found, result = self.get_team_by_name(team_name)
+                if found:
+                    entry["id"], entry["slug"] = result["id"], result["slug"]
+                    success, current_members = self.get_team_members(entry["id"])
+                elif auto_create and self.teams.complete:
+                    print(f"  📝 [{team_name}] Team 已不存在，将创建")
+                    entry["id"] = entry["slug"] = None
+                    entry["create"] = True
+                    success, current_members = True, set()
+            if not success:
+                error_msg = f"无法获取 Team 成员列表: {current_members}"
+                print(f"  ❌ [{team_name}] {error_msg}")
+                entry["errors"].append(error_msg)
+                return entry
         
+        # 3. 获取企业成员列表和待处理邀请 (优先使用本次运行的快照)
+        if self.snapshot:
+            success, enterprise_members = self.snapshot.members_loaded, self.snapshot.members
+            pending_invitations = self.snapshot.pending_invitations
+        else:
+            success, enterprise_members = self.get_enterprise_members()
+            pending_invitations = self.invitation_index()
         if not success:
-            error_msg = f"无法获取 Team 成员列表: {current_members}"
-            print(f"  ❌ {error_msg}")
-            team_report["errors"].append(error_msg)
-            return team_report
+            print(f"  ⚠️  [{team_name}] 无法获取 Enterprise 成员列表，将尝试直接添加")
+            enterprise_members = MemberIndex()
         
-        print(f"  ✅ 当前成员数: {len(current_members)}")
-        if current_members:
-            print(f"     {', '.join(current_members)}")
+        # 4. 差异分析：增删都用 username 作为唯一标识，优先用 email 邀请
+        current_identifiers = MemberIndex(current_members)
+        target_identifiers = normalize_members(target_members)  # username_lower -> {'username':..., 'email':...}
+        to_add = target_identifiers.keys() - current_identifiers.keys()
+        to_remove = current_identifiers.keys() - target_identifiers.keys()
         
-        # 2. 获取企业成员列表
-        print("\n📋 获取 Enterprise 成员列表...")
-        success, enterprise_members = self.get_enterprise_members()
+        # 仅对需要邀请但配置中缺少 email 的用户，批量查询其公开邮箱 (可选)
+        if self.resolve_missing_emails:
+            missing_email = [target_identifiers[k]['username'] for k in to_add
+                             if k not in enterprise_members and not target_identifiers[k]['email']]
+            if missing_email:
+                print(f"  📋 [{team_name}] 批量查询 {len(missing_email)} 个待邀请用户的邮箱...")
+                resolved = self.get_user_emails(missing_email)
+                for k in to_add:
+                    if k in resolved and not target_identifiers[k]['email']:
+                        target_identifiers[k]['email'] = resolved[k]
+                print(f"  ✅ [{team_name}] 获取到 {len(resolved)} 个邮箱")
         
-        if success:
-            print(f"  ✅ Enterprise 成员数: {len(enterprise_members)}")
+        # 已在 Enterprise 中或没有 email 的用户直接添加到 Team，其余用户发送 Enterprise 邀请 (仍然有效的邀请保留不动)
+        for key in sorted(to_add):
+            info = target_identifiers[key]
+            if key in enterprise_members or not info['email']:
+                entry["adds"].append({"username": info['username'], "in_enterprise": key in enterprise_members})
+                continue
+            if not pending_invitations.loaded:
+                # 邀请列表不完整时无法确认用户没有待处理邀请，跳过邀请以免重复发送
+                entry["skipped_invites"].append(info['email'])
+                continue
+            old_inv = pending_invitations.find(email=info['email'], login=info['username'])
+            if old_inv:
+                if self.invitation_ledger.is_fresh(old_inv, "enterprise", info['email']):
+                    entry["pending"].append({"username": info['username'], "email": info['email'],
+                                             "created_at": old_inv.get("created_at", "")})
+                    continue
+                entry["cancel_invitations"].append({"id": old_inv["id"], "email": info['email']})
+            entry["invites"].append({"username": info['username'], "email": info['email']})
+        entry["removes"] = [current_identifiers[key] for key in sorted(to_remove)]
+        
+        print(f"  • [{team_name}] 当前成员: {len(current_identifiers)}，目标成员: {len(target_identifiers)}，"
+              f"需要添加: {len(entry['adds'])}，需要邀请: {len(entry['invites'])}，保留邀请: {len(entry['pending'])}，"
+              f"需要移除: {len(to_remove)}")
+        return entry
+    
+    def sync_team(self, team_name: str, target_members: List[str], team_id: int = None, team_slug: str = None, auto_create: bool = True) -> Dict:
+        """
+        同步单个 Team 的成员 (规划后立即执行)
+        
+        Args:
+            team_name: Team 名称
+            target_members: 目标成员列表
+            team_id: Team 的 ID (可选，如果不提供会自动查找)
+            team_slug: Team 的 slug (可选，用于显示)
+            auto_create: 是否自动创建不存在的 Team
+            
+        Returns:
+            同步报告
+        """
+        plan = self.new_plan()
+        plan["teams"].append(self.plan_team(team_name, target_members, team_id, team_slug, auto_create))
+        return self.apply_plan(plan)["teams"][0]
+    
+    def build_snapshot(self, team_names: Optional[List[str]] = None,
+                       org_logins: Optional[List[str]] = None) -> EnterpriseSnapshot:
+        """
+        读取 Enterprise 当前状态 (成员、待处理邀请、Teams、Organizations)
+        
+        Teams 和 Organizations 使用本次运行共享的名称索引：配置中的名称全部命中持久化缓存时不读取列表。
+        
+        Args:
+            team_names: 本次要同步的 Team 名称
+            org_logins: 本次要同步的 Organization login
+            
+        Returns:
+            EnterpriseSnapshot 快照
+        """
+        print(f"\n📸 读取 Enterprise 状态快照...")
+        members_loaded, members = self.get_enterprise_members()
+        if members_loaded:
+            print(f"  ✅ Enterprise 成员数: {len(members)}")
         else:
-            print(f"  ⚠️  无法获取 Enterprise 成员列表，将尝试直接添加")
-            enterprise_members = set()
+            print(f"  ⚠️  无法获取 Enterprise 成员列表")
         
-        # 2.5 获取待处理的邀请
-        print(f"\n📋 获取待处理邀请...")
         pending_invitations = self.get_pending_invitations()
-        
-        if pending_invitations:
+        if pending_invitations.loaded:
             print(f"  ✅ 待处理邀请数: {len(pending_invitations)}")
-            for email, info in pending_invitations.items():
-                print(f"     📧 {email} (邀请 ID: {info['id']}, 创建时间: {info['created_at'][:10] if info.get('created_at') else 'N/A'})")
         else:
-            print(f"  ℹ️  无待处理邀请 (可能是 API 缓存延迟或邀请已接受)")
-        
-        # 3. 支持成员为对象（含 email/username），同步时优先用 email 邀请，增删都用 username 作为唯一标识
-        # current_members: {username: email}
-        current_identifiers = {}  # username_lower -> username
-        for username in current_members.keys():
-            current_identifiers[username.lower()] = username
-
-        # 目标成员处理：支持字符串或对象
-        target_identifiers = {}  # username_lower -> {'username':..., 'email':...}
-        for member in target_members:
-            if isinstance(member, dict):
-                username = member.get('username', '').strip()
-                email = member.get('email', '').strip()
-                if username:
-                    target_identifiers[username.lower()] = {'username': username, 'email': email}
-            elif isinstance(member, str):
-                if self.is_email(member):
-                    username = member.split('@')[0]
-                    target_identifiers[username.lower()] = {'username': username, 'email': member}
-                else:
-                    target_identifiers[member.lower()] = {'username': member, 'email': ''}
-
-        current_keys = set(current_identifiers.keys())
-        target_keys = set(target_identifiers.keys())
-
-        to_add = target_keys - current_keys
-        to_remove = current_keys - target_keys
-
-        print(f"\n🔍 差异分析 (基于用户名):")
-        print(f"  • 当前成员: {len(current_keys)}")
-        print(f"  • 目标成员: {len(target_keys)}")
-        print(f"  • 需要添加: {len(to_add)}")
-        if to_add:
-            for k in to_add:
-                info = target_identifiers[k]
-                print(f"    + {info['username']} ({info['email']})" if info['email'] else f"    + {info['username']}")
-        print(f"  • 需要移除: {len(to_remove)}")
-        if to_remove:
-            for k in to_remove:
-                username = current_identifiers[k]
-                print(f"    - {username}")
-        
-        # 4. 添加成员
-        if to_add:
-            print(f"\n➕ 添加成员到 Team...")
-            for key in to_add:
-                info = target_identifiers[key]
-                username = info['username']
-                email = info['email']
-                
-                # 先检查用户是否已经在 Enterprise 中
-                username_in_enterprise = username.lower() in {m.lower() for m in enterprise_members}
-                
-                if username_in_enterprise:
-                    # 用户已在 Enterprise 中，直接添加到 Team
-                    success, message = self.add_member_to_team(team_id, username)
-                    if success:
-                        print(f"  ✅ {username}: {message}")
-                        team_report["added"].append(username)
-                    else:
-                        print(f"  ❌ {username}: {message}")
-                        team_report["errors"].append(f"{username}: {message}")
-                elif email:
-                    # 用户不在 Enterprise 中，需要发送邀请
-                    email_lower = email.lower()
-                    # 如果已有待处理邀请，先删除旧邀请
-                    if email_lower in pending_invitations:
-                        old_invitation = pending_invitations[email_lower]
-                        print(f"  🔄 {email}: 已有待处理邀请，先撤销旧邀请...")
-                        cancel_success, cancel_msg = self.cancel_enterprise_invitation(old_invitation["id"])
-                        if cancel_success:
-                            print(f"     ✅ {cancel_msg}")
-                        else:
-                            print(f"     ⚠️ {cancel_msg}")
-                    
-                    # 发送新邀请
-                    print(f"  📧 {email}: 发送 Enterprise 邀请...")
-                    success, message = self.invite_to_enterprise(email)
-                    if success:
-                        print(f"     ✅ {message} (等待用户接受)")
-                        team_report["invited"].append(email)
-                    else:
-                        print(f"     ❌ {message}")
-                        team_report["errors"].append(f"{email}: {message}")
-                else:
-                    # 没有 email，直接用用户名加 team
-                    success, message = self.add_member_to_team(team_id, username)
-                    if success:
-                        print(f"  ✅ {username}: {message}")
-                        team_report["added"].append(username)
-                    else:
-                        # 添加失败，检查原因
-                        if "cannot be found in the enterprise" in str(message).lower():
-                            # 没有 email，无法邀请
-                            print(f"  ⚠️ {username}: 用户不在 Enterprise 中，且没有提供 email 无法发送邀请")
-                            team_report["errors"].append(f"{username}: 用户不在 Enterprise 中，需要提供 email 才能发送邀请")
-                        else:
-                            print(f"  ❌ {username}: {message}")
-                            team_report["errors"].append(f"{username}: {message}")
-        
-        # 5. 移除成员
-        if to_remove:
-            print(f"\n➖ 从 Team 移除成员...")
-            for key in to_remove:
-                username = current_identifiers[key]
-                success, message = self.remove_member_from_team(team_id, username)
-                if success:
-                    print(f"  ✅ {username}: {message}")
-                    team_report["removed"].append(username)
-                else:
-                    print(f"  ❌ {username}: {message}")
-                    team_report["errors"].append(f"{username}: {message}")
+            print(f"  ⚠️  无法完整获取 Enterprise 待处理邀请列表，本次不发送 Enterprise 邀请")
         
-        return team_report
+        teams_loaded = self.teams.preload(team_names)
+        if not teams_loaded:
+            print(f"  ⚠️  无法获取 Enterprise Teams 列表")
+        elif self.teams.complete:
+            print(f"  ✅ Enterprise Teams 数: {len(self.teams)}")
+        else:
+            print(f"  ✅ 使用缓存的 {len(self.teams)} 个 Team 标识")
+        
+        orgs_loaded = self.orgs.preload(org_logins)
+        if orgs_loaded and self.orgs.complete:
+            print(f"  ✅ Organizations 数: {len(self.orgs)}")
+        elif orgs_loaded:
+            print(f"  ✅ 使用缓存的 {len(self.orgs)} 个 Organization 标识")
+        
+        return EnterpriseSnapshot(members, pending_invitations, self.teams, self.orgs,
+                                  members_loaded=members_loaded, teams_loaded=teams_loaded,
+                                  orgs_loaded=orgs_loaded)
     
-    def sync_from_config(self, config_file: str):
+    def sync_from_config(self, config_file: str, state_file: Optional[str] = None, incremental: bool = False,
+                         full_sync_interval: float = DEFAULT_FULL_SYNC_INTERVAL, dry_run: bool = False,
+                         plan_out: Optional[str] = None) -> Optional[Dict]:
         """
         从配置文件同步所有 Teams 和 Organizations
         
+        先基于一次读取的快照规划全部变更，再统一执行。
+        
         Args:
             config_file: JSON 配置文件路径
+            state_file: 同步状态文件路径，指定后记录每个资源的同步结果
+            incremental: 是否只同步期望状态与上次成功同步不同的资源 (需要 state_file)
+            full_sync_interval: 增量模式下的全量同步间隔 (秒)
+            dry_run: 只规划并输出变更计划，不执行任何修改
+            plan_out: 变更计划的保存路径 (可用 apply_plan_file 执行)
+            
+        Returns:
+            变更计划 (无需同步时返回 None)
         """
         # 读取配置文件
         try:
@@ -1376,292 +4069,819 @@ class GitHubEnterpriseTeamSync:
         teams = config.get("teams", [])
         orgs = config.get("orgs", [])
         
+        # 收集所有 config 中的用户名 (用于后续清理 Enterprise，与本次同步哪些资源无关)
+        all_config_usernames = set()
+        for resource in orgs + teams:
+            all_config_usernames |= config_usernames(resource.get("members", []))
+        
+        # 增量模式：只同步期望状态发生变化的资源
+        hashes = resource_hashes(config)
+        state = SyncState.load(state_file) if state_file else None
+        selected = state.select(hashes, self.enterprise, full_sync_interval) if state and incremental else None
+        if incremental and state and selected is None:
+            print("🔁 没有可用的上次全量同步记录或已超过全量同步间隔，执行全量同步")
+        if selected is not None:
+            orgs = [o for o in orgs if f"org:{(o.get('login') or '').lower()}" in selected]
+            teams = [t for t in teams if f"team:{(t.get('name') or '').lower()}" in selected]
+            print(f"⚡ 增量同步: {len(selected)} 个资源的期望状态有变化")
+            if not selected:
+                print("✅ 配置与上次成功同步一致，无需同步")
+                if not dry_run:
+                    state.record(config, hashes, set(), set(), False, self.enterprise)
+                    state.save()
+                return None
+        
         print(f"\n🚀 开始同步 Enterprise: {self.enterprise}")
         if teams:
             print(f"📝 共需处理 {len(teams)} 个 Enterprise Team(s)")
         if orgs:
             print(f"📝 共需处理 {len(orgs)} 个 Organization(s)")
         
-        # 收集所有 config 中的用户名 (用于后续清理 Enterprise)
-        all_config_usernames = set()
-        
-        # 初始化报告中的 orgs 列表
-        if "orgs" not in self.report:
-            self.report["orgs"] = []
+        # 一次性读取 Enterprise 状态快照，供后续所有阶段共享
+        with self.phase("snapshot"):
+            self.snapshot = self.build_snapshot([t["name"] for t in teams if t.get("name")],
+                                                [o["login"] for o in orgs if o.get("login")])
         
-        # 同步每个 Organization
-        for org in orgs:
-            org_login = org.get("login")
-            members = org.get("members", [])
-            
-            if not org_login:
-                print("⚠️  跳过没有 login 的 organization")
-                continue
-            
-            # 收集该 org 的用户名
-            for member in members:
-                if isinstance(member, dict):
-                    username = member.get('username', '').strip()
-                    if username:
-                        all_config_usernames.add(username.lower())
-                elif isinstance(member, str) and not self.is_email(member):
-                    all_config_usernames.add(member.lower())
-            
-            org_report = self.sync_organization(org)
-            self.report["orgs"].append(org_report)
-        
-        # 同步每个 Team
-        for team in teams:
-            team_name = team.get("name")
-            members = team.get("members", [])
-            team_id = team.get("id")  # 可选的 team ID
-            team_slug = team.get("slug")  # 可选的 slug
-            
-            if not team_name:
-                print("⚠️  跳过没有名称的 team")
-                continue
-            
-            # 收集该 team 的用户名
-            for member in members:
-                if isinstance(member, dict):
-                    username = member.get('username', '').strip()
-                    if username:
-                        all_config_usernames.add(username.lower())
-                elif isinstance(member, str) and not self.is_email(member):
-                    all_config_usernames.add(member.lower())
-            
-            team_report = self.sync_team(team_name, members, team_id, team_slug)
-            self.report["teams"].append(team_report)
+        # 规划全部变更 (只读取)，Enterprise 成员清理仅在全量同步或清理范围有变化时规划
+        cleanup = selected is None or "enterprise" in selected
+        plan = self.build_plan(config, orgs, teams, all_config_usernames, cleanup=cleanup)
+        for line in summarize_plan(plan):
+            print(line)
+        if plan_out:
+            save_plan(plan, plan_out)
+            print(f"💾 变更计划已保存到: {plan_out}")
+        if dry_run:
+            print("\n🔍 dry-run: 未执行任何变更")
+            return plan
         
-        # 清理 Enterprise 成员：移除不在 reserved_members 和 teams 配置中的成员
-        self.cleanup_enterprise_members(config, all_config_usernames)
+        # 执行变更并生成报告
+        self.merge_result(self.apply_plan(plan), cleanup)
+        with self.phase("report"):
+            self.generate_report()
         
-        # 生成报告
-        self.generate_report()
+        if state:
+            synced = set(hashes) if selected is None else selected
+            cleanup_ok = self.snapshot.members_loaded and "enterprise" in synced
+            state.record(config, hashes, converged_resources(self.report, cleanup_ok), synced,
+                         selected is None, self.enterprise)
+            state.save()
+            print(f"💾 同步状态已保存到: {state_file}")
+        return plan
     
-    def cleanup_enterprise_members(self, config: Dict, all_config_usernames: Set[str]):
+    def plan_enterprise_cleanup(self, config: Dict, all_config_usernames: Set[str]) -> Dict:
         """
-        清理 Enterprise 成员：移除不在 reserved_members 和 teams 配置中的成员
+        规划 Enterprise 成员清理：找出不在 reserved_members 和 Organization / Team 配置中的成员
         
         Args:
             config: 配置字典
-            all_config_usernames: 所有 team 配置中的用户名集合 (小写)
+            all_config_usernames: 所有 Organization / Team 配置中的用户名集合 (小写)
+            
+        Returns:
+            清理计划 {removes: [用户名], skipped: 是否因无法获取成员列表而跳过}
         """
-        reserved_members = config.get("reserved_members", [])
-        
-        # 将 reserved_members 转换为小写集合
-        reserved_set = set()
-        for member in reserved_members:
-            if isinstance(member, str):
-                reserved_set.add(member.lower())
-            elif isinstance(member, dict):
-                username = member.get('username', '').strip()
-                if username:
-                    reserved_set.add(username.lower())
+        reserved_set = reserved_usernames(config.get("reserved_members", []))
         
         # 合并：保留的用户 = reserved_members + 所有 team 中的用户
         protected_users = reserved_set | all_config_usernames
         
-        print(f"\n{'='*60}")
-        print("🧹 清理 Enterprise 成员")
-        print(f"{'='*60}")
+        print(f"\n📋 规划 Enterprise 成员清理")
         print(f"  • 保留成员 (reserved_members): {len(reserved_set)}")
         if reserved_set:
             for u in sorted(reserved_set):
                 print(f"    - {u}")
         print(f"  • Teams 配置中的成员: {len(all_config_usernames)}")
         
-        # 获取当前 Enterprise 成员
-        success, enterprise_members = self.get_enterprise_members()
+        # 获取当前 Enterprise 成员 (优先使用本次运行的快照)
+        if self.snapshot:
+            success, enterprise_members = self.snapshot.members_loaded, self.snapshot.members
+        else:
+            success, enterprise_members = self.get_enterprise_members()
         if not success:
             print(f"  ⚠️  无法获取 Enterprise 成员列表，跳过清理")
-            return
+            return {"removes": [], "skipped": True}
         
         print(f"  • 当前 Enterprise 成员: {len(enterprise_members)}")
+        removes = sorted(login for key, login in enterprise_members.items() if key not in protected_users)
+        print(f"  • 需要从 Enterprise 移除: {len(removes)}")
+        return {"removes": removes, "skipped": False}
+    
+    def cleanup_enterprise_members(self, config: Dict, all_config_usernames: Set[str]):
+        """
+        清理 Enterprise 成员：移除不在 reserved_members 和 teams 配置中的成员 (规划后立即执行)
+        
+        Args:
+            config: 配置字典
+            all_config_usernames: 所有 team 配置中的用户名集合 (小写)
+        """
+        plan = self.new_plan()
+        plan["cleanup"] = self.plan_enterprise_cleanup(config, all_config_usernames)
+        self.merge_result(self.apply_plan(plan), cleanup=True)
+    
+    # ==================== 变更计划 ====================
+    
+    def new_plan(self) -> Dict:
+        """创建空的变更计划"""
+        return {
+            "version": PLAN_VERSION,
+            "enterprise": self.enterprise,
+            "created_at": datetime.now().isoformat(),
+            "orgs": [],
+            "teams": [],
+            "cleanup": None
+        }
+    
+    def build_plan(self, config: Dict, orgs: List[Dict], teams: List[Dict], all_config_usernames: Set[str],
+                   cleanup: bool = True) -> Dict:
+        """
+        基于本次运行的快照规划所有变更 (只读取，不做任何修改)
         
-        # 找出需要移除的成员
-        to_remove_from_enterprise = set()
-        for member in enterprise_members:
-            if member.lower() not in protected_users:
-                to_remove_from_enterprise.add(member)
+        Args:
+            config: 配置字典
+            orgs: 需要同步的 Organization 配置
+            teams: 需要同步的 Team 配置
+            all_config_usernames: 所有 Organization / Team 配置中的用户名集合 (小写)
+            cleanup: 是否规划 Enterprise 成员清理
+            
+        Returns:
+            可序列化为 JSON 的变更计划
+        """
+        print(f"\n{'='*60}")
+        print("📝 规划变更")
+        print(f"{'='*60}")
         
-        if not to_remove_from_enterprise:
-            print(f"\n  ✅ 无需移除任何成员")
-            return
+        plan = self.new_plan()
+        if any(not org.get("login") for org in orgs):
+            print("⚠️  跳过没有 login 的 organization")
+        if any(not team.get("name") for team in teams):
+            print("⚠️  跳过没有名称的 team")
         
-        print(f"\n  🗑️  需要从 Enterprise 移除: {len(to_remove_from_enterprise)} 人")
-        for username in sorted(to_remove_from_enterprise):
-            print(f"    - {username}")
+        # 各 Organization / Team 的读取互不依赖，按 resource_workers 并发规划
+        def org_fallback(org, error):
+            return {"login": org["login"], "admin": org.get("admin", ""), "billing_email": org.get("billing_email", ""),
+                    "create": False, "cancel_invitations": [], "invites": [], "pending": [], "removes": [],
+                    "errors": [error]}
         
-        # 初始化报告中的 enterprise_removed
-        if "enterprise_removed" not in self.report:
-            self.report["enterprise_removed"] = []
-        if "enterprise_remove_errors" not in self.report:
-            self.report["enterprise_remove_errors"] = []
+        def team_fallback(team, error):
+            return {"name": team["name"], "id": team.get("id"), "slug": team.get("slug"), "create": False,
+                    "adds": [], "cancel_invitations": [], "invites": [], "pending": [], "removes": [],
+                    "errors": [error]}
         
-        # 执行移除
-        print(f"\n  ➖ 从 Enterprise 移除成员...")
-        for username in to_remove_from_enterprise:
-            success, message = self.remove_from_enterprise(username)
+        with self.phase("plan_orgs"):
+            plan["orgs"] = self.run_per_resource(
+                [org for org in orgs if org.get("login")], self.plan_organization, org_fallback, phase="plan_orgs")
+        with self.phase("plan_teams"):
+            plan["teams"] = self.run_per_resource(
+                [team for team in teams if team.get("name")],
+                lambda team: self.plan_team(team["name"], team.get("members", []), team.get("id"), team.get("slug"),
+                                            invite_priority=team.get("invite_priority", 0)),
+                team_fallback, phase="plan_teams")
+        
+        if cleanup:
+            with self.phase("plan_cleanup"):
+                plan["cleanup"] = self.plan_enterprise_cleanup(config, all_config_usernames)
+        return plan
+    
+    def run_per_resource(self, items: List, fn: Callable, fallback: Callable, phase: Optional[str] = None) -> List:
+        """
+        对每个 Organization / Team 并发执行 fn (最多 resource_workers 个)，结果按输入顺序返回
+        
+        单个资源抛出异常时使用 fallback(item, 错误信息) 的结果，不影响其他资源。
+        
+        Args:
+            items: 资源配置列表
+            fn: 处理单个资源的函数
+            fallback: 出错时生成结果的函数
+            phase: 指定时每个资源作为子阶段 "{phase}/{login 或 name}" 通知 phase_listeners
+            
+        Returns:
+            结果列表
+        """
+        def guarded(item):
+            try:
+                if phase:
+                    with self.phase(f"{phase}/{item.get('login') or item.get('name')}"):
+                        return fn(item)
+                return fn(item)
+            except Exception as e:
+                print(f"  ❌ 处理 {item.get('login') or item.get('name')} 时出错: {e}")
+                return fallback(item, f"同步失败: {e}")
+        
+        if self.resource_workers == 1 or len(items) <= 1:
+            return [guarded(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.resource_workers, len(items))) as pool:
+            return list(pool.map(guarded, items))
+    
+    def apply_plan(self, plan: Dict) -> Dict:
+        """
+        执行变更计划
+        
+        执行顺序：创建 Organization / Team (按 resource_workers 并发) → 按邀请额度放行邀请 (其余延后) →
+        所有 Organization 和 Team 的成员变更 (同一个并发执行器) → 批量撤销旧的 Enterprise 邀请 →
+        发送 Enterprise 邀请 (同一邮箱只发送一次) → 批量从 Enterprise 移除成员 (必须在所有 Team 变更之后)。
+        
+        Args:
+            plan: 变更计划 (见 build_plan)
+            
+        Returns:
+            同步结果 {orgs: [Organization 报告], teams: [Team 报告], enterprise_removed, enterprise_remove_errors,
+            invite_quota: {范围: 剩余邀请数}}
+        """
+        result = {"orgs": [], "teams": [], "enterprise_removed": [], "enterprise_remove_errors": [], "invite_quota": {}}
+        
+        print(f"\n{'='*60}")
+        print("🚀 执行变更计划")
+        print(f"{'='*60}")
+        
+        with self.phase("apply"):
+            self._apply_changes(plan, result)
+            result["invite_quota"] = invite_quota_report(self.invitation_ledger,
+                                                         [org["login"] for org in plan.get("orgs", [])])
+        with self.phase("enterprise_cleanup"):
+            self._apply_enterprise_cleanup(plan, result)
+        return result
+    
+    def _apply_changes(self, plan: Dict, result: Dict):
+        """执行计划中的创建、成员变更和 Enterprise 邀请，结果写入 result (见 apply_plan)"""
+        tasks = []  # [((类型, 报告序号, 报告字段, 名称, 是否在 Enterprise 中), fn)]
+        batches = []  # [((报告序号, 报告字段, 动作, [(用户名, 是否在 Enterprise 中)]), fn)]
+        stale_invitations = {}  # invitation_id -> email
+        invites = {}  # email_lower -> {scope, identifier, priority, email, teams: [报告序号]}
+        org_invites = []  # [{scope, identifier, priority, index, invite, old_id}]
+        
+        # 1. 并发创建不存在的 Organization 和 Team
+        def create(entry):
+            if "login" in entry:
+                print(f"  📝 创建 Organization: {entry['login']}")
+                return self.create_organization(entry["login"], entry.get("admin", ""), entry.get("billing_email", ""))
+            print(f"  📝 创建 Team: {entry['name']}")
+            return self.create_enterprise_team(entry["name"])
+        
+        to_create = [entry for entry in plan.get("orgs", []) + plan.get("teams", [])
+                     if entry.get("create") and not entry.get("errors")]
+        created = self.run_per_resource(to_create, create, lambda entry, error: (False, error))
+        creations = {id(entry): outcome for entry, outcome in zip(to_create, created)}
+        
+        # 2. Organization：收集成员变更
+        for org in plan.get("orgs", []):
+            org_login = org["login"]
+            org_report = {"login": org_login, "added": [], "removed": [], "invited": [], "deferred": [],
+                          "pending": [p["username"] for p in org.get("pending", [])], "errors": list(org.get("errors", []))}
+            index = len(result["orgs"])
+            result["orgs"].append(org_report)
+            if org_report["errors"]:
+                continue
+            
+            if org.get("create"):
+                success, message = creations[id(org)]
+                if not success:
+                    error_msg = f"无法获取/创建 Organization: {message}"
+                    print(f"  ❌ {error_msg}")
+                    org_report["errors"].append(error_msg)
+                    continue
+            
+            old_invitations = {normalize_login(c["username"]): c["id"] for c in org.get("cancel_invitations", [])}
+            for invite in org.get("invites", []):
+                org_invites.append({"scope": f"org/{org_login.lower()}", "identifier": invite["email"] or invite["username"],
+                                    "priority": org.get("priority", 0), "index": index, "invite": invite,
+                                    "old_id": old_invitations.get(normalize_login(invite["username"]))})
+            for username in org.get("removes", []):
+                tasks.append((
+                    ("org", index, "removed", username, True),
+                    lambda org_login=org_login, username=username: self.remove_member_from_organization(org_login, username)
+                ))
+        
+        # 3. Team：收集成员变更和 Enterprise 邀请
+        for team in plan.get("teams", []):
+            team_report = {"name": team["name"], "id": team.get("id"), "slug": team.get("slug"),
+                           "added": [], "removed": [], "invited": [], "deferred": [],
+                           "pending": [p["email"] for p in team.get("pending", [])], "errors": list(team.get("errors", []))}
+            index = len(result["teams"])
+            result["teams"].append(team_report)
+            if team_report["errors"]:
+                continue
+            
+            if team.get("create"):
+                success, created_team = creations[id(team)]
+                if not success:
+                    print(f"  ❌ 创建 Team 失败: {created_team}")
+                    team_report["errors"].append(f"创建 Team 失败: {created_team}")
+                    continue
+                print(f"  ✅ 已创建 Team {team['name']} (ID: {created_team['id']}, slug: {created_team['slug']})")
+                team_report["id"] = created_team["id"]
+                team_report["slug"] = created_team["slug"]
+            
+            team_id = team_report["id"]
+            changes = (("added", "add", [(add["username"], add.get("in_enterprise", True)) for add in team.get("adds", [])]),
+                       ("removed", "remove", [(username, True) for username in team.get("removes", [])]))
+            for field, action, members in changes:
+                for start in range(0, len(members), self.TEAM_MEMBERSHIP_BATCH_SIZE):
+                    chunk = members[start:start + self.TEAM_MEMBERSHIP_BATCH_SIZE]
+                    batches.append((
+                        (index, field, action, chunk),
+                        lambda team_id=team_id, action=action, chunk=chunk:
+                            (True, self.bulk_update_team_members(team_id, action, [name for name, _ in chunk]))
+                    ))
+            for cancel in team.get("cancel_invitations", []):
+                stale_invitations[cancel["id"]] = cancel["email"]
+            for email in team.get("skipped_invites", []):
+                team_report["errors"].append(f"{email}: 无法完整获取 Enterprise 待处理邀请列表，跳过邀请")
+            for invite in team.get("invites", []):
+                candidate = invites.setdefault(invite["email"].lower(), {"scope": "enterprise", "identifier": invite["email"],
+                                                                         "priority": team.get("priority", 0),
+                                                                         "email": invite["email"], "teams": []})
+                candidate["priority"] = max(candidate["priority"], team.get("priority", 0))
+                candidate["teams"].append(index)
+        
+        # 邀请额度：按优先级放行剩余额度内的邀请，其余邀请 (以及其旧邀请) 留到之后的运行
+        # 放行的邀请按优先级顺序发送，服务端提前拒绝时优先级高的邀请已经发出
+        released, deferred = self.invitation_ledger.schedule(org_invites + list(invites.values()))
+        invites = {c["email"].lower(): c for c in released if c["scope"] == "enterprise"}
+        for candidate in deferred:
+            if candidate["scope"] == "enterprise":
+                for index in candidate["teams"]:
+                    result["teams"][index]["deferred"].append(candidate["email"])
+            else:
+                result["orgs"][candidate["index"]]["deferred"].append(candidate["invite"]["username"])
+        if deferred:
+            print(f"\n⏸️  邀请额度不足，{len(deferred)} 个邀请延后到之后的运行发送")
+        released_orgs = {(c["index"], c["invite"]["username"]): c for c in released if c["scope"] != "enterprise"}
+        for (index, username), candidate in released_orgs.items():
+            tasks.append((
+                ("org", index, "invited", username, True),
+                lambda org_login=result["orgs"][index]["login"], invite=candidate["invite"], old_id=candidate["old_id"]:
+                    self._reinvite_to_organization(org_login, invite, old_id)
+            ))
+        stale_invitations = {invitation_id: email for invitation_id, email in stale_invitations.items()
+                             if email.lower() in invites}
+        
+        # 4. Team 成员变更优先使用批量接口 (并发执行)，批量接口没有给出结果的用户改为逐个处理
+        outcomes = []
+        if batches:
+            print(f"\n⚙️  批量执行 {sum(len(key[3]) for key, _ in batches)} 个 Team 成员变更 ({len(batches)} 个批次)...")
+            for (index, field, action, chunk), success, results in self.executor.run(batches):
+                team_id = result["teams"][index]["id"]
+                for name, in_enterprise in chunk:
+                    key = ("team", index, field, name, in_enterprise)
+                    if success and name in results:
+                        outcomes.append((key, *results[name]))
+                    elif action == "add":
+                        tasks.append((key, lambda team_id=team_id, name=name: self.add_member_to_team(team_id, name)))
+                    else:
+                        tasks.append((key, lambda team_id=team_id, name=name: self.remove_member_from_team(team_id, name)))
+        
+        # 5. Organization 成员变更和逐个处理的 Team 成员变更 (并发执行)
+        if tasks:
+            print(f"\n⚙️  执行 {len(tasks)} 个成员变更...")
+            outcomes.extend(self.executor.run(tasks))
+        for (kind, index, field, name, in_enterprise), success, message in outcomes:
+            report = result["orgs" if kind == "org" else "teams"][index]
+            label = report.get("login") or report.get("name")
+            if success:
+                print(f"  ✅ [{label}] {name}: {message}")
+                report[field].append(name)
+            elif kind == "org" and field == "invited" and invitation_quota_error(message):
+                print(f"  ⏸️ [{label}] {name}: 邀请额度已用完，延后到之后的运行")
+                self.invitation_ledger.defer(released_orgs[(index, name)])
+                report["deferred"].append(name)
+            elif not in_enterprise and "cannot be found in the enterprise" in str(message).lower():
+                # 没有 email，无法邀请
+                print(f"  ⚠️ [{label}] {name}: 用户不在 Enterprise 中，且没有提供 email 无法发送邀请")
+                report["errors"].append(f"{name}: 用户不在 Enterprise 中，需要提供 email 才能发送邀请")
+            else:
+                print(f"  ❌ [{label}] {name}: {message}")
+                report["errors"].append(f"{name}: {message}")
+        
+        # 6. Enterprise 邀请：先批量撤销旧邀请，再并发发送新邀请
+        if stale_invitations:
+            print(f"\n🔄 {len(stale_invitations)} 个用户已有待处理邀请，先撤销旧邀请...")
+            for invitation_id, (success, message) in self.cancel_enterprise_invitations(list(stale_invitations)).items():
+                email = stale_invitations[invitation_id]
+                print(f"  ✅ {email}: {message}" if success else f"  ⚠️ {email}: {message}")
+        invite_results = self.executor.run([
+            (invite["email"], lambda email=invite["email"]: self.invite_to_enterprise(email))
+            for invite in invites.values()
+        ])
+        for (email, success, message), invite in zip(invite_results, invites.values()):
+            quota_exhausted = not success and invitation_quota_error(message)
             if success:
-                print(f"    ✅ {username}: {message}")
-                self.report["enterprise_removed"].append(username)
+                print(f"  📧 {email}: ✅ {message} (等待用户接受)")
+            elif quota_exhausted:
+                print(f"  📧 {email}: ⏸️ 邀请额度已用完，延后到之后的运行")
+                self.invitation_ledger.defer(invite)
             else:
-                print(f"    ❌ {username}: {message}")
-                self.report["enterprise_remove_errors"].append(f"{username}: {message}")
+                print(f"  📧 {email}: ❌ {message}")
+            for index in invite["teams"]:
+                if success:
+                    result["teams"][index]["invited"].append(email)
+                elif quota_exhausted:
+                    result["teams"][index]["deferred"].append(email)
+                else:
+                    result["teams"][index]["errors"].append(f"{email}: {message}")
+    
+    def _apply_enterprise_cleanup(self, plan: Dict, result: Dict):
+        """执行计划中的 Enterprise 成员清理 (必须在所有 Team 变更之后)，结果写入 result"""
+        cleanup = plan.get("cleanup") or {}
+        if cleanup.get("removes"):
+            print(f"\n➖ 从 Enterprise 移除 {len(cleanup['removes'])} 个成员...")
+            removed = self.remove_from_enterprise_batch(cleanup["removes"])
+            for username, (success, message) in sorted(removed.items()):
+                if success:
+                    print(f"  ✅ {username}: {message}")
+                    result["enterprise_removed"].append(username)
+                else:
+                    print(f"  ❌ {username}: {message}")
+                    result["enterprise_remove_errors"].append(f"{username}: {message}")
+    
+    def merge_result(self, result: Dict, cleanup: bool):
+        """把 apply_plan 的结果合并到本次运行的报告"""
+        self.report.setdefault("orgs", []).extend(result["orgs"])
+        self.report["teams"].extend(result["teams"])
+        self.report.setdefault("invite_quota", {}).update(result.get("invite_quota", {}))
+        if cleanup:
+            self.report.setdefault("enterprise_removed", []).extend(result["enterprise_removed"])
+            self.report.setdefault("enterprise_remove_errors", []).extend(result["enterprise_remove_errors"])
+    
+    def apply_plan_file(self, plan_file: str):
+        """
+        执行保存在文件中的变更计划 (由 --dry-run --plan-out 生成) 并生成报告
+        
+        Args:
+            plan_file: 变更计划 JSON 文件路径
+        """
+        try:
+            plan = load_plan(plan_file)
+        except Exception as e:
+            print(f"❌ 读取变更计划失败: {e}")
+            sys.exit(1)
+        if plan.get("enterprise") != self.enterprise:
+            print(f"❌ 变更计划的 enterprise ({plan.get('enterprise')}) 与当前 enterprise ({self.enterprise}) 不一致")
+            sys.exit(1)
+        
+        print(f"\n🚀 执行变更计划: {plan_file} (生成于 {plan.get('created_at')})")
+        for line in summarize_plan(plan):
+            print(line)
+        self.merge_result(self.apply_plan(plan), plan.get("cleanup") is not None)
+        self.generate_report()
     
     def generate_report(self):
         """生成并输出同步报告"""
-        print(f"\n\n{'='*60}")
-        print("📊 同步报告")
-        print(f"{'='*60}")
-        print(f"时间: {self.report['timestamp']}")
-        print(f"Enterprise: {self.report['enterprise']}")
-        print(f"{'='*60}\n")
+        render_report(self.report, self.rate_limiter.budget(), self.rate_limiter.total_wait)
+
+
+def render_report(report: Dict, budget: Optional[Dict] = None, total_wait: float = 0,
+                  report_file: str = "sync_report.txt"):
+    """
+    输出同步报告并保存到文件 (同步与异步引擎共用)
+    
+    Args:
+        report: 报告数据
+        budget: API 限额状态 {resource: {limit, remaining, reset}}
+        total_wait: 因速率限制累计等待的秒数
+        report_file: 报告文件路径
+    """
+    print(f"\n\n{'='*60}")
+    print("📊 同步报告")
+    print(f"{'='*60}")
+    print(f"时间: {report['timestamp']}")
+    print(f"Enterprise: {report['enterprise']}")
+    print(f"{'='*60}\n")
+    
+    report_lines = []
+    report_lines.append("=" * 60)
+    report_lines.append("GitHub Enterprise Team 成员同步报告")
+    report_lines.append("=" * 60)
+    report_lines.append(f"时间: {report['timestamp']}")
+    report_lines.append(f"Enterprise: {report['enterprise']}")
+    report_lines.append("=" * 60)
+    report_lines.append("")
+    
+    # Organization 报告
+    for org_report in report.get("orgs", []):
+        org_login = org_report.get("login", "unknown")
+        print(f"Organization: {org_login}")
+        report_lines.append(f"Organization: {org_login}")
+        report_lines.append("-" * 60)
+        
+        if org_report.get("added"):
+            print(f"\n  ✅ 成功添加 ({len(org_report['added'])} 人):")
+            report_lines.append(f"\n✅ 成功添加 ({len(org_report['added'])} 人):")
+            for member in org_report["added"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        if org_report.get("invited"):
+            print(f"\n  📧 已发送邀请 ({len(org_report['invited'])} 人):")
+            report_lines.append(f"\n📧 已发送邀请 ({len(org_report['invited'])} 人):")
+            for member in org_report["invited"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        if org_report.get("pending"):
+            print(f"\n  ⏳ 等待接受 (保留未过期邀请，{len(org_report['pending'])} 人):")
+            report_lines.append(f"\n⏳ 等待接受 (保留未过期邀请，{len(org_report['pending'])} 人):")
+            for member in org_report["pending"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        if org_report.get("deferred"):
+            print(f"\n  ⏸️  延后邀请 (邀请额度不足，之后的运行继续发送，{len(org_report['deferred'])} 人):")
+            report_lines.append(f"\n⏸️ 延后邀请 (邀请额度不足，之后的运行继续发送，{len(org_report['deferred'])} 人):")
+            for member in org_report["deferred"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        if org_report.get("removed"):
+            print(f"\n  ➖ 已移除 ({len(org_report['removed'])} 人):")
+            report_lines.append(f"\n➖ 已移除 ({len(org_report['removed'])} 人):")
+            for member in org_report["removed"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        if org_report.get("errors"):
+            print(f"\n  ❌ 错误 ({len(org_report['errors'])} 个):")
+            report_lines.append(f"\n❌ 错误 ({len(org_report['errors'])} 个):")
+            for error in org_report["errors"]:
+                print(f"     • {error}")
+                report_lines.append(f"  • {error}")
+        
+        print("")
+        report_lines.append("")
+        report_lines.append("")
+    
+    # Team 报告
+    for team_report in report.get("teams", []):
+        team_name = team_report["name"]
+        print(f"Team: {team_name}")
+        report_lines.append(f"Team: {team_name}")
+        report_lines.append("-" * 60)
         
-        report_lines = []
+        # 成功添加的成员
+        if team_report["added"]:
+            print(f"\n  ✅ 成功添加到 Team ({len(team_report['added'])} 人):")
+            report_lines.append(f"\n✅ 成功添加到 Team ({len(team_report['added'])} 人):")
+            for member in team_report["added"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        # 发送邀请的成员
+        if team_report["invited"]:
+            print(f"\n  📧 已发送 Enterprise 邀请 ({len(team_report['invited'])} 人):")
+            print(f"     (这些用户需要先接受邀请加入 Enterprise)")
+            report_lines.append(f"\n📧 已发送 Enterprise 邀请 ({len(team_report['invited'])} 人):")
+            report_lines.append("  (这些用户需要先接受邀请加入 Enterprise)")
+            for member in team_report["invited"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        # 仍在等待接受的邀请 (未过期，本次没有重新发送)
+        if team_report.get("pending"):
+            print(f"\n  ⏳ 等待接受 Enterprise 邀请 (保留未过期邀请，{len(team_report['pending'])} 人):")
+            report_lines.append(f"\n⏳ 等待接受 Enterprise 邀请 (保留未过期邀请，{len(team_report['pending'])} 人):")
+            for member in team_report["pending"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        # 因邀请额度不足延后的邀请 (不是失败)
+        if team_report.get("deferred"):
+            print(f"\n  ⏸️  延后 Enterprise 邀请 (邀请额度不足，之后的运行继续发送，{len(team_report['deferred'])} 人):")
+            report_lines.append(f"\n⏸️ 延后 Enterprise 邀请 (邀请额度不足，之后的运行继续发送，{len(team_report['deferred'])} 人):")
+            for member in team_report["deferred"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        # 移除的成员
+        if team_report["removed"]:
+            print(f"\n  ➖ 从 Team 移除 ({len(team_report['removed'])} 人):")
+            report_lines.append(f"\n➖ 从 Team 移除 ({len(team_report['removed'])} 人):")
+            for member in team_report["removed"]:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        # 错误
+        if team_report["errors"]:
+            print(f"\n  ❌ 错误 ({len(team_report['errors'])} 个):")
+            report_lines.append(f"\n❌ 错误 ({len(team_report['errors'])} 个):")
+            for error in team_report["errors"]:
+                print(f"     • {error}")
+                report_lines.append(f"  • {error}")
+        
+        print("")
+        report_lines.append("")
+        report_lines.append("")
+    
+    # Enterprise 成员移除报告
+    enterprise_removed = report.get("enterprise_removed", [])
+    enterprise_remove_errors = report.get("enterprise_remove_errors", [])
+    
+    if enterprise_removed or enterprise_remove_errors:
+        print(f"{'='*60}")
+        print("Enterprise 成员清理")
+        print(f"{'='*60}")
         report_lines.append("=" * 60)
-        report_lines.append("GitHub Enterprise Team 成员同步报告")
+        report_lines.append("Enterprise 成员清理")
+        report_lines.append("-" * 60)
+        
+        if enterprise_removed:
+            print(f"\n  🗑️  从 Enterprise 移除 ({len(enterprise_removed)} 人):")
+            report_lines.append(f"\n🗑️ 从 Enterprise 移除 ({len(enterprise_removed)} 人):")
+            for member in enterprise_removed:
+                print(f"     • {member}")
+                report_lines.append(f"  • {member}")
+        
+        if enterprise_remove_errors:
+            print(f"\n  ❌ 移除失败 ({len(enterprise_remove_errors)} 个):")
+            report_lines.append(f"\n❌ 移除失败 ({len(enterprise_remove_errors)} 个):")
+            for error in enterprise_remove_errors:
+                print(f"     • {error}")
+                report_lines.append(f"  • {error}")
+        
+        print("")
+        report_lines.append("")
+    
+    # 邀请额度 (延后的邀请由之后的运行继续发送)
+    if report.get("invite_quota"):
+        print(f"{'='*60}")
+        print("邀请剩余额度 (24 小时窗口)")
+        print(f"{'='*60}")
         report_lines.append("=" * 60)
-        report_lines.append(f"时间: {self.report['timestamp']}")
-        report_lines.append(f"Enterprise: {self.report['enterprise']}")
+        report_lines.append("邀请剩余额度 (24 小时窗口)")
+        report_lines.append("-" * 60)
+        for scope, remaining in sorted(report["invite_quota"].items()):
+            print(f"  • {scope}: {remaining}")
+            report_lines.append(f"  • {scope}: {remaining}")
+        print("")
+        report_lines.append("")
+    
+    # API 限额使用情况
+    if budget:
+        print(f"{'='*60}")
+        print("API 剩余额度")
+        print(f"{'='*60}")
         report_lines.append("=" * 60)
+        report_lines.append("API 剩余额度")
+        report_lines.append("-" * 60)
+        for resource, bucket in sorted(budget.items()):
+            reset = datetime.fromtimestamp(bucket["reset"]).strftime("%H:%M:%S") if bucket.get("reset") else "N/A"
+            line = f"{resource}: {bucket.get('remaining')}/{bucket.get('limit')} (重置时间: {reset})"
+            print(f"  • {line}")
+            report_lines.append(f"  • {line}")
+        if total_wait:
+            line = f"因速率限制累计等待: {total_wait:.0f} 秒"
+            print(f"  • {line}")
+            report_lines.append(f"  • {line}")
+        print("")
         report_lines.append("")
+    
+    # 保存报告到文件
+    try:
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(report_lines))
+        print(f"📄 报告已保存到: {report_file}")
+    except Exception as e:
+        print(f"⚠️  保存报告失败: {e}")
+
+
+def build_arg_parser(description: str, plan_options: bool = True) -> argparse.ArgumentParser:
+    """
+    构建命令行参数解析器 (同步与异步引擎共用)
+    
+    位置参数 config_file / token 与环境变量 CONFIG_FILE / GITHUB_TOKEN 保持原有用法。
+    
+    Args:
+        description: 命令行帮助中的描述
+        plan_options: 是否包含变更计划相关参数 (--dry-run / --plan-out / --apply-plan)
         
-        # Organization 报告
-        for org_report in self.report.get("orgs", []):
-            org_login = org_report.get("login", "unknown")
-            print(f"Organization: {org_login}")
-            report_lines.append(f"Organization: {org_login}")
-            report_lines.append("-" * 60)
-            
-            if org_report.get("added"):
-                print(f"\n  ✅ 成功添加 ({len(org_report['added'])} 人):")
-                report_lines.append(f"\n✅ 成功添加 ({len(org_report['added'])} 人):")
-                for member in org_report["added"]:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            if org_report.get("invited"):
-                print(f"\n  📧 已发送邀请 ({len(org_report['invited'])} 人):")
-                report_lines.append(f"\n📧 已发送邀请 ({len(org_report['invited'])} 人):")
-                for member in org_report["invited"]:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            if org_report.get("removed"):
-                print(f"\n  ➖ 已移除 ({len(org_report['removed'])} 人):")
-                report_lines.append(f"\n➖ 已移除 ({len(org_report['removed'])} 人):")
-                for member in org_report["removed"]:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            if org_report.get("errors"):
-                print(f"\n  ❌ 错误 ({len(org_report['errors'])} 个):")
-                report_lines.append(f"\n❌ 错误 ({len(org_report['errors'])} 个):")
-                for error in org_report["errors"]:
-                    print(f"     • {error}")
-                    report_lines.append(f"  • {error}")
-            
-            print("")
-            report_lines.append("")
-            report_lines.append("")
-        
-        # Team 报告
-        for team_report in self.report["teams"]:
-            team_name = team_report["name"]
-            print(f"Team: {team_name}")
-            report_lines.append(f"Team: {team_name}")
-            report_lines.append("-" * 60)
-            
-            # 成功添加的成员
-            if team_report["added"]:
-                print(f"\n  ✅ 成功添加到 Team ({len(team_report['added'])} 人):")
-                report_lines.append(f"\n✅ 成功添加到 Team ({len(team_report['added'])} 人):")
-                for member in team_report["added"]:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            # 发送邀请的成员
-            if team_report["invited"]:
-                print(f"\n  📧 已发送 Enterprise 邀请 ({len(team_report['invited'])} 人):")
-                print(f"     (这些用户需要先接受邀请加入 Enterprise)")
-                report_lines.append(f"\n📧 已发送 Enterprise 邀请 ({len(team_report['invited'])} 人):")
-                report_lines.append("  (这些用户需要先接受邀请加入 Enterprise)")
-                for member in team_report["invited"]:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            # 移除的成员
-            if team_report["removed"]:
-                print(f"\n  ➖ 从 Team 移除 ({len(team_report['removed'])} 人):")
-                report_lines.append(f"\n➖ 从 Team 移除 ({len(team_report['removed'])} 人):")
-                for member in team_report["removed"]:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            # 错误
-            if team_report["errors"]:
-                print(f"\n  ❌ 错误 ({len(team_report['errors'])} 个):")
-                report_lines.append(f"\n❌ 错误 ({len(team_report['errors'])} 个):")
-                for error in team_report["errors"]:
-                    print(f"     • {error}")
-                    report_lines.append(f"  • {error}")
-            
-            print("")
-            report_lines.append("")
-            report_lines.append("")
-        
-        # Enterprise 成员移除报告
-        enterprise_removed = self.report.get("enterprise_removed", [])
-        enterprise_remove_errors = self.report.get("enterprise_remove_errors", [])
-        
-        if enterprise_removed or enterprise_remove_errors:
-            print(f"{'='*60}")
-            print("Enterprise 成员清理")
-            print(f"{'='*60}")
-            report_lines.append("=" * 60)
-            report_lines.append("Enterprise 成员清理")
-            report_lines.append("-" * 60)
-            
-            if enterprise_removed:
-                print(f"\n  🗑️  从 Enterprise 移除 ({len(enterprise_removed)} 人):")
-                report_lines.append(f"\n🗑️ 从 Enterprise 移除 ({len(enterprise_removed)} 人):")
-                for member in enterprise_removed:
-                    print(f"     • {member}")
-                    report_lines.append(f"  • {member}")
-            
-            if enterprise_remove_errors:
-                print(f"\n  ❌ 移除失败 ({len(enterprise_remove_errors)} 个):")
-                report_lines.append(f"\n❌ 移除失败 ({len(enterprise_remove_errors)} 个):")
-                for error in enterprise_remove_errors:
-                    print(f"     • {error}")
-                    report_lines.append(f"  • {error}")
-            
-            print("")
-            report_lines.append("")
-        
-        # 保存报告到文件
-        report_file = "sync_report.txt"
+    Returns:
+        参数解析器
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("config_file", nargs="?", default=os.environ.get("CONFIG_FILE", "config.json"),
+                        help="配置文件路径 (默认: $CONFIG_FILE 或 config.json)")
+    parser.add_argument("token", nargs="?", default=os.environ.get("GITHUB_TOKEN"),
+                        help="GitHub Token (默认: $GITHUB_TOKEN)")
+    parser.add_argument("--state-file", default=os.environ.get("SYNC_STATE_FILE"),
+                        help="同步状态文件路径，记录每个资源上次成功同步时的期望状态 (默认: $SYNC_STATE_FILE)")
+    parser.add_argument("--incremental", action="store_true",
+                        default=os.environ.get("SYNC_INCREMENTAL", "").lower() in ("1", "true", "yes"),
+                        help="只同步期望状态有变化的 Organization / Team (未指定 --state-file 时使用 sync_state.json)")
+    parser.add_argument("--full-sync-interval", type=float,
+                        default=float(os.environ.get("SYNC_FULL_SYNC_INTERVAL_HOURS",
+                                                     GitHubEnterpriseTeamSync.DEFAULT_FULL_SYNC_INTERVAL / 3600)),
+                        help="增量模式下的全量同步间隔 (小时，默认 24)，用于纠正配置之外的改动")
+    parser.add_argument("--invitation-ledger", default=os.environ.get("SYNC_INVITATION_LEDGER"),
+                        help="本地邀请记录文件路径 (默认: $SYNC_INVITATION_LEDGER，设置了 $SYNC_CACHE_DIR 时为其中的 "
+                             "invitation_ledger.json)")
+    parser.add_argument("--invitation-reissue-days", type=float,
+                        default=float(os.environ.get("SYNC_INVITATION_REISSUE_DAYS",
+                                                     InvitationLedger.DEFAULT_REISSUE_AGE / 86400)),
+                        help="待处理邀请超过该天数后才撤销并重新发送 (默认 7，0 表示每次运行都重新发送)")
+    parser.add_argument("--invite-quota", type=int,
+                        default=int(os.environ.get("SYNC_INVITE_QUOTA", InvitationLedger.DEFAULT_QUOTA)),
+                        help="每个 Organization / Enterprise 每 24 小时最多发送的邀请数 (默认 500，0 表示不限制)，"
+                             "超出的邀请按优先级排队，由之后的运行继续发送")
+    parser.add_argument("--metrics-out", default=os.environ.get("SYNC_METRICS_FILE"),
+                        help="运行结束后将按接口汇总的请求指标写入 JSON 文件 (默认: $SYNC_METRICS_FILE)")
+    parser.add_argument("--prometheus-file", default=os.environ.get("SYNC_PROMETHEUS_FILE"),
+                        help="运行结束后写入 Prometheus textfile collector 文件 (*.prom，默认: $SYNC_PROMETHEUS_FILE)")
+    if plan_options:
+        parser.add_argument("--dry-run", action="store_true",
+                            help="只读取当前状态并输出变更计划，不执行任何修改")
+        parser.add_argument("--plan-out", help="将变更计划保存为 JSON 文件")
+        parser.add_argument("--apply-plan", metavar="PLAN_FILE",
+                            help="执行之前保存的变更计划 (不重新规划)")
+    return parser
+
+
+def retry_policy_from_env() -> RetryPolicy:
+    """
+    根据环境变量 SYNC_MAX_RETRIES / SYNC_RETRY_BUDGET 创建重试策略 (同步与异步引擎共用)
+    
+    Returns:
+        重试策略
+    """
+    return RetryPolicy(max_retries=int(os.environ.get("SYNC_MAX_RETRIES", RetryPolicy.DEFAULT_MAX_RETRIES)),
+                       budget=int(os.environ.get("SYNC_RETRY_BUDGET", RetryPolicy.DEFAULT_BUDGET)))
+
+
+def invitation_ledger_from_args(args: argparse.Namespace, cache_dir: Optional[str] = None) -> InvitationLedger:
+    """
+    根据命令行参数创建本地邀请记录 (同步与异步引擎共用)
+    
+    Args:
+        args: build_arg_parser 解析出的参数
+        cache_dir: 缓存目录 ($SYNC_CACHE_DIR)，未指定 --invitation-ledger 时记录文件放在其中
+        
+    Returns:
+        邀请记录；既没有指定文件也没有缓存目录时只在本次运行内记录
+    """
+    path = args.invitation_ledger or (os.path.join(cache_dir, "invitation_ledger.json") if cache_dir else None)
+    options = {"reissue_age": args.invitation_reissue_days * 86400, "quota": args.invite_quota}
+    return InvitationLedger.load(path, **options) if path else InvitationLedger(**options)
+
+
+def save_invitation_ledger(ledger: InvitationLedger):
+    """写入本地邀请记录，失败时只输出警告"""
+    try:
+        ledger.save()
+    except OSError as e:
+        print(f"⚠️  写入邀请记录失败 ({ledger.path}): {e}")
+
+
+def export_metrics(metrics: RequestMetrics, rate_limiter: RateLimitScheduler, metrics_file: Optional[str] = None,
+                   prometheus_file: Optional[str] = None):
+    """
+    导出请求指标 (同步与异步引擎共用)，写入失败只输出警告，不影响同步结果
+    
+    Args:
+        metrics: 请求指标
+        rate_limiter: 速率限制调度器
+        metrics_file: JSON 摘要文件路径
+        prometheus_file: Prometheus textfile collector 文件路径
+    """
+    for path, write in ((metrics_file, metrics.write_json), (prometheus_file, metrics.write_prometheus)):
+        if not path:
+            continue
         try:
-            with open(report_file, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(report_lines))
-            print(f"📄 报告已保存到: {report_file}")
-        except Exception as e:
-            print(f"⚠️  保存报告失败: {e}")
+            write(path, rate_limiter)
+            print(f"📈 请求指标已保存到: {path}")
+        except OSError as e:
+            print(f"⚠️  写入请求指标失败 ({path}): {e}")
 
 
 def main():
     """主函数"""
-    # 从环境变量或参数获取配置
-    token = os.environ.get("GITHUB_TOKEN","xxx")
-    config_file = os.environ.get("CONFIG_FILE", "config.json")
+    parser = build_arg_parser("GitHub Enterprise Team 同步工具")
+    parser.add_argument("--profile", action="store_true",
+                        help="记录各阶段及每个 Organization / Team 的耗时，结束后输出热点报告")
+    parser.add_argument("--profile-cpu", action="store_true",
+                        help="同时用 cProfile 采集各阶段的函数耗时 (隐含 --profile；同步改为串行执行)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="同时用 tracemalloc 采集各阶段的内存分配 (隐含 --profile；运行明显变慢)")
+    parser.add_argument("--profile-dir", default="profile",
+                        help="性能分析报告和 .prof 文件的输出目录 (默认: profile)")
+    args = parser.parse_args()
+    token = args.token
+    config_file = args.config_file
+    state_file = args.state_file or ("sync_state.json" if args.incremental else None)
+    
+    # 从环境变量获取可选配置
+    pool_size = int(os.environ.get("HTTP_POOL_SIZE", GitHubEnterpriseTeamSync.DEFAULT_POOL_SIZE))
+    timeout = float(os.environ.get("HTTP_TIMEOUT", GitHubEnterpriseTeamSync.DEFAULT_TIMEOUT))
+    resolve_missing_emails = os.environ.get("RESOLVE_MISSING_EMAILS", "").lower() in ("1", "true", "yes")
+    max_workers = int(os.environ.get("SYNC_MAX_WORKERS", GitHubEnterpriseTeamSync.DEFAULT_MAX_WORKERS))
+    resource_workers = int(os.environ.get("SYNC_RESOURCE_WORKERS", GitHubEnterpriseTeamSync.DEFAULT_RESOURCE_WORKERS))
+    base_url = os.environ.get("GITHUB_API_URL", GitHubEnterpriseTeamSync.DEFAULT_BASE_URL)
+    graphql_url = os.environ.get("GITHUB_GRAPHQL_URL")
+    cache_dir = os.environ.get("SYNC_CACHE_DIR")
+    cache_ttl = float(os.environ.get("SYNC_CACHE_TTL", IdentityCache.DEFAULT_TTL))
     
-    # 命令行参数
-    if len(sys.argv) > 1:
-        config_file = sys.argv[1]
-    if len(sys.argv) > 2:
-        token = sys.argv[2]
+    profiler = None
+    if args.profile or args.profile_cpu or args.profile_memory:
+        profiler = SyncProfiler(cpu=args.profile_cpu, memory=args.profile_memory)
+        if args.profile_cpu:
+            # cProfile 只跟踪当前线程，串行执行才能看到全部调用 (耗时会比并发运行长)
+            max_workers = resource_workers = 1
+            print("🔬 CPU 性能分析模式: 串行执行同步")
     
     if not token:
         print("❌ 错误: 未提供 GitHub Token")
@@ -1687,8 +4907,37 @@ def main():
         sys.exit(1)
     
     # 创建同步器并执行
-    syncer = GitHubEnterpriseTeamSync(token, enterprise)
-    syncer.sync_from_config(config_file)
+    identity_cache = None
+    response_cache = None
+    if cache_dir:
+        identity_cache = IdentityCache(os.path.join(cache_dir, "identity_cache.sqlite"),
+                                       namespace=base_url, ttl=cache_ttl)
+        response_cache = ResponseCache(os.path.join(cache_dir, "response_cache.sqlite"), token=token)
+    syncer = GitHubEnterpriseTeamSync(token, enterprise, pool_size=pool_size, timeout=timeout,
+                                      resolve_missing_emails=resolve_missing_emails, max_workers=max_workers,
+                                      base_url=base_url, graphql_url=graphql_url, identity_cache=identity_cache,
+                                      response_cache=response_cache, resource_workers=resource_workers,
+                                      retry_policy=retry_policy_from_env(),
+                                      invitation_ledger=invitation_ledger_from_args(args, cache_dir))
+    if profiler:
+        syncer.phase_listeners.append(profiler)
+    try:
+        if args.apply_plan:
+            syncer.apply_plan_file(args.apply_plan)
+        else:
+            syncer.sync_from_config(config_file, state_file=state_file, incremental=args.incremental,
+                                    full_sync_interval=args.full_sync_interval * 3600,
+                                    dry_run=args.dry_run, plan_out=args.plan_out)
+    finally:
+        export_metrics(syncer.metrics, syncer.rate_limiter, args.metrics_out, args.prometheus_file)
+        if not args.dry_run:
+            save_invitation_ledger(syncer.invitation_ledger)
+        syncer.close()
+        if profiler:
+            profiler.stop()
+            print(profiler.report())
+            for path in profiler.save(args.profile_dir):
+                print(f"💾 性能分析结果已保存到: {path}")
     # test =syncer.add_member_to_team("test", "nikawang")
 
 
@@ -0,0 +1,6 @@
+"""测试公共配置：让测试可以直接导入 sync_team / async_sync / fake_github"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
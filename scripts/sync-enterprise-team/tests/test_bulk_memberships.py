@@ -0,0 +1,114 @@
+"""Team 批量成员接口及其逐个处理回退的测试"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+import requests
+
+from benchmark import BenchmarkSync
+from fake_github import FakeEnterprise, FakeGitHubApp, make_server
+from sync_team import parse_bulk_memberships
+
+BULK_ADD = ("POST", "/enterprises/{enterprise}/teams/{team_id}/memberships/add")
+BULK_REMOVE = ("POST", "/enterprises/{enterprise}/teams/{team_id}/memberships/remove")
+SINGLE_ADD = ("PUT", "/enterprises/{enterprise}/teams/{team_id}/memberships/{username}")
+SINGLE_REMOVE = ("DELETE", "/enterprises/{enterprise}/teams/{team_id}/memberships/{username}")
+
+
+def test_parse_bulk_memberships():
+    data = [{"login": "Alice"}, {"login": "mallory"}, {"id": 3}, "bob", {"login": "CAROL"}]
+    assert parse_bulk_memberships(data, ["alice", "Bob", "carol"]) == {"alice", "carol"}
+    assert parse_bulk_memberships({"message": "Validation Failed"}, ["alice"]) == set()
+    assert parse_bulk_memberships(None, ["alice"]) == set()
+
+
+@pytest.fixture
+def enterprise():
+    return FakeEnterprise.seed(users=30, teams=1, team_size=5, orgs=0)
+
+
+def first_team(enterprise):
+    return next(iter(enterprise.teams.values()))
+
+
+def test_bulk_results_only_for_processed_users(enterprise):
+    app = FakeGitHubApp(enterprise)
+    syncer = BenchmarkSync(app, "token", enterprise.slug)
+    team = first_team(enterprise)
+    outsider = next(login for login in sorted(enterprise.members) if login not in team["members"])
+    results = syncer.bulk_update_team_members(team["id"], "add", [outsider, "ghost"])
+    syncer.close()
+    # 不在 Enterprise 中的用户不在结果里，由调用方逐个处理
+    assert results == {outsider: (True, "已添加到 Team")}
+    assert outsider in team["members"]
+
+
+class UnavailableBulkSync(BenchmarkSync):
+    """批量成员接口返回指定状态码的同步器"""
+
+    def __init__(self, status, *args, **kwargs):
+        self.bulk_status = status
+        super().__init__(*args, **kwargs)
+
+    def _send(self, method, url, idempotent=None, **kwargs):
+        if method == "POST" and "/memberships/" in url:
+            self.app.requests[BULK_ADD if url.endswith("/add") else BULK_REMOVE] += 1
+            response = requests.Response()
+            response.status_code = self.bulk_status
+            response._content = b'{"message": "Not Found"}'
+            return response
+        return super()._send(method, url, idempotent=idempotent, **kwargs)
+
+
+@pytest.mark.parametrize("status", [404, 405, 410])
+def test_unavailable_bulk_endpoint_is_disabled_for_the_run(enterprise, status):
+    app = FakeGitHubApp(enterprise)
+    syncer = UnavailableBulkSync(status, app, "token", enterprise.slug)
+    team = first_team(enterprise)
+    assert syncer.bulk_update_team_members(team["id"], "add", ["user00001"]) == {}
+    assert syncer.bulk_update_team_members(team["id"], "remove", ["user00002"]) == {}
+    syncer.close()
+    assert syncer.bulk_team_memberships is False
+    assert app.requests[BULK_ADD] == 1
+    assert app.requests[BULK_REMOVE] == 0
+
+
+def write_config(enterprise, path):
+    team = first_team(enterprise)
+    current = sorted(team["members"])
+    additions = [login for login in sorted(enterprise.members) if login not in team["members"]][:4]
+    members = current[2:] + additions
+    path.write_text(json.dumps({"enterprise": enterprise.slug, "reserved_members": sorted(enterprise.members),
+                                "teams": [{"name": team["name"], "members": members}]}), encoding="utf-8")
+    return set(members)
+
+
+def test_sync_falls_back_to_single_memberships(enterprise, tmp_path):
+    wanted = write_config(enterprise, tmp_path / "config.json")
+    app = FakeGitHubApp(enterprise, bulk_memberships=False)
+    syncer = BenchmarkSync(app, "token", enterprise.slug)
+    syncer.sync_from_config(str(tmp_path / "config.json"))
+    syncer.close()
+    assert first_team(enterprise)["members"] == wanted
+    assert app.requests[BULK_ADD] + app.requests[BULK_REMOVE] == 1
+    assert (app.requests[SINGLE_ADD], app.requests[SINGLE_REMOVE]) == (4, 2)
+
+
+def test_async_sync_falls_back_to_single_memberships(enterprise, tmp_path):
+    async_sync = pytest.importorskip("async_sync")
+    wanted = write_config(enterprise, tmp_path / "config.json")
+    app = FakeGitHubApp(enterprise, bulk_memberships=False)
+    server = make_server(app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        asyncio.run(async_sync.run("token", enterprise.slug, str(tmp_path / "config.json"), url))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert first_team(enterprise)["members"] == wanted
+    assert app.requests[SINGLE_ADD] == 4 and app.requests[SINGLE_REMOVE] == 2
+    # 两个方向的批量请求并发发出，都返回 404 后不再使用批量接口
+    assert app.requests[BULK_ADD] + app.requests[BULK_REMOVE] <= 2
@@ -0,0 +1,78 @@
+"""在注入 5% 瞬时错误的 fake_github 上验证两个引擎都能收敛"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+import sync_team
+from fake_github import FakeEnterprise, FakeGitHubApp, make_server
+from sync_team import RetryPolicy
+
+
+@pytest.fixture
+def fake_github():
+    """启动注入 5% 502 错误的模拟服务器，返回 (Enterprise, 应用, 地址)"""
+    enterprise = FakeEnterprise.seed(users=500, teams=4, team_size=20, orgs=1, org_size=30, pending_invitations=20)
+    app = FakeGitHubApp(enterprise, error_rate=0.05, seed=1)
+    server = make_server(app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield enterprise, app, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def write_config(enterprise: FakeEnterprise, path) -> dict:
+    """生成需要添加 / 移除成员、新建 Team 的配置"""
+    members = sorted(enterprise.members)
+    teams = [{"name": team["name"],
+              "members": [{"username": m, "email": f"{m}@example.com"} for m in sorted(team["members"])[3:] + members[:3]]}
+             for team in sorted(enterprise.teams.values(), key=lambda t: t["id"])]
+    teams.append({"name": "brand-new", "members": [{"username": members[10], "email": ""}]})
+    org = next(iter(enterprise.orgs.values()))
+    config = {"enterprise": enterprise.slug, "reserved_members": members,
+              "orgs": [{"login": org["login"], "admin": members[0], "billing_email": "billing@example.com",
+                        "members": [{"username": m, "email": ""} for m in sorted(org["members"])[3:]]}],
+              "teams": teams}
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return config
+
+
+def assert_converged(enterprise: FakeEnterprise, config: dict):
+    for wanted in config["teams"]:
+        team = next(t for t in enterprise.teams.values() if t["name"] == wanted["name"])
+        assert team["members"] == {m["username"].lower() for m in wanted["members"]}
+    org = enterprise.orgs[config["orgs"][0]["login"]]
+    assert set(org["members"]) == {m["username"].lower() for m in config["orgs"][0]["members"]}
+
+
+def test_sync_engine_converges_with_transient_errors(fake_github, tmp_path, capsys):
+    enterprise, app, url = fake_github
+    config = write_config(enterprise, tmp_path / "config.json")
+    sleeps = []
+    policy = RetryPolicy(budget=1000, random_func=lambda: 1.0, sleep=sleeps.append, base_delay=0.001)
+
+    syncer = sync_team.GitHubEnterpriseTeamSync("token", enterprise.slug, base_url=url, retry_policy=policy)
+    syncer.sync_from_config(str(tmp_path / "config.json"))
+    syncer.close()
+
+    assert_converged(enterprise, config)
+    assert "❌" not in capsys.readouterr().out
+    assert app.injected_errors > 0
+    assert policy.used >= app.injected_errors and policy.denied == 0
+    assert len(sleeps) == policy.used
+
+
+def test_async_engine_converges_with_transient_errors(fake_github, tmp_path, capsys):
+    async_sync = pytest.importorskip("async_sync")
+    enterprise, app, url = fake_github
+    config = write_config(enterprise, tmp_path / "config.json")
+    policy = RetryPolicy(budget=1000, random_func=lambda: 0.0)
+
+    asyncio.run(async_sync.run("token", enterprise.slug, str(tmp_path / "config.json"), url, retry_policy=policy))
+
+    assert_converged(enterprise, config)
+    assert "❌" not in capsys.readouterr().out
+    assert app.injected_errors > 0
+    assert policy.used >= app.injected_errors and policy.denied == 0
@@ -0,0 +1,154 @@
+"""InvitationLedger 邀请额度调度的测试"""
+
+import pytest
+
+from sync_team import InvitationLedger, invite_quota_report
+
+HOUR = 3600
+
+
+class Clock:
+    """可手动拨动的时钟"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def candidate(identifier, priority=0, scope="enterprise"):
+    return {"scope": scope, "identifier": identifier, "priority": priority}
+
+
+def identifiers(candidates):
+    return [c["identifier"] for c in candidates]
+
+
+def test_schedule_releases_by_priority(clock):
+    ledger = InvitationLedger(clock=clock, quota=2)
+    released, deferred = ledger.schedule([candidate("a@x"), candidate("b@x", priority=5), candidate("c@x")])
+    assert identifiers(released) == ["b@x", "a@x"]
+    assert identifiers(deferred) == ["c@x"]
+    assert list(ledger.data["queue"]) == ["enterprise:c@x"]
+    assert ledger.remaining("enterprise") == 0
+
+
+def test_schedule_counts_quota_per_scope(clock):
+    ledger = InvitationLedger(clock=clock, quota=1)
+    released, deferred = ledger.schedule([candidate("a@x"), candidate("b", scope="org/acme"),
+                                          candidate("c@x"), candidate("d", scope="org/acme")])
+    assert identifiers(released) == ["a@x", "b"]
+    assert identifiers(deferred) == ["c@x", "d"]
+    assert invite_quota_report(ledger, ["ACME", "other"]) == {"enterprise": 0, "org/acme": 0, "org/other": 1}
+
+
+def test_queue_is_released_first_in_first_out(clock):
+    ledger = InvitationLedger(clock=clock, quota=1)
+    ledger.schedule([candidate("a@x"), candidate("b@x")])
+
+    clock.now += HOUR
+    released, deferred = ledger.schedule([candidate("c@x"), candidate("b@x")])
+    assert released == []
+    assert identifiers(deferred) == ["b@x", "c@x"]
+
+    # 窗口过后先放行先入队的 b，c 继续排队
+    clock.now += 24 * HOUR
+    released, deferred = ledger.schedule([candidate("c@x"), candidate("b@x")])
+    assert identifiers(released) == ["b@x"]
+    assert identifiers(deferred) == ["c@x"]
+
+
+def test_priority_beats_queue_age(clock):
+    ledger = InvitationLedger(clock=clock, quota=1)
+    ledger.schedule([candidate("a@x"), candidate("old@x")])
+    clock.now += 25 * HOUR
+    released, _ = ledger.schedule([candidate("old@x"), candidate("vip@x", priority=1)])
+    assert identifiers(released) == ["vip@x"]
+
+
+def test_queue_persists_across_runs(tmp_path, clock):
+    path = str(tmp_path / "ledger.json")
+    ledger = InvitationLedger.load(path, clock=clock, quota=2)
+    ledger.schedule([candidate(f"u{i}@x") for i in range(5)])
+    ledger.save()
+
+    # 同一窗口内的下一次运行：额度仍然用完
+    clock.now += HOUR
+    ledger = InvitationLedger.load(path, clock=clock, quota=2)
+    assert sorted(ledger.data["queue"]) == ["enterprise:u2@x", "enterprise:u3@x", "enterprise:u4@x"]
+    assert ledger.remaining("enterprise") == 0
+    ledger.save()
+
+    # 窗口过后按入队顺序继续发送，发送成功的邀请离开队列
+    clock.now += 24 * HOUR
+    ledger = InvitationLedger.load(path, clock=clock, quota=2)
+    released, deferred = ledger.schedule([candidate(f"new{i}@x") for i in range(2)] +
+                                         [candidate(f"u{i}@x") for i in (2, 3, 4)])
+    assert identifiers(released) == ["u2@x", "u3@x"]
+    assert identifiers(deferred) == ["u4@x", "new0@x", "new1@x"]
+    for c in released:
+        ledger.record_sent(c["scope"], c["identifier"], invitation_id=1)
+    ledger.save()
+
+    ledger = InvitationLedger.load(path, clock=clock, quota=2)
+    assert sorted(ledger.data["queue"]) == ["enterprise:new0@x", "enterprise:new1@x", "enterprise:u4@x"]
+
+
+def test_defer_exhausts_scope_for_window(clock):
+    ledger = InvitationLedger(clock=clock, quota=10)
+    released, _ = ledger.schedule([candidate("a@x"), candidate("b", scope="org/acme")])
+    assert len(released) == 2
+
+    ledger.defer(released[0])
+    assert ledger.remaining("enterprise") == 0
+    assert ledger.remaining("org/acme") == 9
+    assert "enterprise:a@x" in ledger.data["queue"]
+    released, deferred = ledger.schedule([candidate("a@x")])
+    assert (released, identifiers(deferred)) == ([], ["a@x"])
+
+    clock.now += 24 * HOUR + 1
+    released, _ = ledger.schedule([candidate("a@x")])
+    assert identifiers(released) == ["a@x"]
+
+
+def test_unlimited_quota(clock):
+    ledger = InvitationLedger(clock=clock, quota=0)
+    released, deferred = ledger.schedule([candidate(f"u{i}@x") for i in range(1000)])
+    assert (len(released), deferred) == (1000, [])
+    assert ledger.remaining("enterprise") is None
+    assert invite_quota_report(ledger, ["acme"]) == {}
+
+
+def test_schedule_after_defer_outlives_released_window(tmp_path, clock):
+    path = str(tmp_path / "ledger.json")
+    ledger = InvitationLedger.load(path, clock=clock, quota=5)
+    released, _ = ledger.schedule([candidate("a@x"), candidate("b@x")])
+    clock.now += HOUR
+    ledger.defer(released[1])
+    ledger.save()
+
+    # 放行记录已过窗口被清理，但额度用完的标记仍然有效
+    clock.now += 23.5 * HOUR
+    ledger = InvitationLedger.load(path, clock=clock, quota=5)
+    ledger.prune()
+    assert "enterprise" not in ledger.data["released"]
+    released, deferred = ledger.schedule([candidate("b@x"), candidate("c@x")])
+    assert (released, identifiers(deferred)) == ([], ["b@x", "c@x"])
+
+
+def test_schedule_after_quota_is_switched_on(tmp_path, clock):
+    path = str(tmp_path / "ledger.json")
+    ledger = InvitationLedger.load(path, clock=clock, quota=0)
+    ledger.defer(candidate("a@x"))
+    ledger.save()
+
+    clock.now += HOUR
+    ledger = InvitationLedger.load(path, clock=clock, quota=5)
+    released, deferred = ledger.schedule([candidate("a@x")])
+    assert (released, identifiers(deferred)) == ([], ["a@x"])
@@ -0,0 +1,108 @@
+"""批量 GraphQL mutation 的构建、解析和拆分重试测试"""
+
+import asyncio
+
+import pytest
+import requests
+
+from benchmark import BenchmarkSync
+from fake_github import FakeEnterprise, FakeGitHubApp
+from sync_team import build_mutation_batch, parse_mutation_batch
+
+ITEMS = [(f"user{i}", {"userId": ("ID!", f"U_{i}")}) for i in range(4)]
+
+
+class ScriptedGraphQL:
+    """按顺序返回预设响应 (或抛出异常) 的 _graphql_raw 替身，记录每次请求的别名数"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sizes = []
+
+    def __call__(self, query, variables=None):
+        self.sizes.append(query.count("removeEnterpriseMember("))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response(self.sizes[-1]) if callable(response) else response
+
+
+def all_ok(size):
+    return {"data": {f"m{i}": {"clientMutationId": None} for i in range(size)}}
+
+
+@pytest.fixture
+def syncer():
+    enterprise = FakeEnterprise.seed(users=10, teams=1, team_size=2, orgs=0)
+    syncer = BenchmarkSync(FakeGitHubApp(enterprise), "token", enterprise.slug)
+    yield syncer
+    syncer.close()
+
+
+def test_build_mutation_batch():
+    query, variables = build_mutation_batch("removeEnterpriseMember", ITEMS[:2],
+                                            {"enterpriseId": ("ID!", "E_1")}, "clientMutationId")
+    assert query.startswith("mutation(")
+    assert "m0: removeEnterpriseMember(input: {enterpriseId: $enterpriseId, userId: $m0_userId})" in query
+    assert "m1: removeEnterpriseMember(" in query
+    assert variables == {"enterpriseId": "E_1", "m0_userId": "U_0", "m1_userId": "U_1"}
+
+
+def test_parse_mutation_batch():
+    result = {"data": {"m0": {"clientMutationId": None}, "m1": None, "m2": None},
+              "errors": [{"path": ["m1"], "message": "not a member"}, {"message": "Something went wrong"}]}
+    outcomes, unresolved, general_errors = parse_mutation_batch(result, ITEMS[:3])
+    assert outcomes == {"user0": (True, ""), "user1": (False, "not a member")}
+    assert unresolved == [ITEMS[2]]
+    assert general_errors == ["Something went wrong"]
+
+
+def test_whole_chunk_graphql_error_is_split(syncer, monkeypatch):
+    failure = {"data": None, "errors": [{"message": "Something went wrong"}]}
+    graphql = ScriptedGraphQL(failure, all_ok, all_ok)
+    monkeypatch.setattr(syncer, "_graphql_raw", graphql)
+    outcomes = syncer.run_mutation_batch("removeEnterpriseMember", ITEMS)
+    assert graphql.sizes == [4, 2, 2]
+    assert outcomes == {key: (True, "") for key, _ in ITEMS}
+
+
+def test_partial_chunk_resends_only_unresolved(syncer, monkeypatch):
+    partial = {"data": {"m0": {"clientMutationId": None}, "m1": None, "m2": None, "m3": None},
+               "errors": [{"path": ["m1"], "message": "not a member"}, {"message": "Something went wrong"}]}
+    graphql = ScriptedGraphQL(partial, all_ok)
+    monkeypatch.setattr(syncer, "_graphql_raw", graphql)
+    outcomes = syncer.run_mutation_batch("removeEnterpriseMember", ITEMS)
+    assert graphql.sizes == [4, 2]
+    assert outcomes["user1"] == (False, "not a member")
+    assert [outcomes[key][0] for key in ("user0", "user2", "user3")] == [True, True, True]
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ReadTimeout("read timed out"),
+    requests.exceptions.HTTPError("502 Server Error: Bad Gateway"),
+])
+def test_failed_request_is_not_resent(syncer, monkeypatch, error):
+    graphql = ScriptedGraphQL(error)
+    monkeypatch.setattr(syncer, "_graphql_raw", graphql)
+    outcomes = syncer.run_mutation_batch("removeEnterpriseMember", ITEMS)
+    assert graphql.sizes == [4]
+    assert all(not ok and "无法确认是否已执行" in message for ok, message in outcomes.values())
+    assert set(outcomes) == {key for key, _ in ITEMS}
+
+
+def test_async_failed_request_is_not_resent(monkeypatch):
+    async_sync = pytest.importorskip("async_sync")
+    syncer = async_sync.AsyncGitHubEnterpriseTeamSync("token", "enterprise")
+    sizes = []
+
+    async def graphql(query, variables=None):
+        sizes.append(query.count("removeEnterpriseMember("))
+        if len(sizes) == 1:
+            return {"data": None, "errors": [{"message": "Something went wrong"}]}
+        raise Exception("GraphQL 请求失败: 502 - Bad Gateway")
+
+    monkeypatch.setattr(syncer, "_graphql_raw", graphql)
+    outcomes = asyncio.run(syncer.run_mutation_batch("removeEnterpriseMember", ITEMS))
+    # 整体 GraphQL 错误时拆成两半，拆分后的请求失败不再继续拆分
+    assert sizes == [4, 2, 2]
+    assert all(not ok and "无法确认是否已执行" in message for ok, message in outcomes.values())
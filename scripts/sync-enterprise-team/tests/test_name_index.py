@@ -0,0 +1,145 @@
+"""Team / Organization 名称索引跨运行持久化的测试 (同步与异步引擎)"""
+
+import asyncio
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+import sync_team
+from fake_github import FakeEnterprise, FakeGitHubApp, make_server
+from sync_team import IdentityCache, NameIndex
+
+ENGINES = ["sync", "async"]
+
+
+def test_name_index_uses_cache_only_when_every_name_hits(tmp_path):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return True, {"core": {"id": 1, "slug": "core", "name": "Core"}, "docs": {"id": 2, "slug": "docs", "name": "Docs"}}
+
+    cache = IdentityCache(str(tmp_path / "cache.sqlite"))
+    assert NameIndex(loader, cache=cache, kind="team", scope="acme").preload(["Core"])
+    assert len(loads) == 1
+
+    index = NameIndex(loader, cache=cache, kind="team", scope="acme")
+    assert index.preload(["CORE", "docs"]) and not index.complete
+    assert index.get("Docs")["id"] == 2
+    assert len(loads) == 1
+    # 未命中的名称触发一次完整读取
+    assert index.get("missing") is None and index.complete
+    assert len(loads) == 2
+    # 缓存按 Enterprise 区分
+    other = NameIndex(loader, cache=cache, kind="team", scope="other")
+    assert other.preload(["core"]) and other.complete
+    assert len(loads) == 3
+    cache.close()
+
+
+@pytest.fixture
+def fake_github():
+    enterprise = FakeEnterprise.seed(users=100, teams=6, team_size=5, orgs=2, org_size=10)
+    app = FakeGitHubApp(enterprise)
+    server = make_server(app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield enterprise, app, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def listings(monkeypatch):
+    """统计 Team / Organization 完整列表的读取次数"""
+    counts = Counter()
+    classes = [sync_team.GitHubEnterpriseTeamSync]
+    try:
+        import async_sync
+        classes.append(async_sync.AsyncGitHubEnterpriseTeamSync)
+    except ImportError:
+        pass
+    for cls in classes:
+        for name in ("get_enterprise_teams", "get_enterprise_organizations"):
+            original = getattr(cls, name)
+
+            def counting(self, _original=original, _name=name):
+                counts[_name] += 1
+                return _original(self)
+
+            monkeypatch.setattr(cls, name, counting)
+    return counts
+
+
+def write_config(enterprise, path):
+    teams = sorted(enterprise.teams.values(), key=lambda t: t["id"])[:3]
+    orgs = sorted(enterprise.orgs.values(), key=lambda o: o["login"])
+    admin = sorted(enterprise.members)[0]
+    config = {"enterprise": enterprise.slug, "reserved_members": sorted(enterprise.members),
+              "teams": [{"name": team["name"], "members": sorted(team["members"])[1:]} for team in teams],
+              "orgs": [{"login": org["login"], "admin": admin, "billing_email": "billing@example.com",
+                        "members": sorted(org["members"])} for org in orgs]}
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return config
+
+
+def run_engine(engine, enterprise, url, config_path, cache_path):
+    cache = IdentityCache(str(cache_path), namespace=url)
+    if engine == "async":
+        async_sync = pytest.importorskip("async_sync")
+        return asyncio.run(async_sync.run("token", enterprise.slug, str(config_path), url, identity_cache=cache))
+    syncer = sync_team.GitHubEnterpriseTeamSync("token", enterprise.slug, base_url=url, identity_cache=cache)
+    try:
+        syncer.sync_from_config(str(config_path))
+        return syncer.report
+    finally:
+        syncer.close()
+        cache.close()
+
+
+def errors(report):
+    return [error for resource in report["teams"] + report["orgs"] for error in resource["errors"]]
+
+
+def assert_converged(enterprise, config):
+    for wanted in config["teams"]:
+        team = next(t for t in enterprise.teams.values() if t["name"] == wanted["name"])
+        assert team["members"] == set(wanted["members"])
+    for wanted in config["orgs"]:
+        assert set(enterprise.orgs[wanted["login"]]["members"]) == set(wanted["members"])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_warm_run_skips_listings(engine, fake_github, listings, tmp_path):
+    enterprise, app, url = fake_github
+    config = write_config(enterprise, tmp_path / "config.json")
+
+    report = run_engine(engine, enterprise, url, tmp_path / "config.json", tmp_path / "cache.sqlite")
+    assert errors(report) == []
+    assert listings == {"get_enterprise_teams": 1, "get_enterprise_organizations": 1}
+
+    listings.clear()
+    report = run_engine(engine, enterprise, url, tmp_path / "config.json", tmp_path / "cache.sqlite")
+    assert errors(report) == []
+    assert listings == {}
+    assert_converged(enterprise, config)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stale_cached_entries_are_recovered(engine, fake_github, listings, tmp_path):
+    enterprise, app, url = fake_github
+    config = write_config(enterprise, tmp_path / "config.json")
+    run_engine(engine, enterprise, url, tmp_path / "config.json", tmp_path / "cache.sqlite")
+
+    # 两次运行之间删除一个 Team 和一个 Organization，缓存中的 ID 失效
+    deleted_team = next(t for t in enterprise.teams.values() if t["name"] == config["teams"][0]["name"])
+    del enterprise.teams[deleted_team["id"]]
+    del enterprise.orgs[config["orgs"][0]["login"]]
+    listings.clear()
+
+    report = run_engine(engine, enterprise, url, tmp_path / "config.json", tmp_path / "cache.sqlite")
+    assert errors(report) == []
+    assert listings == {"get_enterprise_teams": 1, "get_enterprise_organizations": 1}
+    assert config["orgs"][0]["login"] in enterprise.orgs
+    assert any(t["name"] == deleted_team["name"] for t in enterprise.teams.values())
@@ -0,0 +1,97 @@
+"""Link 头解析和并发分页的测试"""
+
+import threading
+import time
+
+import pytest
+
+from benchmark import BenchmarkSync
+from fake_github import FakeEnterprise, FakeGitHubApp
+from sync_team import last_page_number, parse_link_header
+
+
+def test_parse_link_header():
+    value = ('<https://api.github.com/enterprises/acme/teams?per_page=100&page=2>; rel="next", '
+             '<https://api.github.com/enterprises/acme/teams?per_page=100&page=7>; rel="last"')
+    links = parse_link_header(value)
+    assert links == {"next": "https://api.github.com/enterprises/acme/teams?per_page=100&page=2",
+                     "last": "https://api.github.com/enterprises/acme/teams?per_page=100&page=7"}
+    assert last_page_number(links) == 7
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, {}),
+    ("", {}),
+    ("<https://x/?page=1>", {}),
+    ('<https://x/?page=1>; rel="prev first"', {"prev": "https://x/?page=1", "first": "https://x/?page=1"}),
+])
+def test_parse_link_header_edge_cases(value, expected):
+    assert parse_link_header(value) == expected
+
+
+@pytest.mark.parametrize("links, expected", [
+    ({}, None),
+    ({"next": "https://x/?page=2"}, None),
+    ({"last": "https://x/?per_page=100"}, None),
+    ({"last": "https://x/?page=abc"}, None),
+])
+def test_last_page_number_missing(links, expected):
+    assert last_page_number(links) is expected
+
+
+class PagedSync(BenchmarkSync):
+    """页码越大响应越快的同步器，记录同时进行的分页请求数"""
+
+    def __init__(self, *args, **kwargs):
+        self.active = 0
+        self.peak = 0
+        self.counter_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _fetch_page(self, url):
+        with self.counter_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            page = int(url.rsplit("page=", 1)[1])
+            time.sleep(0.02 / page)
+            return super()._fetch_page(url)
+        finally:
+            with self.counter_lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def enterprise():
+    return FakeEnterprise.seed(users=50, teams=950, team_size=1, orgs=0)
+
+
+def make_syncer(enterprise, **kwargs):
+    return PagedSync(FakeGitHubApp(enterprise), "token", enterprise.slug, **kwargs)
+
+
+def test_pages_are_yielded_in_order(enterprise):
+    syncer = make_syncer(enterprise, max_workers=8, pool_size=16, resource_workers=1)
+    pages = [data for success, data in syncer.iter_pages(f"{syncer.base_url}/enterprises/{enterprise.slug}/teams")]
+    syncer.close()
+    assert len(pages) == 10
+    ids = [team["id"] for page in pages for team in page]
+    assert ids == sorted(team["id"] for team in enterprise.teams.values())
+    assert syncer.peak > 1
+
+
+def test_page_concurrency_shares_the_connection_pool(enterprise):
+    syncer = make_syncer(enterprise, max_workers=8, pool_size=10, resource_workers=4)
+    ok, teams = syncer.list_all(f"{syncer.base_url}/enterprises/{enterprise.slug}/teams")
+    syncer.close()
+    assert ok and len(teams) == 950
+    # 第一页之外最多 10 // 4 = 2 个并发请求
+    assert syncer.peak == 2
+
+
+def test_serial_pages_when_single_worker(enterprise):
+    syncer = make_syncer(enterprise, max_workers=1)
+    ok, teams = syncer.list_all(f"{syncer.base_url}/enterprises/{enterprise.slug}/teams")
+    syncer.close()
+    assert ok and len(teams) == 950
+    assert syncer.peak == 1
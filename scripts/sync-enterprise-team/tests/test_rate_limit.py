@@ -0,0 +1,95 @@
+"""RateLimitScheduler 的测试"""
+
+import requests
+
+from sync_team import RateLimitScheduler
+
+NOW = 1_000_000.0
+
+
+def response(status=200, body=b"{}", **headers) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status
+    result._content = body
+    result.headers.update({name.replace("_", "-"): str(value) for name, value in headers.items()})
+    return result
+
+
+def scheduler(sleeps=None) -> RateLimitScheduler:
+    return RateLimitScheduler(clock=lambda: NOW, sleep=(sleeps if sleeps is not None else []).append)
+
+
+def rate_headers(limit, remaining, reset, resource="core"):
+    return {"X_RateLimit_Limit": limit, "X_RateLimit_Remaining": remaining,
+            "X_RateLimit_Reset": reset, "X_RateLimit_Resource": resource}
+
+
+def test_reserve_without_state_does_not_wait():
+    limiter = scheduler()
+    assert limiter.reserve("core") == 0.0
+    assert limiter.remaining("core") is None
+
+
+def test_reserve_deducts_remaining():
+    limiter = scheduler()
+    limiter.update("core", response(**rate_headers(5000, 4000, NOW + 600)))
+    assert [limiter.reserve("core") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.remaining("core") == 3997
+
+
+def test_reserve_paces_below_threshold():
+    limiter = scheduler()
+    # 剩余 100 (低于 5%)、600 秒后重置：每个请求间隔 6 秒
+    limiter.update("core", response(**rate_headers(5000, 100, NOW + 600)))
+    assert limiter.reserve("core") == 6.0
+    assert limiter.remaining("core") == 99
+    assert limiter.total_wait == 6.0
+
+
+def test_reserve_waits_for_reset_when_exhausted():
+    limiter = scheduler()
+    limiter.update("core", response(**rate_headers(5000, 0, NOW + 120)))
+    assert limiter.reserve("core") == 121
+    # 其他限额不受影响
+    assert limiter.reserve("graphql") == 0.0
+
+
+def test_update_uses_resource_header():
+    limiter = scheduler()
+    limiter.update("core", response(**rate_headers(5000, 10, NOW + 60, resource="graphql")))
+    assert limiter.remaining("graphql") == 10
+    assert limiter.remaining("core") is None
+    limiter.update("core", response(X_RateLimit_Remaining="many"))
+    assert limiter.remaining("core") is None
+
+
+def test_acquire_sleeps_reserved_delay():
+    sleeps = []
+    limiter = scheduler(sleeps)
+    limiter.update("core", response(**rate_headers(5000, 0, NOW + 30)))
+    limiter.acquire("core")
+    limiter.wait(5)
+    assert sleeps == [31, 5]
+    assert limiter.total_wait == 36
+
+
+def test_secondary_limit_blocks_all_resources():
+    limiter = scheduler()
+    wait = limiter.rate_limit_wait(response(403, b'{"message": "You have exceeded a secondary rate limit"}'))
+    assert wait == RateLimitScheduler.SECONDARY_LIMIT_DEFAULT_WAIT
+    assert limiter.reserve("core") == wait
+    assert limiter.reserve("graphql") == wait
+
+    limiter = scheduler()
+    assert limiter.rate_limit_wait(response(429, Retry_After=7)) == 7.0
+    assert limiter.reserve("core") == 7.0
+
+
+def test_primary_limit_waits_until_reset():
+    limiter = scheduler()
+    assert limiter.rate_limit_wait(response(403, X_RateLimit_Remaining=0, X_RateLimit_Reset=NOW + 50)) == 51
+    graphql_limited = response(200, b'{"errors": [{"type": "RATE_LIMITED"}]}',
+                               X_RateLimit_Remaining=0, X_RateLimit_Reset=NOW - 5)
+    assert limiter.rate_limit_wait(graphql_limited) == 1.0
+    assert limiter.rate_limit_wait(response(403, b'{"message": "Resource not accessible"}')) is None
+    assert limiter.rate_limit_wait(response(200, X_RateLimit_Remaining=0)) is None
@@ -0,0 +1,76 @@
+"""条件请求 (ETag / If-None-Match) 缓存的测试"""
+
+import pytest
+
+from benchmark import BenchmarkSync
+from fake_github import FakeEnterprise, FakeGitHubApp
+from sync_team import ResponseCache
+
+
+@pytest.fixture
+def enterprise():
+    return FakeEnterprise.seed(users=20, teams=5, team_size=3, orgs=0)
+
+
+@pytest.fixture
+def syncer(enterprise):
+    cache = ResponseCache(token="token")
+    syncer = BenchmarkSync(FakeGitHubApp(enterprise), "token", enterprise.slug, response_cache=cache)
+    yield syncer
+    syncer.close()
+
+
+def teams_url(syncer, per_page=2):
+    return f"{syncer.base_url}/enterprises/{syncer.enterprise}/teams?per_page={per_page}"
+
+
+def test_not_modified_reuses_cached_body_and_link(syncer):
+    first = syncer._send("GET", teams_url(syncer))
+    assert first.status_code == 200 and first.headers.get("ETag")
+    remaining = syncer.rate_limiter.remaining("core")
+
+    second = syncer._send("GET", teams_url(syncer))
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.json() == first.json()
+    assert second.headers["Link"] == first.headers["Link"]
+    assert syncer.response_cache.revalidated == 1
+    # 304 不计入主速率限制
+    assert syncer.rate_limiter.remaining("core") == remaining
+    endpoints = {entry["endpoint"]: entry for entry in syncer.metrics.summary()["endpoints"]}
+    assert endpoints["/enterprises/{enterprise}/teams"]["statuses"] == {"200": 1, "304": 1}
+
+
+def test_changed_resource_replaces_cached_entry(syncer, enterprise):
+    url = teams_url(syncer, per_page=100)
+    syncer._send("GET", url)
+    syncer.response_cache.set(url, 'W/"stale"', b"[]")
+
+    response = syncer._send("GET", url)
+    assert response.status_code == 200
+    assert len(response.json()) == len(enterprise.teams)
+    assert syncer.response_cache.revalidated == 0
+    assert syncer.response_cache.get(url)["etag"] == response.headers["ETag"]
+
+
+def test_requests_outside_the_cache(syncer):
+    url = teams_url(syncer)
+    syncer._send("GET", url, params={"page": 1})
+    assert syncer.response_cache.get(url) is None
+    syncer._send("GET", url)
+    syncer._send("GET", url, params={"page": 1})
+    assert syncer.response_cache.revalidated == 0
+
+
+def test_cache_is_scoped_by_token(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path, token="token")
+    cache.set("https://api.github.com/enterprises/acme/teams", 'W/"1"', b"[]")
+    cache.close()
+
+    other = ResponseCache(path, token="other-token")
+    assert other.get("https://api.github.com/enterprises/acme/teams") is None
+    other.close()
+    cache = ResponseCache(path, token="token")
+    assert cache.get("https://api.github.com/enterprises/acme/teams")["etag"] == 'W/"1"'
+    cache.close()
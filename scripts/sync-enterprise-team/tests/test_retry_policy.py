@@ -0,0 +1,120 @@
+"""RetryPolicy 以及瞬时错误判断的测试"""
+
+import json
+
+import pytest
+import requests
+import urllib3
+
+from benchmark import BenchmarkSync
+from fake_github import FakeEnterprise, FakeGitHubApp
+from sync_team import RetryPolicy, graphql_transient_error, request_not_sent
+
+
+@pytest.mark.parametrize("method, query, expected", [
+    ("GET", None, True),
+    ("put", None, True),
+    ("DELETE", None, True),
+    ("POST", None, False),
+    ("PATCH", None, False),
+    ("POST", "query { viewer { login } }", True),
+    ("POST", "\n  mutation { addEnterpriseOrganizationMember(input: {}) { clientMutationId } }", False),
+])
+def test_is_idempotent(method, query, expected):
+    assert RetryPolicy().is_idempotent(method, query) is expected
+
+
+def test_retryable_status():
+    policy = RetryPolicy()
+    assert all(policy.retryable_status(status) for status in (500, 502, 503, 504))
+    assert not any(policy.retryable_status(status) for status in (200, 401, 403, 404, 422, 429))
+
+
+def test_exponential_backoff_with_full_jitter():
+    policy = RetryPolicy(base_delay=1.0, max_delay=3.0, random_func=lambda: 1.0)
+    assert [policy.next_delay(retries) for retries in range(3)] == [1.0, 2.0, 3.0]
+    assert policy.total_delay == 6.0
+
+    policy = RetryPolicy(base_delay=1.0, random_func=lambda: 0.5)
+    assert policy.next_delay(2) == 2.0
+
+
+def test_max_retries_per_request():
+    policy = RetryPolicy(max_retries=2, random_func=lambda: 0.0)
+    assert policy.next_delay(1) == 0.0
+    assert policy.next_delay(2) is None
+    # 单个请求达到上限不消耗预算
+    assert policy.used == 1
+    assert policy.denied == 0
+
+
+@pytest.mark.parametrize("retry_after, expected", [
+    ("10", 10.0),
+    ("120", 30.0),
+    ("-5", 0.0),
+    ("soon", 0.25),
+    (None, 0.25),
+])
+def test_retry_after_is_capped(retry_after, expected):
+    policy = RetryPolicy(base_delay=1.0, max_delay=30.0, random_func=lambda: 0.25)
+    assert policy.next_delay(0, retry_after) == expected
+
+
+def test_budget_exhaustion(capsys):
+    policy = RetryPolicy(budget=2, random_func=lambda: 0.0)
+    assert policy.next_delay(0) == 0.0
+    assert policy.next_delay(0) == 0.0
+    assert policy.next_delay(0) is None
+    assert policy.next_delay(0) is None
+    assert (policy.used, policy.denied) == (2, 2)
+    # 预算用完的提示只输出一次
+    assert capsys.readouterr().out.count("重试预算") == 1
+
+
+@pytest.mark.parametrize("result, expected", [
+    ({"data": {"enterprise": None}, "errors": [{"type": "SERVICE_UNAVAILABLE", "message": "unavailable"}]}, True),
+    ({"data": None, "errors": [{"type": "TIMEOUT"}, {"type": "INTERNAL"}]}, True),
+    ({"errors": [{"message": "Something went wrong while executing your query. Please try again."}]}, True),
+    ({"errors": [{"message": "Query timed out"}]}, True),
+    ({"data": {"node": None, "rateLimit": {"cost": 1}}, "errors": [{"type": "SERVICE_UNAVAILABLE"}]}, True),
+    ({"data": {"enterprise": {"id": "E_1"}}, "errors": [{"type": "TIMEOUT"}]}, False),
+    ({"data": {"node": {"id": "U_1"}, "rateLimit": {"cost": 1}}, "errors": [{"type": "TIMEOUT"}]}, False),
+    ({"data": None, "errors": [{"type": "NOT_FOUND", "message": "timeout"}]}, False),
+    ({"data": None, "errors": [{"type": "TIMEOUT"}, {"type": "FORBIDDEN"}]}, False),
+    ({"errors": [{"message": "Field 'foo' doesn't exist"}]}, False),
+    ({"errors": ["timeout"]}, False),
+    ({"data": {"enterprise": None}}, False),
+    (None, False),
+])
+def test_graphql_transient_error(result, expected):
+    assert graphql_transient_error(result) is expected
+
+
+def _connection_error(reason: Exception) -> requests.exceptions.ConnectionError:
+    """构造 requests 包装 urllib3 MaxRetryError 的连接错误"""
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, "/graphql", reason))
+
+
+def test_request_not_sent():
+    refused = urllib3.exceptions.NewConnectionError(None, "Connection refused")
+    assert request_not_sent(_connection_error(refused))
+    assert request_not_sent(requests.exceptions.ConnectTimeout())
+
+    reset = urllib3.exceptions.ProtocolError("Connection aborted.", ConnectionResetError())
+    assert not request_not_sent(_connection_error(reset))
+    assert not request_not_sent(requests.exceptions.ReadTimeout())
+    assert not request_not_sent(requests.exceptions.ConnectionError())
+
+
+def test_transient_response_ignores_rate_limit_cost():
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({"data": {"node": None, "rateLimit": {"cost": 1}},
+                                     "errors": [{"type": "SERVICE_UNAVAILABLE"}]}).encode()
+    enterprise = FakeEnterprise.seed(users=10, teams=1, team_size=2, orgs=0)
+    syncer = BenchmarkSync(FakeGitHubApp(enterprise), "token", enterprise.slug)
+    try:
+        assert syncer._transient_response(response, "graphql")
+        assert not syncer._transient_response(response, "core")
+    finally:
+        syncer.close()
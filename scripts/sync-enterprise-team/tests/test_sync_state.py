@@ -0,0 +1,93 @@
+"""增量同步状态 (SyncState / resource_hashes / converged_resources) 的测试"""
+
+import copy
+
+from sync_team import SyncState, converged_resources, resource_hashes
+
+DAY = 24 * 3600
+NOW = 1_000_000.0
+
+CONFIG = {
+    "enterprise": "acme",
+    "reserved_members": ["root"],
+    "orgs": [{"login": "Acme-Org", "admin": "root", "billing_email": "b@example.com",
+              "members": [{"username": "alice", "email": ""}]}],
+    "teams": [{"name": "Core", "members": ["alice", {"username": "bob", "email": "bob@example.com"}]},
+              {"name": "Docs", "members": ["carol"]}],
+}
+
+
+def synced_state(tmp_path, config=CONFIG, now=NOW) -> SyncState:
+    """已在 now 完成一次全量同步且所有资源都已收敛的状态"""
+    state = SyncState(str(tmp_path / "state.json"))
+    hashes = resource_hashes(config)
+    state.record(config, hashes, set(hashes), set(hashes), full_sync=True, enterprise="acme")
+    state.data["last_full_sync"] = now
+    return state
+
+
+def test_resource_keys_and_stable_digests():
+    hashes = resource_hashes(CONFIG)
+    assert set(hashes) == {"org:acme-org", "team:core", "team:docs", "enterprise"}
+
+    reordered = copy.deepcopy(CONFIG)
+    reordered["teams"][0]["members"].reverse()
+    reordered["teams"][0]["members"][1] = " alice "
+    assert resource_hashes(reordered) == hashes
+
+
+def test_changed_team_only_changes_its_digest_and_enterprise():
+    changed = copy.deepcopy(CONFIG)
+    changed["teams"][1]["members"].append("dave")
+    before, after = resource_hashes(CONFIG), resource_hashes(changed)
+    assert {key for key in before if before[key] != after[key]} == {"team:docs", "enterprise"}
+
+    changed = copy.deepcopy(CONFIG)
+    changed["teams"][0]["members"][1]["email"] = "bob@corp.example.com"
+    after = resource_hashes(changed)
+    assert {key for key in before if before[key] != after[key]} == {"team:core"}
+
+
+def test_select_only_changed_resources(tmp_path):
+    state = synced_state(tmp_path)
+    assert state.select(resource_hashes(CONFIG), "acme", DAY, now=NOW + 60) == set()
+
+    changed = copy.deepcopy(CONFIG)
+    changed["teams"][1]["members"].append("dave")
+    changed["teams"].append({"name": "New", "members": []})
+    assert state.select(resource_hashes(changed), "acme", DAY, now=NOW + 60) == {"team:docs", "team:new", "enterprise"}
+
+
+def test_full_sync_interval_and_enterprise_change(tmp_path):
+    state = synced_state(tmp_path)
+    hashes = resource_hashes(CONFIG)
+    assert state.select(hashes, "acme", DAY, now=NOW + DAY - 1) == set()
+    assert state.select(hashes, "acme", DAY, now=NOW + DAY) is None
+    assert state.select(hashes, "other", DAY, now=NOW + 60) is None
+    assert SyncState(str(tmp_path / "missing.json")).select(hashes, "acme", DAY, now=NOW) is None
+
+
+def test_unconverged_resources_are_selected_again(tmp_path):
+    state = synced_state(tmp_path)
+    hashes = resource_hashes(CONFIG)
+    report = {"orgs": [{"login": "Acme-Org", "errors": [], "invited": [], "pending": []}],
+              "teams": [{"name": "Core", "errors": [], "invited": [], "pending": ["bob@example.com"]},
+                        {"name": "Docs", "errors": ["carol: 添加失败"], "invited": []}],
+              "enterprise_remove_errors": []}
+    converged = converged_resources(report, cleanup_ok=True)
+    assert converged == {"org:acme-org", "enterprise"}
+
+    state.record(CONFIG, hashes, converged, {"team:core", "team:docs"}, full_sync=False, enterprise="acme")
+    assert state.data["last_full_sync"] == NOW
+    assert state.select(hashes, "acme", DAY, now=NOW + 60) == {"team:core", "team:docs"}
+
+
+def test_state_round_trip(tmp_path):
+    state = synced_state(tmp_path)
+    state.save()
+    loaded = SyncState.load(state.path)
+    assert loaded.data == state.data
+    assert loaded.select(resource_hashes(CONFIG), "acme", DAY, now=NOW + 60) == set()
+
+    (tmp_path / "state.json").write_text("{broken", encoding="utf-8")
+    assert SyncState.load(state.path).data["resources"] == {}